@@ -0,0 +1,137 @@
+import argparse, glob, hashlib, json, os, platform, sys, time, tracemalloc
+
+bench_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( bench_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+
+# Runs the benchmark programs, reports their wall time, node evaluations per second and
+# peak memory, and compares them with a stored baseline. Each program is a JSON file in
+# 'programs' holding its source, its AST and the SHA-256 of its expected output. A fixed
+# python loop is timed with the programs, and baseline times are scaled by how much faster
+# or slower it runs now, so a baseline stays usable on a busier or different machine.
+
+programs_dir = os.path.join(bench_dir, 'programs')
+baseline_path = os.path.join(bench_dir, 'baseline.json')
+
+# Loads the programs named, or all of them, by name.
+def load(names: list) -> dict:
+    programs = {}
+    for path in sorted(glob.glob(os.path.join(programs_dir, '*.json'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not names or name in names:
+            with open(path) as f:
+                programs[name] = json.load(f)
+
+    if (unknown := set(names).difference(programs)):
+        sys.exit(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    return programs
+
+# Runs a program once, returns the time it took. Fails if its output is not the expected one.
+def run(name: str, program: dict) -> float:
+    start = time.perf_counter()
+    result = i.interp_program(program['ast'])
+    elapsed = time.perf_counter() - start
+    output = ''.join(result['output'])
+    if result['kind'] != 'ok' or hashlib.sha256(output.encode()).hexdigest() != program['output_sha256']:
+        sys.exit(f"{name}: unexpected result {result['kind']}: {output[:200]!r}")
+
+    return elapsed
+
+# Times a fixed python loop, the best of 'repeat' runs.
+def calibrate(repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start, t = time.perf_counter(), 0
+        for n in range(1000000):
+            t += n % 7
+
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+# Counts the nodes a program evaluates, from a profiled run.
+def count_ops(program: dict) -> int:
+    profile = i.interp_program(program['ast'], profile=True)['profile']
+    return sum(stats.hits for _, stats in profile.nodes.values())
+
+# Returns the peak memory a run allocates, in bytes.
+def peak_memory(program: dict) -> int:
+    tracemalloc.start()
+    try:
+        i.interp_program(program['ast'])
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Measures a program: the best time of 'repeat' runs, its node evaluations and peak memory.
+def measure(name: str, program: dict, repeat: int) -> dict:
+    best = min(run(name, program) for _ in range(repeat))
+    ops = count_ops(program)
+    return dict(time=best, ops=ops, ops_per_sec=ops / best, peak=peak_memory(program))
+
+# Returns a line for each measurement over its baseline by more than the threshold. Baseline
+# times are multiplied by 'scale', the ratio of the current calibration to the baseline's.
+def regressions(results: dict, baseline: dict, scale: float, threshold: float, memory_threshold: float) -> list:
+    found = []
+    for name, res in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+
+        if res['time'] > base['time'] * scale * (1 + threshold):
+            found.append(f"{name}: time {res['time']:.3f}s, baseline {base['time'] * scale:.3f}s (+{res['time'] / (base['time'] * scale) - 1:.0%})")
+
+        if res['peak'] > base['peak'] * (1 + memory_threshold):
+            found.append(f"{name}: peak memory {res['peak'] >> 10} KiB, baseline {base['peak'] >> 10} KiB (+{res['peak'] / base['peak'] - 1:.0%})")
+
+    return found
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Runs the ScopeScript interpreter benchmarks.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark, the best time is kept')
+    parser.add_argument('--baseline', default=baseline_path, help='baseline JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown over the baseline, as a fraction')
+    parser.add_argument('--memory-threshold', type=float, default=0.10, help='allowed peak memory growth over the baseline, as a fraction')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    baseline, calibration = {}, calibrate(args.repeat)
+    scale = 1.0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+
+        baseline, scale = stored['results'], calibration / stored['calibration']
+
+    print(f"calibration {calibration:.3f}s, baseline times scaled by {scale:.2f}\n")
+    print(f"{'benchmark':<18} {'time s':>9} {'baseline':>9} {'ops':>10} {'ops/s':>11} {'peak KiB':>9}")
+    results = {}
+    for name, program in load(args.names).items():
+        res = results[name] = measure(name, program, args.repeat)
+        base = f"{baseline[name]['time'] * scale:.3f}" if name in baseline else '-'
+        print(f"{name:<18} {res['time']:>9.3f} {base:>9} {res['ops']:>10} {res['ops_per_sec']:>11.0f} {res['peak'] >> 10:>9}")
+
+    if args.save:
+        # Kept baseline times are rescaled to the new calibration.
+        kept = { name: dict(res, time=res['time'] * scale) for name, res in baseline.items() }
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(python=platform.python_version(), machine=platform.machine(), calibration=calibration, results={ **kept, **results }), f, indent=1)
+            f.write('\n')
+
+        return 0
+
+    if (found := regressions(results, baseline, scale, args.threshold, args.memory_threshold)):
+        print('\nRegressions:')
+        for line in found:
+            print(line)
+
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import hashlib, json, marshal, os, sys, tempfile
+
+from scopescript import memo as m
+
+# Compact binary programs and a content-addressed cache of them. A binary program is the
+# AST with every string interned and every number literal already parsed, written with
+# marshal, which stores each interned string once and reads the whole program back in one
+# call. The cache keeps binary programs in a directory, named by the SHA-256 of the text
+# or AST they were made from, and the most recently used programs and their compiled
+# code in memory, so a worker running the same scripts again skips parsing, JSON decoding
+# and compilation.
+
+# First bytes of a binary program, followed by the format's version.
+MAGIC = b'SSAST'
+VERSION = 1
+
+# Literal kinds whose value is parsed into a number.
+numbers = { 'integer': int, 'float': float }
+
+# Returns a copy of an AST with its strings interned and its number literals parsed. A
+# literal that cannot be parsed is left as it is, for the interpreter to report.
+def normalize(e):
+    match e:
+        case dict():
+            node = { sys.intern(key): normalize(val) for key, val in e.items() }
+            if (parse := numbers.get(node.get('kind'))) and type(val := node.get('value')) is str:
+                try:
+                    node['value'] = parse(val)
+                except ValueError:
+                    pass
+
+            return node
+        case list():
+            return [ normalize(val) for val in e ]
+        case str():
+            return sys.intern(e)
+
+    return e
+
+# Returns the binary form of an AST.
+def dumps(p: list) -> bytes:
+    return MAGIC + bytes([VERSION]) + marshal.dumps(normalize(p), 4)
+
+# Reads an AST from its binary form.
+def loads(data: bytes) -> list:
+    head = len(MAGIC) + 1
+    if data[:head] != MAGIC + bytes([VERSION]):
+        raise ValueError('not a binary ScopeScript program')
+
+    return marshal.loads(memoryview(data)[head:])
+
+# Writes an AST to a binary file.
+def dump(p: list, path: str) -> None:
+    data = dumps(p)
+    # Written under another name first, so readers never see part of a file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        os.replace(tmp, path)
+    except:
+        os.unlink(tmp)
+        raise
+
+# Reads an AST from a binary file.
+def load(path: str) -> list:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+# Returns the SHA-256 of a program's JSON text, or of an AST's canonical JSON text, with
+# sorted keys, so equal ASTs have the same digest however they were built.
+def digest(program) -> str:
+    match program:
+        case str():
+            data = program.encode()
+        case bytes():
+            data = program
+        case _:
+            data = json.dumps(program, sort_keys=True, separators=(',', ':')).encode()
+
+    return hashlib.sha256(data).hexdigest()
+
+# Binary programs in 'directory' by digest, with up to 'size' programs and compiled
+# programs kept in memory.
+class Cache:
+    def __init__(self, directory: str, size: int = 256) -> None:
+        self.directory = directory
+        self.programs = m.Memo(size)
+        self.compiled = m.Memo(size)
+        os.makedirs(directory, exist_ok=True)
+
+    # Path of the binary program with a digest.
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.ssast')
+
+    # Returns the AST of a program given as JSON text, str or bytes, or as an AST. It is
+    # read from memory or from the directory when the program was seen before, and made
+    # and stored there otherwise.
+    def load(self, program) -> list:
+        return self.entry(program)[1]
+
+    # Returns a program's digest and AST.
+    def entry(self, program) -> tuple:
+        key = digest(program)
+        if (found := self.programs.get((key,))) is not None:
+            return key, found
+
+        path = self.path(key)
+        try:
+            p = load(path)
+        except (OSError, ValueError, EOFError, TypeError):
+            p = normalize(json.loads(program) if type(program) in (str, bytes) else program)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            dump(p, path)
+
+        self.programs.put((key,), p)
+        return key, p
+
+    # Returns a program compiled by a backend module with a compile_program function, such
+    # as the compiler, vm or transpiler. Compiled code stays in memory only.
+    def compile(self, program, backend):
+        key, p = self.entry(program)
+        if (code := self.compiled.get((key, backend.__name__))) is None:
+            code = backend.compile_program(p)
+            self.compiled.put((key, backend.__name__), code)
+
+        return code
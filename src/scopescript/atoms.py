@@ -1,4 +1,5 @@
 from collections import namedtuple
+from collections.abc import MutableMapping
 # Language atoms.
 _boolean=namedtuple('boolean', ['value'])
 _integer=namedtuple('integer', ['value'])
@@ -8,6 +9,150 @@ _null=namedtuple('null', ['value'])
 _collection=namedtuple('collection', ['value'])
 _closure=namedtuple('closure', ['value'])
 
+# Strings shorter than this are concatenated directly.
+ROPE_MIN = 256
+
+# A string made by concatenation, holding its pieces until its value is used. Its pieces
+# are the first 'count' of a list it may share with the string it was made from. Adding
+# to a string that holds the whole of its list appends to that list, so a string built
+# up one piece at a time takes linear time in total. Other strings copy their pieces.
+class _rope(_string):
+    def __new__(cls, parts: list, size: int):
+        self = super().__new__(cls, None)
+        self.parts, self.count, self.size = parts, len(parts), size
+        return self
+
+    # Joins the pieces once. The string then holds its text as the only piece of a list
+    # of its own.
+    @property
+    def value(self) -> str:
+        if self.count != 1 or len(self.parts) != 1:
+            self.parts, self.count = [''.join(self.parts[:self.count])], 1
+
+        return self.parts[0]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _string) and self.value == other.value
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash((self.value,))
+
+    def __repr__(self) -> str:
+        return f"string(value={self.value!r})"
+
+# A rope is a string to the rest of the interpreter.
+_rope.__name__ = _rope.__qualname__ = 'string'
+
+# Concatenates two strings.
+def concat(s1: tuple, s2: tuple) -> tuple:
+    if type(s1) is _rope:
+        parts = s1.parts
+        if s1.count != len(parts):
+            parts = parts[:s1.count]
+
+        parts.append(s2.value)
+        return _rope(parts, s1.size + len(parts[-1]))
+
+    v1, v2 = s1.value, s2.value
+    if len(v1) + len(v2) < ROPE_MIN:
+        return _string(v1 + v2)
+
+    return _rope([v1, v2], len(v1) + len(v2))
+
+# Returns the position a key names in a table's list, or None for keys that are not
+# written like a non-negative integer.
+def index_of(key: str) -> int | None:
+    if key.isdigit() and key.isascii() and (key[0] != '0' or len(key) == 1):
+        return int(key)
+
+    return None
+
+# The value of a collection. Keys are strings, but the keys '0' to 'n-1' added in that order
+# before any other key are kept in a list, the other keys in a dict. Items are listed in
+# the order they were added, like a dict's, so a key goes into the list only while the
+# dict is empty. Deleting from the middle of the list moves the items after it to the dict.
+class Table(MutableMapping):
+    def __init__(self, items: dict | None = None) -> None:
+        self.list, self.rest = [], {}
+        if items:
+            self.update(items)
+
+    # Returns the item at integer key 'i', or null.
+    def at(self, i: int) -> tuple:
+        if 0 <= i < len(self.list):
+            return self.list[i]
+
+        return self.rest.get(str(i), _null(None))
+
+    # Sets the item at integer key 'i'.
+    def set_at(self, i: int, val: tuple) -> None:
+        items = self.list
+        if 0 <= i < len(items):
+            items[i] = val
+        elif i == len(items) and not self.rest:
+            items.append(val)
+        else:
+            self.rest[str(i)] = val
+
+    def get(self, key: str, default=None):
+        i = index_of(key)
+        if i is not None and i < len(self.list):
+            return self.list[i]
+
+        return self.rest.get(key, default)
+
+    def __getitem__(self, key: str) -> tuple:
+        if (val := self.get(key, self)) is self:
+            raise KeyError(key)
+
+        return val
+
+    def __setitem__(self, key: str, val: tuple) -> None:
+        i, items = index_of(key), self.list
+        if i is None or i > len(items) or self.rest and i == len(items):
+            self.rest[key] = val
+        elif i == len(items):
+            items.append(val)
+        else:
+            items[i] = val
+
+    def __delitem__(self, key: str) -> None:
+        i, items = index_of(key), self.list
+        if i is None or i >= len(items):
+            del self.rest[key]
+        elif i == len(items) - 1:
+            items.pop()
+        else:
+            rest = { str(j): items[j] for j in range(i + 1, len(items)) }
+            rest.update(self.rest)
+            del items[i:]
+            self.rest = rest
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, self) is not self
+
+    def __iter__(self):
+        yield from map(str, range(len(self.list)))
+        yield from self.rest
+
+    def items(self):
+        return [ *zip(map(str, range(len(self.list))), self.list), *self.rest.items() ]
+
+    def __len__(self) -> int:
+        return len(self.list) + len(self.rest)
+
+    def __eq__(self, other) -> bool:
+        if type(other) is Table and not self.rest and not other.rest:
+            return self.list == other.list
+
+        return MutableMapping.__eq__(self, other)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
 # Returns tuple name
 def kind(val):
     return type(val).__name__
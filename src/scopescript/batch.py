@@ -0,0 +1,114 @@
+import marshal, multiprocessing, signal, threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from scopescript import interpreter as i
+
+# Runs independent programs on a pool of worker processes. Pools are kept per worker
+# count and reused across batches, so workers start once and stay warm. ASTs are sent
+# marshalled in chunks, and results come back as each chunk completes. Programs run from
+# a snapshot use pools of their own, whose workers are forked with the snapshot already in
+# memory, so it is shared with them rather than sent.
+
+# Worker pools by worker count and snapshot id, with the snapshot they hold.
+pools = {}
+pools_lock = threading.Lock()
+
+# Snapshot the programs of a worker start from.
+snapshot = None
+
+# Sets the snapshot of a worker, when it starts.
+def install(s) -> None:
+    global snapshot
+    snapshot = s
+
+# Set in a worker when the running program's time is up.
+expired = False
+
+# Interrupts the running program, called by the worker's interval timer.
+def expire(signum, frame):
+    global expired
+    expired = True
+    raise TimeoutError
+
+# Runs one program in a worker, stopping it after 'timeout' seconds. The interpreter
+# checks its deadline on loop iterations and calls. Where signal.setitimer is available, a
+# timer set for twice as long also stops work the interpreter cannot check, such as one
+# long built-in call.
+def run_one(p: list, max_depth: int, timeout: float | None) -> dict:
+    global expired
+    if not timeout:
+        return i.interp_program(p, max_depth, snapshot=snapshot)
+
+    if not hasattr(signal, 'setitimer'):
+        return i.interp_program(p, max_depth, timeout=timeout, snapshot=snapshot)
+
+    expired = False
+    prev = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout * 2)
+    try:
+        result = i.interp_program(p, max_depth, timeout=timeout, snapshot=snapshot)
+    except TimeoutError:
+        result = None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, prev)
+
+    return dict(kind='timeout', output=[]) if expired else result
+
+# Runs a chunk of marshalled programs in a worker.
+def run_chunk(chunk: list, max_depth: int, timeout: float | None) -> list:
+    return [ (index, run_one(marshal.loads(data), max_depth, timeout)) for index, data in chunk ]
+
+# Returns the shared pool with the given number of workers and snapshot, starting it if
+# needed. A snapshot holds closures, which cannot be sent to a process, so its workers are
+# forked.
+def get_pool(workers: int | None, s=None) -> ProcessPoolExecutor:
+    with pools_lock:
+        if (key := (workers, id(s))) not in pools:
+            if s is None:
+                pools[key] = ProcessPoolExecutor(workers), None
+            else:
+                pools[key] = ProcessPoolExecutor(workers, multiprocessing.get_context('fork'), install, (s,)), s
+
+        return pools[key][0]
+
+# Shuts down every shared pool.
+def shutdown() -> None:
+    with pools_lock:
+        for pool, _ in pools.values():
+            pool.shutdown()
+
+        pools.clear()
+
+# Groups programs into chunks of marshalled ASTs tagged with their position.
+def chunks(programs, chunksize: int):
+    chunk = []
+    for index, p in enumerate(programs):
+        chunk.append((index, marshal.dumps(p)))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+# Interprets many programs on 'workers' processes, yields (index, result) pairs in the
+# order runs complete. A program still running after 'timeout' seconds is stopped and
+# reported as a timeout. With a 'snapshot', every program starts from it.
+def interp_many(programs, workers: int | None = None, chunksize: int = 16, timeout: float | None = None, max_depth: int = i.MAX_DEPTH,
+                snapshot=None):
+    pool = get_pool(workers, snapshot)
+    futures = { pool.submit(run_chunk, chunk, max_depth, timeout): chunk for chunk in chunks(programs, chunksize) }
+    for future in as_completed(futures):
+        try:
+            results = future.result()
+        except BrokenProcessPool:
+            # A worker died, its pool cannot be reused.
+            with pools_lock:
+                if (entry := pools.get(key := (workers, id(snapshot)))) and entry[0] is pool:
+                    del pools[key]
+
+            results = [ (index, dict(kind='error', output=[])) for index, _ in futures[future] ]
+
+        yield from results
@@ -0,0 +1,194 @@
+from collections import namedtuple
+
+from scopescript import scope as s
+
+# Flat closures. A closure keeps only the states holding the variables it names, rather
+# than the whole chain of states it was created in. Its free variables are the names its
+# body, and the bodies of the closures inside it, read or assign, less its parameters.
+# A free variable is shared with the state holding it, which acts as the variable's cell,
+# unless no statement of the program ever assigns that name. Such a variable is bound once
+# and never changes, so its value is copied. A free variable not yet defined when the closure
+# is made may be defined later, by an assignment in one of the blocks around the closure,
+# so the states of those blocks are kept as well.
+
+# A closure's free variables and, for each state from the one it is made in up to the body
+# of the function around it or the program, the names the block of that state assigns.
+# 'beyond' holds the names assigned in the blocks further out.
+Capture = namedtuple('Capture', ['free', 'levels', 'beyond'])
+
+# The Capture of every closure of a program, by node id, and every name the program assigns.
+Analysis = namedtuple('Analysis', ['captures', 'assigned'])
+
+# Walks a program, one list of blocks for each function it is in. Each block is the set of
+# names assigned by the statements run in one state.
+class Walker:
+    def __init__(self) -> None:
+        self.captures = {}
+        self.assigned = set()
+        # Blocks of the functions around the node being walked, outermost first.
+        self.functions = []
+        # Names read or assigned by the body of each function around the node.
+        self.refs = []
+
+    # Walks the statements run in a new state, given the statements that state's block is
+    # made of and any other names it defines.
+    def level(self, statements: list, walk, defined: set = frozenset()) -> None:
+        names = set(defined)
+        for stmt in statements:
+            if stmt['kind'] == 'assignment':
+                names.update(t['name'] for t in stmt['assignArr'] if t['kind'] in ('identifier', 'variable'))
+
+        self.functions[-1].append(names)
+        walk()
+        self.functions[-1].pop()
+
+    def block(self, b: list) -> None:
+        for stmt in b:
+            self.statement(stmt)
+
+    def statement(self, e: dict) -> None:
+        match e['kind']:
+            case 'static' | 'return':
+                self.expression(e['expr'])
+            case 'assignment':
+                self.expression(e['expr'])
+                for t in e['assignArr']:
+                    self.target(t)
+            case 'if':
+                for part in e['truePartArr']:
+                    self.expression(part['test'])
+                # Every part runs in the same new state.
+                parts = [ part['part'] for part in e['truePartArr'] ] + [ e['falsePart'] ]
+                def walk():
+                    for part in parts:
+                        self.block(part)
+                self.level([ stmt for part in parts for stmt in part ], walk)
+            case 'while':
+                self.expression(e['test'])
+                self.level(e['body'], lambda: self.block(e['body']))
+            case 'for':
+                def walk():
+                    self.block(e['inits'])
+                    self.expression(e['test'])
+                    self.block(e['updates'])
+                    self.block(e['body'])
+                self.level(e['inits'] + e['updates'] + e['body'], walk)
+            case 'delete':
+                self.expression(e['expr'])
+
+    # Records a name a target assigns, and walks the expressions assigning to it evaluates.
+    def target(self, e: dict) -> None:
+        match e['kind']:
+            case 'identifier' | 'variable':
+                self.assigned.add(e['name'])
+                self.refs[-1].add(e['name'])
+            case 'attribute':
+                self.expression(e['collection'])
+            case 'subscriptor':
+                self.expression(e['expr'])
+                self.expression(e['collection'])
+
+    def expression(self, e: dict) -> None:
+        match e['kind']:
+            case 'variable':
+                self.refs[-1].add(e['name'])
+            case 'collection':
+                for val in e['value'].values():
+                    self.expression(val)
+            case 'attribute':
+                self.expression(e['collection'])
+            case 'subscriptor':
+                self.expression(e['collection'])
+                self.expression(e['expr'])
+            case 'unop':
+                if e['op'] in ('++', '--'):
+                    self.target(e['expr'])
+                self.expression(e['expr'])
+            case 'binop':
+                self.expression(e['e1'])
+                self.expression(e['e2'])
+            case 'ternary':
+                for part in (e['test'], e['trueExpr'], e['falseExpr']):
+                    self.expression(part)
+            case 'call':
+                self.expression(e['fun'])
+                for arg in e['args']:
+                    self.expression(arg)
+            case 'closure':
+                self.closure(e)
+
+    def closure(self, e: dict) -> None:
+        blocks = self.functions[-1]
+        levels = tuple(frozenset(names) for names in reversed(blocks))
+        beyond = frozenset().union(*(names for function in self.functions[:-1] for names in function))
+        self.functions.append([])
+        self.refs.append(set())
+        self.level(e['body'], lambda: self.block(e['body']))
+        self.functions.pop()
+        free = self.refs.pop().difference(e['params'])
+        self.refs[-1].update(free)
+        self.captures[id(e)] = Capture(tuple(free), levels, beyond)
+
+# Analyses a program, returns its Analysis or None for a program it cannot analyse. An
+# 'open' program may be followed by others, as a prelude is, that define the globals its
+# functions name. Those names count as defined by its top level, so the functions keep
+# the global state.
+def analyse(p: list, open: bool = False) -> Analysis | None:
+    defined = set()
+    for _ in range(2 if open else 1):
+        walker = Walker()
+        walker.functions.append([])
+        walker.refs.append(set())
+        try:
+            walker.level(p, lambda: walker.block(p), defined)
+        except (KeyError, TypeError, AttributeError, RecursionError):
+            return None
+
+        defined = walker.refs[0]
+
+    return Analysis(walker.captures, walker.assigned)
+
+# Returns the state a closure made in 'state' is called in, holding only the variables
+# of its Capture. The states kept are linked in the order they had, below a state holding
+# the copied values. Returns 'state' when it does not match the Capture.
+def environment(state: s.State, capture: Capture, assigned: set) -> s.State:
+    levels, curr = [], state
+    while curr and len(levels) < len(capture.levels):
+        levels.append(curr)
+        curr = curr.parent
+
+    if len(levels) < len(capture.levels):
+        return state
+
+    copies, kept, beyond = {}, set(), False
+    for name in capture.free:
+        if (found := s.find_in_scope(state, name)):
+            if name in assigned:
+                kept.add(id(found[0]))
+            else:
+                copies[name] = found
+            continue
+
+        for level, names in zip(levels, capture.levels):
+            if name in names:
+                kept.add(id(level.value))
+
+        beyond = beyond or name in capture.beyond
+
+    # A copied variable held by a state kept anyway is read from that state.
+    copies = { name: found[1] for name, found in copies.items() if id(found[0]) not in kept }
+    chain, curr, depth = [], state, 0
+    while curr:
+        if id(curr.value) in kept or beyond and depth >= len(levels):
+            chain.append(curr.value)
+
+        curr, depth = curr.parent, depth + 1
+
+    env = None
+    for values in reversed(chain):
+        env = s.State(values, env, state.output, state.cache)
+
+    if copies or env is None:
+        env = s.State(copies, env, state.output, state.cache)
+
+    return env
@@ -0,0 +1,904 @@
+import operator
+
+from scopescript import scope as s
+from scopescript import interpreter as i
+from scopescript import values as v
+
+# The compiler turns a program's AST into a tree of pre-bound python closures once.
+# Each expression node becomes a function of the current state that returns a native
+# value (see values.py), each statement node becomes a function of the current state that
+# returns a control tuple or None. Flags are known from the position of a node in the tree,
+# so misplaced statements are compiled into functions that report the error when reached.
+#
+# Variables are resolved ahead of time. A state's value is a fixed-size list with one
+# slot per name bound in its block, unassigned marks a slot that is not assigned yet. Each
+# variable reference holds the (depth, slot) address of every state that may bind it,
+# innermost first, so a lookup follows parent links instead of probing dictionaries.
+# Variables are never unbound, so once a name no enclosing block binds is assigned
+# unconditionally earlier in a block, references that follow stop at that address and
+# nested blocks do not bind it.
+
+# Compiled programs recurse on the python stack, this limit allows roughly 1000 calls. It
+# grows with the call depth limit of a run.
+RECURSION_LIMIT = 12050
+
+# Marks a slot that is not assigned yet.
+unassigned = object()
+
+# Names bound by a block, mapped to their slot in the block's state, and the names
+# known to be assigned at the current point of compilation.
+class Scope:
+    def __init__(self, names: dict, parent) -> None:
+        self.names = names
+        self.parent = parent
+        self.bound = set()
+    # Whether the name is known to be assigned in this or an enclosing state.
+    def is_bound(self, name: str) -> bool:
+        curr = self
+        while curr:
+            if name in curr.bound:
+                return True
+            curr = curr.parent
+
+        return False
+    # Marks names assigned by a statement. An assignment writes to an enclosing state
+    # that holds the name whenever that state has it assigned, so a name is only known to
+    # be assigned here when no enclosing state has a slot for it.
+    def assign(self, names: list) -> None:
+        for name in names:
+            if name in self.names and not self.outer_has(name):
+                self.bound.add(name)
+    # Whether an enclosing state has a slot for the name.
+    def outer_has(self, name: str) -> bool:
+        curr = self.parent
+        while curr:
+            if name in curr.names:
+                return True
+            curr = curr.parent
+
+        return False
+    # Addresses of every enclosing state that may bind the name, innermost first,
+    # and whether the last address is known to be assigned.
+    def resolve(self, name: str) -> tuple:
+        addrs, depth, curr = [], 0, self
+        while curr:
+            if name in curr.names:
+                addrs.append((depth, curr.names[name]))
+            if name in curr.bound:
+                return addrs, True
+            curr, depth = curr.parent, depth + 1
+
+        return addrs, False
+
+# Names assigned by an assignment statement.
+def assigned_names(x: dict) -> list:
+    if x['kind'] != 'assignment':
+        return []
+
+    return [ t['name'] for t in x['assignArr'] if t['kind'] in ('identifier', 'variable') ]
+
+# Collects the names assigned directly in a block, nested blocks bind in their own states.
+# Names already assigned in an outer state are always found there and need no slot.
+def bind_names(b: list, names: dict, outer=None) -> dict:
+    for x in b:
+        for name in assigned_names(x):
+            if not (outer and outer.is_bound(name)):
+                names.setdefault(name, len(names))
+
+    return names
+
+# Follows parent links from a state.
+def hop(state: s.State, depth: int) -> s.State:
+    for _ in range(depth):
+        state = state.parent
+
+    return state
+
+# Compiles a lookup of the first assigned address, unassigned when no address is assigned.
+def compile_load(addrs: list):
+    match addrs:
+        case []:
+            return lambda state: unassigned
+        case [(0, slot)]:
+            return lambda state: state.value[slot]
+        case [(1, slot)]:
+            return lambda state: state.parent.value[slot]
+        case [(2, slot)]:
+            return lambda state: state.parent.parent.value[slot]
+        case [(depth, slot)]:
+            return lambda state: hop(state, depth).value[slot]
+
+    def load(state):
+        hops = 0
+        for depth, slot in addrs:
+            while hops < depth:
+                state, hops = state.parent, hops + 1
+            if (val := state.value[slot]) is not unassigned:
+                return val
+
+        return unassigned
+
+    return load
+
+# Compiles a store to the first assigned address, the innermost state's own slot otherwise.
+def compile_store(addrs: list, bound: bool):
+    own = addrs[0][1] if addrs and addrs[0][0] == 0 else None
+    if len(addrs) == 1 and (bound or own is not None):
+        depth, slot = addrs[0]
+        def store_at(state, val):
+            hop(state, depth).value[slot] = val
+            return True
+
+        if depth == 0:
+            def store_at(state, val):
+                state.value[slot] = val
+                return True
+
+        return store_at
+
+    def store(state, val):
+        curr, hops = state, 0
+        for depth, slot in addrs:
+            while hops < depth:
+                curr, hops = curr.parent, hops + 1
+            if curr.value[slot] is not unassigned:
+                curr.value[slot] = val
+                return True
+
+        state.value[own] = val
+        return True
+
+    return store
+
+# Creates a function that reports an error when it is reached.
+def fail(msg):
+    return lambda state: i.error(state, msg())
+
+# Evaluates a literal once, or defers a failing literal to run time.
+def literal(f, e: dict):
+    try:
+        val = f(e)
+    except:
+        return lambda state: f(e)
+
+    return lambda state: val
+
+
+# Atom expressions
+
+# Compiles null
+def _null_(e: dict, scope):
+    return literal(lambda e: None, e)
+
+# Compiles boolean
+def _boolean_(e: dict, scope):
+    return literal(lambda e: e['value'], e)
+
+# Compiles string
+def _string_(e: dict, scope):
+    return literal(lambda e: e['value'], e)
+
+# Compiles integer
+def _integer_num_(e: dict, scope):
+    return literal(lambda e: int(e['value']), e)
+
+# Compiles float
+def _float_num_(e: dict, scope):
+    return literal(lambda e: float(e['value']), e)
+
+# Compiles variable
+def _variable_(e: dict, scope):
+    name, (addrs, bound) = e['name'], scope.resolve(e['name'])
+    load = compile_load(addrs)
+    # Assigned variables need no check.
+    if bound and len(addrs) == 1:
+        return load
+
+    def variable(state):
+        if (val := load(state)) is unassigned:
+            i.error(state, f"Line {e['line']}: Variable '{name}' is not defined.")
+
+        return val
+
+    return variable
+
+# Compiles collection
+def _collection_(e: dict, scope):
+    items = [ (key, compile_expression(val, scope)) for key, val in e['value'].items() ]
+    return lambda state: { key: f(state) for key, f in items }
+
+# Compiles closure, the body is compiled once and shared by every closure it creates.
+# A closure's body is entered with its parent state and the list of argument values.
+def _closure_(e: dict, scope):
+    params, names = e['params'], {}
+    for param in params:
+        names.setdefault(param, len(names))
+
+    slots, inner = [ names[param] for param in params ], Scope(names, scope)
+    inner.bound.update(params)
+    bind_names(e['body'], names, inner)
+    block, size = compile_block(e['body'], inner, i.Flags(True, False)), len(names)
+    # Distinct parameters fill the leading slots in order.
+    if slots == list(range(len(params))):
+        pad = [unassigned] * (size - len(params))
+        def enter(parent, vals):
+            return block(s.State(vals + pad, parent, parent.output, parent.cache))
+    else:
+        def enter(parent, vals):
+            frame = [unassigned] * size
+            for slot, val in zip(slots, vals):
+                frame[slot] = val
+
+            return block(s.State(frame, parent, parent.output, parent.cache))
+
+    return lambda state: s.Closure(params, enter, state)
+
+
+# Collection handling
+
+# Compiles the attribute of an expression, None for unknown attribute types.
+def compile_attribute(e: dict, scope):
+    match e['kind']:
+        case 'attribute':
+            attribute = e['attribute']
+            return lambda state: attribute
+        case 'subscriptor':
+            key = compile_expression(e['expr'], scope)
+            def subscriptor_key(state):
+                r = key(state)
+                if v.not_subscriptable(r):
+                    i.error(state, f"Line {e['line']}: invalid key type for attribute assignment: <{v.kind(r)}>.")
+
+                return str(r)
+
+            return subscriptor_key
+
+    return None
+
+# Compiles attribute reference
+def _handle_attribute_(e: dict, scope):
+    collection, attribute = compile_expression(e['collection'], scope), e['attribute']
+    def handle_attribute(state):
+        c = collection(state)
+        if type(c) is not dict:
+            i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{v.kind(c)}>.")
+
+        return c.get(attribute)
+
+    return handle_attribute
+
+# Compiles subscriptor on a collection or string
+def _handle_subscriptor_(e: dict, scope):
+    collection, expr = compile_expression(e['collection'], scope), compile_expression(e['expr'], scope)
+    def handle_subscriptor(state):
+        c, attribute = collection(state), expr(state)
+        if type(c) is not dict:
+            # String indexing
+            if type(c) is str and v.is_integer(attribute):
+                if not -len(c) <= attribute < len(c):
+                    i.error(state, f"Line {e['line']}: invalid string index for '{c}': {attribute}.")
+
+                return c[attribute]
+
+            i.error(state, f"Line {e['line']}: invalid collection type for attribute '{v.to_atom(attribute).value}': <{v.kind(c)}>.")
+
+        if v.not_subscriptable(attribute):
+            i.error(state, f"Line {e['line']}: invalid key type for attribute '{v.to_atom(attribute).value}': <{v.kind(attribute)}>.")
+
+        return c.get(str(attribute))
+
+    return handle_subscriptor
+
+
+# Assignment handling
+
+# Compiles an assignment target into a function of state and value that returns whether the value was assigned.
+def compile_assign(e: dict, scope):
+    match e['kind']:
+        case 'identifier' | 'variable':
+            return compile_store(*scope.resolve(e['name']))
+
+    attribute = compile_attribute(e, scope)
+    # Unknown assignment type.
+    if not attribute:
+        return lambda state, val: False
+
+    collection = compile_expression(e['collection'], scope)
+    def assign(state, val):
+        attr = attribute(state)
+        if not attr:
+            return False
+
+        c = collection(state)
+        if type(c) is not dict:
+            i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attr}': <{v.kind(c)}>.")
+
+        c[attr] = val
+        return True
+
+    return assign
+
+
+# Unary operators
+
+# '!'
+def _logical_not_(e: dict, scope):
+    x = compile_expression(e['expr'], scope)
+    return lambda state: not x(state)
+
+# '~'
+def _bit_not_(e: dict, scope):
+    x = compile_expression(e['expr'], scope)
+    def bit_not(state):
+        val = x(state)
+        if not v.is_integer(val):
+            i.error(state, f"Line {e['line']}: invalid operand type for '~': <{v.kind(val)}>.")
+
+        return ~val
+
+    return bit_not
+
+# Prefix increment or decrement
+def prefix(e: dict, scope, step: int):
+    x, assign, op = compile_expression(e['expr'], scope), compile_assign(e['expr'], scope), e['op']
+    def prefix_step(state):
+        val = x(state)
+        if v.not_number(val):
+            i.error(state, f"Line {e['line']}: invalid operand type for {op}: <{v.kind(val)}>.")
+
+        res = val + step
+        if not assign(state, res):
+            i.error(state, f"Line {e['line']}: invalid prefix syntax for {op}: <{v.kind(val)}>.")
+
+        return res
+
+    return prefix_step
+
+# Unary plus or minus
+def plus_minus(e: dict, scope, fact: int):
+    x = compile_expression(e['expr'], scope)
+    def sign(state):
+        val = x(state)
+        if v.not_number(val):
+            i.error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{v.kind(val)}>.")
+
+        return val * fact
+
+    return sign
+
+# Unary operations
+unops = {
+    '!': _logical_not_,
+    '~': _bit_not_,
+    '++': lambda e, scope: prefix(e, scope, 1),
+    '--': lambda e, scope: prefix(e, scope, -1),
+    '+': lambda e, scope: plus_minus(e, scope, 1),
+    '-': lambda e, scope: plus_minus(e, scope, -1)
+}
+
+# Compiles a given unary operation
+def _determine_unop_(e: dict, scope):
+    op = e['op']
+    if op not in unops:
+        return fail(lambda: f"Line {e['line']}: unknown operator {op}.")
+
+    return unops[op](e, scope)
+
+
+# Binary operators
+
+# Reports an unsupported binary operation.
+def binop_error(state: s.State, e: dict, v1, v2):
+    i.error(state, f"Line {e['line']}: operator '{e['op']}' not supported between types <{v.kind(v1)}> and <{v.kind(v2)}>.")
+
+# Compiles a numeric binary operation, strings are joined when 'concat' is set. Python's
+# operators give integer results between integers and booleans and float results otherwise.
+def binop_numeric(e: dict, scope, f, concat=False):
+    e1, e2, numbers = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope), v.numbers
+    def numeric(state):
+        v1, v2 = e1(state), e2(state)
+        if type(v1) in numbers and type(v2) in numbers:
+            return f(v1, v2)
+
+        if not (concat and v.are_strings(v1, v2)):
+            binop_error(state, e, v1, v2)
+
+        return f(v1, v2)
+
+    return numeric
+
+# Compiles a bitwise binary operation, booleans combine into an integer holding a boolean.
+def binop_bit(e: dict, scope, f):
+    e1, e2 = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope)
+    def bit(state):
+        v1, v2 = e1(state), e2(state)
+        if type(v1) is int and type(v2) is int:
+            return f(v1, v2)
+
+        if v.not_integers(v1, v2):
+            binop_error(state, e, v1, v2)
+
+        res = f(bool(v1) if type(v1) is v.IntBool else v1, bool(v2) if type(v2) is v.IntBool else v2)
+        return v.IntBool(res) if type(res) is bool else res
+
+    return bit
+
+# Compiles a comparison binary operation.
+def binop_cmp(e: dict, scope, f):
+    e1, e2, numbers = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope), v.numbers
+    def cmp(state):
+        v1, v2 = e1(state), e2(state)
+        if (type(v1) not in numbers or type(v2) not in numbers) and not v.are_strings(v1, v2):
+            binop_error(state, e, v1, v2)
+
+        return f(v1, v2)
+
+    return cmp
+
+# Compiles an equality binary operation, defined between all types.
+def binop_eq(e: dict, scope, f):
+    e1, e2 = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope)
+    return lambda state: f(e1(state), e2(state))
+
+# '&&'
+def _logical_and_(e: dict, scope):
+    e1, e2 = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope)
+    def logical_and(state):
+        v1 = e1(state)
+        return v1 if not v1 else e2(state)
+
+    return logical_and
+
+# '||'
+def _logical_or_(e: dict, scope):
+    e1, e2 = compile_expression(e['e1'], scope), compile_expression(e['e2'], scope)
+    def logical_or(state):
+        v1 = e1(state)
+        return v1 if v1 else e2(state)
+
+    return logical_or
+
+# Binary operations
+binops = {
+    '&&': _logical_and_,
+    '||': _logical_or_,
+    '+': lambda e, scope: binop_numeric(e, scope, operator.add, concat=True),
+    '-': lambda e, scope: binop_numeric(e, scope, operator.sub),
+    '*': lambda e, scope: binop_numeric(e, scope, operator.mul),
+    '/': lambda e, scope: binop_numeric(e, scope, operator.truediv),
+    '%': lambda e, scope: binop_numeric(e, scope, operator.mod),
+    '<<': lambda e, scope: binop_bit(e, scope, operator.lshift),
+    '>>': lambda e, scope: binop_bit(e, scope, operator.rshift),
+    '&': lambda e, scope: binop_bit(e, scope, operator.and_),
+    '|': lambda e, scope: binop_bit(e, scope, operator.or_),
+    '^': lambda e, scope: binop_bit(e, scope, operator.xor),
+    '==': lambda e, scope: binop_eq(e, scope, operator.eq),
+    '!=': lambda e, scope: binop_eq(e, scope, operator.ne),
+    '<': lambda e, scope: binop_cmp(e, scope, operator.lt),
+    '>': lambda e, scope: binop_cmp(e, scope, operator.gt),
+    '<=': lambda e, scope: binop_cmp(e, scope, operator.le),
+    '>=': lambda e, scope: binop_cmp(e, scope, operator.ge)
+}
+
+# Compiles a given binary operation.
+def _determine_binop_(e: dict, scope):
+    op = e['op']
+    if op not in binops:
+        return fail(lambda: f"Line {e['line']}: unknown operator {op}.")
+
+    return binops[op](e, scope)
+
+
+# Built-in functions, each receives the call node and its evaluated arguments.
+# Argument counts are checked before any argument is evaluated.
+
+# Built-in type function
+def _type_(state, e, args) -> str:
+    return v.kind(args[0])
+
+# Built-in ord function
+def _ord_(state, e, args) -> int:
+    character = args[0]
+    if type(character) is not str:
+        i.error(state, f"Line {e['line']}: expected a character for ord(...), received <{v.kind(character)}>.")
+
+    if len(character) != 1:
+        i.error(state, f"Line {e['line']}: expected a character for ord(...), received a string of length {len(character)}.")
+
+    return ord(character)
+
+# Built-in abs function
+def _abs_(state, e, args) -> int | float:
+    number = args[0]
+    if v.not_number(number):
+        i.error(state, f"Line {e['line']}: invalid argument type for abs(...): <{v.kind(number)}>.")
+
+    return abs(number)
+
+# Built-in len function
+def _len_(state, e, args) -> int:
+    iterable = args[0]
+    if v.not_iterable(iterable):
+        i.error(state, f"Line {e['line']}: expected a string or collection for len(...), received <{v.kind(iterable)}>.")
+
+    return len(iterable)
+
+# Built-in pow function. Without float arguments the result is an integer, even one holding
+# a float.
+def _pow_(state, e, args) -> int | float:
+    b, p = args
+    if v.not_numbers(b, p):
+        i.error(state, f"Line {e['line']}: invalid argument types for pow(...), received <{v.kind(b)}> and <{v.kind(p)}>.")
+
+    res = pow(b, p)
+    if type(res) is float and type(b) is not float and type(p) is not float:
+        return v.IntFloat(res)
+
+    return res
+
+# Built-in bool function
+def _bool_(state, e, args) -> bool:
+    return bool(args[0])
+
+# Built-in int function
+def _int_(state, e, args) -> int:
+    num = args[0]
+    if type(num) is str:
+        try:
+            return int(num)
+        except:
+            i.error(state, f"Line {e['line']}: invalid literal for int(...) with base 10: '{num}'.")
+
+    if v.not_number(num):
+        i.error(state, f"Line {e['line']}: invalid argument type for int(...): <{v.kind(num)}>.")
+
+    return int(num)
+
+# Built-in float function
+def _float_(state, e, args) -> float:
+    num = args[0]
+    if type(num) is str:
+        try:
+            return float(num)
+        except:
+            i.error(state, f"Line {e['line']}: could not convert string for float(...): '{num}'.")
+
+    if v.not_number(num):
+        i.error(state, f"Line {e['line']}: invalid argument type for float(...): <{v.kind(num)}>.")
+
+    return float(num)
+
+# Built-in str function
+def _str_(state, e, args) -> str:
+    return v.str_rep(args[0])
+
+# Built-in functions and their argument counts. print takes any number of arguments
+# and writes each one as soon as it is evaluated, so it is compiled separately.
+built_funcs = {
+    'type': (1, _type_),
+    'ord': (1, _ord_),
+    'abs': (1, _abs_),
+    'pow': (2, _pow_),
+    'len': (1, _len_),
+    'bool': (1, _bool_),
+    'int': (1, _int_),
+    'float': (1, _float_),
+    'str': (1, _str_)
+}
+
+# Reports an invalid argument count for a built-in function.
+def arg_count_message(e: dict, name: str) -> str:
+    return f"Line {e['line']}: invalid argument count for {name}(...): {len(e['args'])}."
+
+# Compiles a call to a built-in function, None when there is no such built-in.
+def compile_builtin(name: str, e: dict, args: list):
+    if name == 'print':
+        def print_(state):
+            out = state.output
+            for arg in args:
+                out.append(v.str_rep(arg(state)))
+                out.append(' ')
+
+            out.append('\n')
+            return None
+
+        return print_
+
+    if name not in built_funcs:
+        return None
+
+    count, f = built_funcs[name]
+    if len(args) != count:
+        return fail(lambda: arg_count_message(e, name))
+
+    if count == 1:
+        arg = args[0]
+        return lambda state: f(state, e, [arg(state)])
+
+    return lambda state: f(state, e, [ arg(state) for arg in args ])
+
+# Compiles a call, named functions override built-in functions.
+def _call_(e: dict, scope):
+    f, args = e['fun'], [ compile_expression(arg, scope) for arg in e['args'] ]
+    name, fun = None, None
+    if f['kind'] == 'variable':
+        name, load = f['name'], compile_load(scope.resolve(f['name'])[0])
+        builtin = compile_builtin(name, e, args)
+    else:
+        fun = compile_expression(f, scope)
+
+    def call(state):
+        if name:
+            if (func_expr := load(state)) is not unassigned:
+                pass
+            elif builtin:
+                return builtin(state)
+            else:
+                i.error(state, f"Line {e['line']}: function {name}(...) is not defined.")
+        else:
+            func_expr = fun(state)
+
+        if type(func_expr) is not s.Closure:
+            i.error(state, f"Line {e['line']}: invalid type for function call: <{v.kind(func_expr)}>.")
+
+        func = func_expr
+        if len(args) != len(func.params):
+            func_name = name or '(anonymous) func@' + str(hex(id(func)))
+            i.error(state, f"Line {e['line']}: invalid argument count for {func_name}(...): Expected {len(func.params)}.")
+        # Evaluate arguments in the calling state.
+        vals = [ arg(state) for arg in args ]
+        calls = state.cache
+        try:
+            if calls[0] >= calls[1]:
+                raise RecursionError
+
+            calls[0] += 1
+            try:
+                result = func.body(func.parent, vals)
+            finally:
+                calls[0] -= 1
+        except RecursionError:
+            func_name = name or '(anonymous) func@' + str(hex(id(func)))
+            i.error(state, f"Line {e['line']}: maximum recursion depth exceeded for {func_name}(...).")
+
+        if not result:
+            return None
+
+        return result[1]
+
+    return call
+
+# Compiles ternary
+def _ternary_(e: dict, scope):
+    test = compile_expression(e['test'], scope)
+    true_expr, false_expr = compile_expression(e['trueExpr'], scope), compile_expression(e['falseExpr'], scope)
+    return lambda state: true_expr(state) if test(state) else false_expr(state)
+
+# Expressions
+expressions = {
+    'null': _null_,
+    'boolean': _boolean_,
+    'string': _string_,
+    'integer': _integer_num_,
+    'float': _float_num_,
+    'variable': _variable_,
+    'collection': _collection_,
+    'closure': _closure_,
+    'subscriptor': _handle_subscriptor_,
+    'attribute': _handle_attribute_,
+    'unop': _determine_unop_,
+    'binop': _determine_binop_,
+    'call': _call_,
+    'ternary': _ternary_,
+}
+
+# Compiles a given expression
+def compile_expression(e: dict, scope):
+    kind = e['kind']
+    if kind not in expressions:
+        return fail(lambda: f"Line {e['line']}: unknown expression: <{kind}>.")
+
+    return expressions[kind](e, scope)
+
+
+# Statements
+
+# Compiles static statement
+def _static_(e: dict, scope, flags: tuple):
+    expr = compile_expression(e['expr'], scope)
+    def static(state):
+        expr(state)
+        return None
+
+    return static
+
+# Compiles assignment statement
+def _assignment_(e: dict, scope, flags: tuple):
+    expr = compile_expression(e['expr'], scope)
+    targets = [ (t, compile_assign(t, scope)) for t in e['assignArr'] ]
+    scope.assign(assigned_names(e))
+    def assignment(state):
+        val = expr(state)
+        for t, assign in targets:
+            if not assign(state, val) or val is v.broken:
+                i.error(state, f"Line {t['line']}: unknown assignment type: <{t['kind']}>.")
+
+        return None
+
+    return assignment
+
+# Compiles if statement
+def _if_(e: dict, scope, flags: tuple):
+    names = {}
+    for p in e['truePartArr']:
+        bind_names(p['part'], names, scope)
+
+    inner, size = Scope(bind_names(e['falsePart'], names, scope), scope), len(names)
+    # Only one part runs, names assigned in one part are unknown to the others.
+    parts = []
+    for p in e['truePartArr']:
+        inner.bound = set()
+        parts.append((compile_expression(p['test'], scope), compile_block(p['part'], inner, flags)))
+
+    inner.bound = set()
+    false_part = compile_block(e['falsePart'], inner, flags)
+    def if_stmt(state):
+        new_state = s.State([unassigned] * size, state, state.output, state.cache)
+        for test, part in parts:
+            if test(state):
+                return part(new_state)
+
+        return false_part(new_state)
+
+    return if_stmt
+
+# Compiles while statement
+def _while_(e: dict, scope, flags: tuple):
+    inner = Scope(bind_names(e['body'], {}, scope), scope)
+    test, body, size = compile_expression(e['test'], scope), compile_block(e['body'], inner, i.Flags(flags.in_func, True)), len(inner.names)
+    def while_stmt(state):
+        new_state = s.State([unassigned] * size, state, state.output, state.cache)
+        while test(state):
+            if (res := body(new_state)):
+                match res[0]:
+                    case 'return' | 'break':
+                        return res
+
+        return None
+
+    return while_stmt
+
+# Compiles for statement, initializers and updates are compiled without flags.
+def _for_(e: dict, scope, flags: tuple):
+    names = bind_names(e['body'], bind_names(e['updates'], bind_names(e['inits'], {}, scope), scope), scope)
+    inner = Scope(names, scope)
+    inits = [ compile_statement(x, inner) for x in e['inits'] ]
+    # Updates also run after a body that continued early.
+    test, updates = compile_expression(e['test'], inner), [ compile_statement(x, inner) for x in e['updates'] ]
+    body, size = compile_block(e['body'], inner, i.Flags(flags.in_func, True)), len(names)
+    def for_stmt(state):
+        new_state = s.State([unassigned] * size, state, state.output, state.cache)
+        for init in inits:
+            init(new_state)
+
+        while test(new_state):
+            if (res := body(new_state)):
+                match res[0]:
+                    case 'return' | 'break':
+                        return res
+
+            for update in updates:
+                update(new_state)
+
+        return None
+
+    return for_stmt
+
+# Compiles delete statement
+def _delete_(e: dict, scope, flags: tuple):
+    expr = e['expr']
+    attribute = compile_attribute(expr, scope)
+    if not attribute:
+        return fail(lambda: f"Line {e['line']}: cannot delete <{expr['kind']}>.")
+
+    collection = compile_expression(expr['collection'], scope)
+    def delete(state):
+        attr = attribute(state)
+        if not attr:
+            i.error(state, f"Line {e['line']}: cannot delete <{expr['kind']}>.")
+
+        c = collection(state)
+        if type(c) is not dict:
+            i.error(state, f"Line {e['line']}: invalid collection type for attribute deletion '{attr}': <{v.kind(c)}>.")
+
+        if attr in c:
+            del c[attr]
+        else:
+            i.error(state, f"Line {expr['line']}: unknown attribute reference: '{attr}'.")
+
+        return None
+
+    return delete
+
+# Compiles return statement
+def _return_(e: dict, scope, flags: tuple):
+    if not flags.in_func:
+        return fail(lambda: f"Line {e['line']}: return outside of function.")
+
+    expr = compile_expression(e['expr'], scope)
+    return lambda state: ('return', expr(state))
+
+# Compiles break statement
+def _break_(e: dict, scope, flags: tuple):
+    if not flags.in_loop:
+        return fail(lambda: f"Line {e['line']}: break outside of loop.")
+
+    return lambda state: ('break', v.broken)
+
+# Compiles continue statement
+def _continue_(e: dict, scope, flags: tuple):
+    if not flags.in_loop:
+        return fail(lambda: f"Line {e['line']}: continue outside of loop.")
+
+    return lambda state: ('continue', None)
+
+# Statements
+statements = {
+    'static': _static_,
+    'assignment': _assignment_,
+    'if': _if_,
+    'while': _while_,
+    'for': _for_,
+    'delete': _delete_,
+    'return': _return_,
+    'break': _break_,
+    'continue': _continue_
+}
+
+# Compiles a given statement
+def compile_statement(e: dict, scope, flags: tuple = i.Flags(False, False)):
+    kind = e['kind']
+    if kind not in statements:
+        return fail(lambda: f"Unknown statement: <{kind}>.")
+
+    return statements[kind](e, scope, flags)
+
+# Compiles a block of code, the block returns the first control tuple produced by a statement.
+def compile_block(b: list, scope, flags: tuple = i.Flags(False, False)):
+    stmts = [ compile_statement(x, scope, flags) for x in b ]
+    def block(state):
+        for stmt in stmts:
+            if (res := stmt(state)):
+                return res
+
+        return None
+
+    return block
+
+
+# Compiles a program's AST once, the result can be executed any number of times with run_program.
+# A compiled program receives an output list and runs in a fresh global state. Compiling
+# recurses on the python stack, a program nested too deeply to compile fails when it runs.
+def compile_program(p: list):
+    try:
+        with i.recursion_limit(RECURSION_LIMIT):
+            scope = Scope(bind_names(p, {}), None)
+            block, size = compile_block(p, scope), len(scope.names)
+    except RecursionError:
+        block, size = fail(lambda: 'Program is nested too deeply to compile.'), 0
+    # The global state's cache holds the number of active calls and the limit on it.
+    return lambda out, max_depth=i.MAX_DEPTH: block(s.State([unassigned] * size, None, out, [0, max_depth]))
+
+# Executes a compiled program and produces its output. Like the interpreter, it stops a
+# program making more than 'max_depth' nested calls.
+def run_program(code, max_depth: int = i.MAX_DEPTH) -> dict:
+    out = []
+    try:
+        with i.recursion_limit(max(RECURSION_LIMIT, RECURSION_LIMIT * max_depth // i.MAX_DEPTH)):
+            code(out, max_depth)
+
+        return dict(kind='ok', output=out)
+    except i.ScopeScriptError as err:
+        return dict(kind='error', output=[str(err)])
+    except:
+        return dict(kind='error', output=[])
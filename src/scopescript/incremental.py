@@ -0,0 +1,228 @@
+import time
+from collections import namedtuple
+
+from scopescript import interpreter as i
+from scopescript import scope as s
+from scopescript import closures as cl
+from scopescript import snapshot as sn
+
+# Incremental re-execution. A session runs one program after another, each an edit of the
+# last, and gives the result a full run would give. It records each top-level statement's
+# reads, writes and output, and keeps snapshots of the global state before some statements.
+# A new program runs from the latest snapshot at or before the first statement that changed,
+# the output of the statements before it is reused. A statement that changes no variable
+# is not run again while the variables it reads are unchanged, its output is reused. A
+# session assumes programs are deterministic, as they are with the built-in functions.
+
+# Least run time, in seconds, between snapshots of the state.
+CHECKPOINT_INTERVAL = 0.005
+
+# Run time between snapshots, as a multiple of the time the last snapshot took.
+CHECKPOINT_COST = 4
+
+# The names a top-level statement reads and the global names it may assign. 'writes' is
+# None when the statement may change more than its variables: it calls a function of the
+# program, or changes a collection.
+Effects = namedtuple('Effects', ['reads', 'writes'])
+
+# A completed top-level statement's Effects and the output it wrote.
+Record = namedtuple('Record', ['effects', 'output'])
+
+# Finds the Effects of a statement. 'builtins' holds the built-in functions the program
+# calls that it never defines, calling them changes no variable.
+class Tracer:
+    def __init__(self, builtins: set) -> None:
+        self.builtins = builtins
+        self.reads = set()
+        self.writes = set()
+        self.known = True
+
+    def block(self, b: list) -> None:
+        for stmt in b:
+            self.statement(stmt)
+
+    def statement(self, e: dict) -> None:
+        match e['kind']:
+            case 'static' | 'return':
+                self.expression(e['expr'])
+            case 'assignment':
+                self.expression(e['expr'])
+                for t in e['assignArr']:
+                    self.target(t)
+            case 'if':
+                for part in e['truePartArr']:
+                    self.expression(part['test'])
+                    self.block(part['part'])
+                self.block(e['falsePart'])
+            case 'while':
+                self.expression(e['test'])
+                self.block(e['body'])
+            case 'for':
+                self.block(e['inits'])
+                self.expression(e['test'])
+                self.block(e['updates'])
+                self.block(e['body'])
+            case 'delete':
+                self.known = False
+                self.expression(e['expr'])
+
+    def target(self, e: dict) -> None:
+        match e['kind']:
+            case 'identifier' | 'variable':
+                self.writes.add(e['name'])
+            case _:
+                self.known = False
+                self.expression(e)
+
+    def expression(self, e: dict) -> None:
+        match e['kind']:
+            case 'variable':
+                self.reads.add(e['name'])
+            case 'collection':
+                for val in e['value'].values():
+                    self.expression(val)
+            case 'attribute':
+                self.expression(e['collection'])
+            case 'subscriptor':
+                self.expression(e['collection'])
+                self.expression(e['expr'])
+            case 'unop':
+                if e['op'] in ('++', '--'):
+                    self.target(e['expr'])
+                self.expression(e['expr'])
+            case 'binop':
+                self.expression(e['e1'])
+                self.expression(e['e2'])
+            case 'ternary':
+                for part in (e['test'], e['trueExpr'], e['falseExpr']):
+                    self.expression(part)
+            case 'call':
+                f = e['fun']
+                if f['kind'] != 'variable' or f['name'] not in self.builtins:
+                    self.known = False
+                self.expression(f)
+                for arg in e['args']:
+                    self.expression(arg)
+            case 'closure':
+                # The body runs when the function is called, a closure made reads the
+                # variables it names.
+                walker = cl.Walker()
+                walker.functions.append([])
+                walker.refs.append(set())
+                walker.closure(e)
+                self.reads.update(walker.refs[0])
+
+# Returns the Effects of a top-level statement.
+def effects(e: dict, builtins: set) -> Effects:
+    tracer = Tracer(builtins)
+    try:
+        tracer.statement(e)
+    except (KeyError, TypeError, AttributeError, RecursionError):
+        return Effects(frozenset(), None)
+
+    return Effects(frozenset(tracer.reads), frozenset(tracer.writes) if tracer.known else None)
+
+# Runs the successive versions of a program being edited. The state is snapshot once the
+# statements run since the last snapshot changed it and ran for 'interval' seconds, or
+# 'cost' times as long as the last snapshot took. A session is used by one thread at a time.
+# 'ran' holds the indices of the statements the last run executed.
+class Session:
+    def __init__(self, interp: i.Interpreter | None = None, interval: float = CHECKPOINT_INTERVAL, cost: float = CHECKPOINT_COST) -> None:
+        self.interp = i.Interpreter() if interp is None else interp
+        self.interval, self.cost = interval, cost
+        # Statements of the last program, and the Record of each one it completed.
+        self.program = []
+        self.records = []
+        # Snapshots of the global state before a statement, by the statement's index.
+        self.checkpoints = {}
+        # Result of the last run when a statement failed, the one after the last completed.
+        self.failure = None
+        self.ran = []
+
+    # Runs a program, an edit of the last one run, and returns the result interp_program
+    # gives. 'fuel' and 'timeout' limit the statements the run executes.
+    def run(self, p: list, fuel: int | None = None, timeout: float | None = None) -> dict:
+        old, records, interp = self.program, self.records, self.interp
+        prefix = 0
+        while prefix < min(len(old), len(p)) and old[prefix] == p[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < min(len(old), len(p)) - prefix and old[-1 - suffix] == p[-1 - suffix]:
+            suffix += 1
+
+        self.program, self.ran = p, []
+        # A statement that failed and every statement before it are unchanged.
+        if self.failure is not None and len(records) < prefix:
+            return dict(self.failure, output=list(self.failure['output']))
+
+        start = max(index for index in (0, *self.checkpoints) if index <= min(prefix, len(records)))
+        checkpoint = self.checkpoints.get(start)
+        caches = i.Caches(interp.memo_size, interp.builtins, interp.adaptive)
+        if fuel is not None or timeout is not None:
+            caches.budget = i.Budget(fuel, None if timeout is None else time.monotonic() + timeout)
+        valid = caches.validate(p)
+        # Later edits may define globals the program's functions name.
+        caches.scopes = cl.analyse(p, open=True) if checkpoint is None else checkpoint.analyse(p, open=True)
+        builtins = set() if caches.scopes is None else {
+            name for name, f in interp.builtins.items() if f is i.built_funcs.get(name) and name not in caches.scopes.assigned }
+
+        # Variables the changed statements of the last program may have assigned, and whether
+        # they may have changed anything.
+        dirty, unknown = set(), False
+        for record in records[prefix:len(old) - suffix]:
+            if record.effects.writes is None:
+                unknown = True
+            else:
+                dirty.update(record.effects.writes)
+
+        out = [ line for record in records[:start] for line in record.output ]
+        self.records = records[:start]
+        self.checkpoints = { index: snapshot for index, snapshot in self.checkpoints.items() if index <= start }
+        self.failure = None
+        values, copies = ({}, None) if checkpoint is None else checkpoint.start()
+        state = s.State(values, None, out, caches)
+        token = sn.active.set(copies)
+        # Whether the state changed since the last snapshot was made, or the run began, at 'last'.
+        changed, last, interval = False, time.monotonic(), self.interval
+        try:
+            for index in range(start, len(p)):
+                # The record of the same statement in the last program, if it completed.
+                at = index if index < prefix else index - len(p) + len(old) if index >= len(p) - suffix else None
+                record = records[at] if at is not None and at < len(records) else None
+                if record and record.effects.writes == frozenset() and (index < prefix or not unknown and dirty.isdisjoint(record.effects.reads)):
+                    out.extend(record.output)
+                    self.records.append(record)
+                    continue
+
+                if changed and time.monotonic() - last >= interval:
+                    began = time.monotonic()
+                    self.checkpoints[index] = sn.Snapshot(p, state.value, [], caches.scopes, valid)
+                    last = time.monotonic()
+                    changed, interval = False, max(self.interval, self.cost * (last - began))
+
+                stmt_effects, begin = effects(p[index], builtins), len(out)
+                self.ran.append(index)
+                # A statement returning a signal ends the program, as it ends a block. It is not
+                # recorded, so it runs again and ends the next run too.
+                if interp.eval_statement(state, p[index]):
+                    break
+
+                self.records.append(Record(stmt_effects, out[begin:]))
+                changed = changed or stmt_effects.writes != frozenset()
+                if index < prefix:
+                    continue
+                if stmt_effects.writes is None:
+                    unknown = True
+                else:
+                    dirty.update(stmt_effects.writes)
+
+            return dict(kind='ok', output=out)
+        except i.Timeout:
+            return dict(kind='timeout', output=out)
+        except i.ScopeScriptError as err:
+            self.failure = dict(kind='error', output=[str(err)])
+            return dict(self.failure, output=list(self.failure['output']))
+        except:
+            return dict(kind='error', output=[])
+        finally:
+            sn.active.reset(token)
@@ -1,19 +1,79 @@
-import sys, collections
+import sys, collections, contextlib, operator, queue, threading, time, types
 
 from scopescript import atoms as a
 from scopescript import scope as s
+from scopescript import output as o
+from scopescript import memo as m
+from scopescript import profiler as pr
+from scopescript import closures as cl
+from scopescript import snapshot as sn
 
-# Depth of 12050 allows no more than 999 recursive calls. Significant overhead.    
-sys.setrecursionlimit(12050)
+# Default limit on nested function calls.
+MAX_DEPTH = 1000
 
 # Flags that indicate if a function is called and if a loop is entered.
 Flags = collections.namedtuple('flags', ['in_func', 'in_loop'])
 
-# Terminates program and sets 'output' to the message arg.
+# Flags of a function body.
+func_flags = Flags(True, False)
+
+# Request to run a function body, made by a call so the evaluator can limit call depth.
+Call = collections.namedtuple('Call', ['body', 'state', 'e', 'func'])
+
+# Request to call a built-in function, resolved by the running interpreter.
+Builtin = collections.namedtuple('Builtin', ['state', 'e', 'name'])
+
+# Evaluation runs on an explicit stack rather than python's. Handlers whose node has
+# children are generators that yield the evaluation of each child, either a value or
+# another generator, and receive its result. The evaluator keeps suspended handlers on a
+# list, so the depth of ScopeScript recursion is bounded by 'max_depth' instead of
+# python's recursion limit.
+
+# Raised when a program fails, the message is the program's output.
+class ScopeScriptError(Exception):
+    pass
+
+# Terminates program with the message arg.
 def error(state: tuple, msg: str):
-    state.output.clear()
-    state.output.append(msg)
-    assert False
+    raise ScopeScriptError(msg)
+
+# Raised when a run uses up its fuel or passes its deadline.
+class Timeout(ScopeScriptError):
+    pass
+
+# Terminates a program whose run was stopped.
+def stopped(state: tuple):
+    error(state, 'Program stopped.')
+
+# Number of steps between checks of the clock and of the stop event.
+CHECK_INTERVAL = 1024
+
+# Limits on a run, checked on every loop iteration and call, the steps of a run. 'fuel'
+# is the number of steps the run may take, 'deadline' the time.monotonic() it must end
+# by and 'stop' an event that ends it once set. The clock and the event are only checked
+# every CHECK_INTERVAL steps, so a program stops even if it never prints again.
+class Budget:
+    def __init__(self, fuel: int | None = None, deadline: float | None = None, stop: threading.Event | None = None) -> None:
+        self.fuel = fuel
+        self.deadline = deadline
+        self.stop = stop
+        self.countdown = CHECK_INTERVAL
+
+    # Takes a step.
+    def step(self, state: s.State) -> None:
+        if self.fuel is not None:
+            self.fuel -= 1
+            if self.fuel < 0:
+                raise Timeout('Program ran out of fuel.')
+
+        self.countdown -= 1
+        if not self.countdown:
+            self.countdown = CHECK_INTERVAL
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise Timeout('Program passed its deadline.')
+
+            if self.stop and self.stop.is_set():
+                stopped(state)
 
 # Expression factory
 def expr(f): 
@@ -23,6 +83,16 @@ def expr(f):
 def stmt(f):
     return lambda state, s, flags: f(state, s, flags)
 
+# Table of node handlers by kind. A kind it does not have is given the handler that
+# reports it, so finding a node's handler needs no check of its own.
+class Handlers(dict):
+    def __init__(self, handlers: dict, unknown) -> None:
+        super().__init__(handlers)
+        self.unknown = unknown
+
+    def __missing__(self, kind: str):
+        return self.unknown
+
 # Atom expression functions
 
 # Evaluates null
@@ -45,52 +115,108 @@ def _integer_num_(state: s.State, e: dict) -> tuple:
 def _float_num_(state: s.State, e: dict) -> tuple:
     return a._float(float(e['value']))
 
+# Finds the values defining the variable a node names, or None. Each node naming a variable
+# has an inline cache entry in its run's caches: the state the name was last found above and
+# the values it was found in. A variable is never removed, and never defined again in a state
+# it is already visible from, so a lookup reaching that state can stop there. A name not
+# found, such as a built-in function's, is remembered as a miss above the state the lookup
+# started from, which holds until the run next defines a variable. Names found in the
+# current state or its parent are found without the caches.
+def resolve(state: s.State, e: dict) -> dict | None:
+    name = e['name']
+    if not state or state.cache is None:
+        found = s.find_in_scope(state, name)
+        return found and found[0]
+
+    if name in (values := state.value):
+        return values
+
+    if (parent := state.parent) and name in (values := parent.value):
+        return values
+
+    caches, key = state.cache, id(e)
+    if (miss := caches.misses.get(key)) and miss[0] is parent and miss[1] == caches.defines:
+        return None
+
+    cache = caches.nodes
+    anchor, found = cache.get(key, (None, None))
+    curr = parent
+    while curr:
+        if curr is anchor:
+            return found
+
+        if name in (values := curr.value):
+            cache[key] = (parent, values)
+            return values
+
+        curr = curr.parent
+
+    caches.misses[key] = (parent, caches.defines)
+    return None
+
+# Defines a variable in the current state.
+def define(state: s.State, name: str, val: tuple) -> None:
+    state.value[name] = val
+    if state.cache is not None:
+        state.cache.defines += 1
+
 # Evaluates variable
 def _variable_(state: s.State, e: dict) -> tuple:
-    name = e['name']
-    result = s.find_in_scope(state, name)
-    if not result:
-        error(state, f"Line {e['line']}: Variable '{name}' is not defined.")
+    if (values := resolve(state, e)) is None:
+        error(state, f"Line {e['line']}: Variable '{e['name']}' is not defined.")
 
-    return result[1]
+    return values[e['name']]
 
 # Evaluates collection
-def _collection_(state: s.State, e: dict) -> tuple:
-    return a._collection({ key: eval_expression(state, val) for key, val in e['value'].items() })
+def _collection_(state: s.State, e: dict):
+    value = a.Table()
+    for key, val in e['value'].items():
+        value[key] = yield expression(state, val)
 
-# Evaluates collection
+    return a._collection(value)
+
+# Evaluates closure. In a run whose program has been analysed, the closure keeps only the
+# variables it names.
 def _closure_(state: s.State, e: dict) -> tuple:
+    if state and (caches := state.cache) is not None and caches.scopes is not None and (capture := caches.scopes.captures.get(id(e))):
+        return a._closure(s.Closure(e['params'], e['body'], cl.environment(state, capture, caches.scopes.assigned)))
+
     return a._closure(s.Closure(e['params'], e['body'], state))
 
 
 # Collection handling
 
-# Determines the attribute of an expression
-def determine_attribute(state: s.State, e: dict) -> str | None:
+# Checks the value of a subscript used as a key. Integer keys are returned as they are,
+# for tables to use without making them into strings.
+def attribute_key(state: s.State, e: dict, r: tuple):
+    if a.not_subscriptable(r):
+        error(state, f"Line {e['line']}: invalid key type for attribute assignment: <{a.kind(r)}>.")
+
+    return r.value if type(r.value) is int else str(r.value)
+
+# Determines the attribute of an expression.
+def determine_attribute(state: s.State, e: dict):
     match e['kind']:
         case 'attribute':
            return e['attribute']
         case 'subscriptor':
-            r = eval_expression(state, e['expr'])
-            if a.not_subscriptable(r):
-                error(state, f"Line {e['line']}: invalid key type for attribute assignment: <{a.kind(r)}>.")
-
-            return str(r.value)
+            return attribute_key(state, e, (yield expression(state, e['expr'])))
     
     return None 
 
-# Handles attribute reference
-def _handle_attribute_(state: s.State, e: dict) -> tuple:
-    collection = eval_expression(state, e['collection']) 
+# Reads an attribute of a collection.
+def get_attribute(state: s.State, e: dict, collection: tuple) -> tuple:
     if a.not_collection(collection):
         error(state, f"Line {e['line']}: invalid collection type for attribute '{e['attribute']}': <{a.kind(collection)}>.")
     
     return collection.value.get(e['attribute'], a._null(None))
 
+# Handles attribute reference
+def _handle_attribute_(state: s.State, e: dict):
+    return get_attribute(state, e, (yield expression(state, e['collection'])))
 
 # Executes subscriptor on a collection or string, or reports an error
-def _handle_subscriptor_(state: s.State, e: dict) -> tuple:
-    collection, attribute = eval_expression(state, e['collection']), eval_expression(state, e['expr'])
+def get_subscript(state: s.State, e: dict, collection: tuple, attribute: tuple) -> tuple:
     if a.not_collection(collection):
         # String indexing
         if a.is_string(collection) and a.is_integer(attribute):
@@ -105,268 +231,414 @@ def _handle_subscriptor_(state: s.State, e: dict) -> tuple:
     
     if a.not_subscriptable(attribute):
         error(state, f"Line {e['line']}: invalid key type for attribute '{attribute.value}': <{a.kind(attribute)}>.")
- 
-    return collection.value.get(str(attribute.value), a._null(None))
+    # Integer keys index a table's list without being made into strings.
+    values, key = collection.value, attribute.value
+    if type(key) is int and type(values) is a.Table:
+        return values.at(key)
+
+    return values.get(str(key), a._null(None))
+
+# Handles subscriptor reference
+def _handle_subscriptor_(state: s.State, e: dict):
+    collection = yield expression(state, e['collection'])
+    return get_subscript(state, e, collection, (yield expression(state, e['expr'])))
 
 
 # Assignment handling
 
+# Assigns a variable the argument value, defining it when no state has it.
+def assign_variable(state: s.State, e: dict, val: tuple) -> tuple:
+    if (values := resolve(state, e)) is None:
+        define(state, e['name'], val)
+    else:
+        values[e['name']] = val
+
+    return val
+
+# Assigns an attribute of a collection the argument value.
+def assign_attribute(state: s.State, e: dict, collection: tuple, attribute, val: tuple) -> tuple:
+    if a.not_collection(collection):
+        error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
+
+    values = collection.value
+    if type(attribute) is int:
+        if type(values) is a.Table:
+            values.set_at(attribute, val)
+            return val
+
+        attribute = str(attribute)
+
+    values[attribute] = val
+    return val
+
 # Assigns collection attribute or variable the argument value.
-def assign_val(state: s.State, e: dict, val: tuple) -> tuple | None:
+def assign_val(state: s.State, e: dict, val: tuple):
     match e['kind']:
         case 'identifier' | 'variable':
-            return s.set_variable(state, e, val)
+            return assign_variable(state, e, val)
     
     # Attribute assignment.
-    attribute = determine_attribute(state, e)
+    attribute = yield from determine_attribute(state, e)
     # Unknown assignment type.
-    if not attribute:
+    if attribute is None or attribute == '':
         return None
 
-    collection = eval_expression(state, e['collection']) 
-    if a.not_collection(collection):
-        error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
-
-    collection.value[attribute] = val
-    return val
+    return assign_attribute(state, e, (yield expression(state, e['collection'])), attribute, val)
 
 
 # Unary operator functions
 
 # '!'
-def _logical_not_(state: s.State, e: dict) -> tuple:
-    return a._boolean(not eval_expression(state, e['expr']).value)
+def _logical_not_(state: s.State, e: dict, x: tuple) -> tuple:
+    return a._boolean(not x.value)
 
 # '~'
-def _bit_not_(state: s.State, e: dict) -> tuple:
-    x = eval_expression(state, e['expr'])
+def _bit_not_(state: s.State, e: dict, x: tuple) -> tuple:
     if not a.is_integer(x):
         error(state, f"Line {e['line']}: invalid operand type for '~': <{a.kind(x)}>.")
 
     return a._integer(~x.value)
 
-# Prefix increment or decrement
-def prefix(state: s.State, e: dict, step: int) -> tuple:
-    x, op = eval_expression(state, e['expr']), e['op']
+# Prefix increment or decrement, returns the value to assign.
+def prefix(state: s.State, e: dict, x: tuple, step: int) -> tuple:
     if a.not_number(x):
-            error(state, f"Line {e['line']}: invalid operand type for {op}: <{a.kind(x)}>.")
-
-    res = assign_val(state, e['expr'], a.int_or_float(x, x.value + step)) 
-    if not res:
-        error(state, f"Line {e['line']}: invalid prefix syntax for {op}: <{a.kind(x)}>.")
+            error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
 
-    return res
+    return a.int_or_float(x, x.value + step)
 
 # Unary plus or minus
-def plus_minus(state: s.State, e: dict, fact: int) -> tuple:
-    x = eval_expression(state, e['expr'])
+def plus_minus(state: s.State, e: dict, x: tuple, fact: int) -> tuple:
     if a.not_number(x):
         error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
 
     return a.int_or_float(x, x.value * fact) 
 
 # '++'
-def _increment_(state: s.State, e: dict) -> tuple:
-    return prefix(state, e, 1)
+def _increment_(state: s.State, e: dict, x: tuple) -> tuple:
+    return prefix(state, e, x, 1)
 
 # '--;
-def _decrement_(state: s.State, e: dict) -> tuple:
-    return prefix(state, e, -1)
+def _decrement_(state: s.State, e: dict, x: tuple) -> tuple:
+    return prefix(state, e, x, -1)
 
 # '+'
-def _plus_(state: s.State, e: dict) -> tuple:
-    return plus_minus(state, e, 1)
+def _plus_(state: s.State, e: dict, x: tuple) -> tuple:
+    return plus_minus(state, e, x, 1)
 
 # '-'
-def _minus_(state: s.State, e: dict) -> tuple:
-    return plus_minus(state, e, -1)
+def _minus_(state: s.State, e: dict, x: tuple) -> tuple:
+    return plus_minus(state, e, x, -1)
 
-# Unary operations
+# Unary operations, applied to the value of the operand.
 unops = {
-    '!': expr( _logical_not_ ),
-    '~': expr( _bit_not_ ),
-    '++': expr( _increment_ ),
-    '--': expr( _decrement_ ),
-    '+': expr( _plus_ ),
-    '-': expr( _minus_ )
+    '!': _logical_not_,
+    '~': _bit_not_,
+    '++': _increment_,
+    '--': _decrement_,
+    '+': _plus_,
+    '-': _minus_
 }
 
+# Unary operations that assign their result to the operand.
+prefixes = { '++', '--' }
+
+# Reports a prefix operation whose operand cannot be assigned.
+def invalid_prefix(state: s.State, e: dict, x: tuple):
+    error(state, f"Line {e['line']}: invalid prefix syntax for {e['op']}: <{a.kind(x)}>.")
+
 # Executes a given unary operation
-def _determine_unop_(state: s.State, e: dict) -> tuple:
-    op = e['op']
-    if op not in unops:
-        error(state, f"Line {e['line']}: unknown operator {op}.")
-    
-    return unops[op](state, e)
+def _determine_unop_(state: s.State, e: dict):
+    if e['op'] not in unops:
+        error(state, f"Line {e['line']}: unknown operator {e['op']}.")
+
+    return (yield from _unop_(state, e))
+
+# Executes a unary operation whose operator is known.
+def _unop_(state: s.State, e: dict):
+    op, x = e['op'], (yield expression(state, e['expr']))
+    res = apply_unop(state, e, x)
+    if op in prefixes and not (yield from assign_val(state, e['expr'], res)):
+        invalid_prefix(state, e, x)
+
+    return res
 
 
 # Binary operator functions
 
-# Type checks numeric binary operator operation.
-def binop_numeric(state: s.State, e: dict, str=False, float=False):
-    e1, e2 = eval_expression(state, e['e1']), eval_expression(state, e['e2'])
+# Type checks numeric binary operator operation and applies it.
+def binop_numeric(state: s.State, e: dict, e1: tuple, e2: tuple, f, str=False, float=False) -> tuple:
+    if type(e1) is a._integer and type(e2) is a._integer and not float:
+        return a._integer(f(e1.value, e2.value))
+
     if str and a.are_strings(e1, e2):
-        return (lambda val: a._string(val) ), e1.value, e2.value
+        return a.concat(e1, e2)
 
     if a.not_numbers(e1, e2):
         error(state, f"Line {e['line']}: operator '{e['op']}' not supported between types <{a.kind(e1)}> and <{a.kind(e2)}>.")
 
     if float or a.any_floats(e1, e2):
-        return (lambda val: a._float(val) ), e1.value, e2.value
+        return a._float(f(e1.value, e2.value))
 
-    return (lambda val: a._integer(val)), e1.value, e2.value
+    return a._integer(f(e1.value, e2.value))
 
-# Type checks bitwise operator operation
-def binop_bit(state: s.State, e: dict) -> tuple:
-    e1, e2 = eval_expression(state, e['e1']), eval_expression(state, e['e2'])
+# Type checks bitwise operator operation and applies it.
+def binop_bit(state: s.State, e: dict, e1: tuple, e2: tuple, f) -> tuple:
     if a.not_integers(e1, e2):
         error(state, f"Line {e['line']}: operator '{e['op']}' not supported between types <{a.kind(e1)}> and <{a.kind(e2)}>.")
     
-    return e1.value, e2.value
+    return a._integer(f(e1.value, e2.value))
+
+# Type checks comparsion operator operation and applies it.
+def binop_cmp(state: s.State, e: dict, e1: tuple, e2: tuple, f) -> tuple:
+    if type(e1) is a._integer and type(e2) is a._integer:
+        return a._boolean(f(e1.value, e2.value))
 
-# Type checks comparsion operator operation
-def binop_cmp(state: s.State, e: dict) -> tuple:
-    e1, e2 = eval_expression(state, e['e1']), eval_expression(state, e['e2'])
     if a.not_numbers(e1, e2) and not a.are_strings(e1, e2):
         error(state, f"Line {e['line']}: operator '{e['op']}' not supported between types <{a.kind(e1)}> and <{a.kind(e2)}>.")
     
-    return e1.value, e2.value
+    return a._boolean(f(e1.value, e2.value))
 
-# '&&'
-def _logical_and_(state: s.State, e: dict) -> tuple:
-    e1 = eval_expression(state, e['e1'])
-    return e1 if not e1.value else eval_expression(state, e['e2'])
+# '&&', once the first operand is true.
+def _logical_and_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return e2
 
-# '||'
-def _logical_or_(state: s.State, e: dict) -> tuple:
-    e1 = eval_expression(state, e['e1'])
-    return e1 if e1.value else eval_expression(state, e['e2'])
+# '||', once the first operand is false.
+def _logical_or_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return e2
 
 # '+'
-def _add_concat_(state: s.State, e: dict) -> tuple:
-    f, v1, v2 = binop_numeric(state, e, str=True)
-    return f(v1 + v2)
+def _add_concat_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_numeric(state, e, e1, e2, operator.add, str=True)
 
 # '-'
-def _subtract_(state: s.State, e: dict) -> tuple:
-    f, v1, v2 = binop_numeric(state, e)
-    return f(v1 - v2)
+def _subtract_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_numeric(state, e, e1, e2, operator.sub)
 
 # '*'
-def _multiply_(state: s.State, e: dict) -> tuple:
-    f, v1, v2 = binop_numeric(state, e)
-    return f(v1 * v2)
+def _multiply_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_numeric(state, e, e1, e2, operator.mul)
 
 # '/' 
-def _divide_(state: s.State, e: dict) -> tuple:
-    f, v1, v2 = binop_numeric(state, e, float=True)
-    return f(v1 / v2)
+def _divide_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_numeric(state, e, e1, e2, operator.truediv, float=True)
 
 # '%'
-def _remainder_(state: s.State, e: dict) -> tuple:
-    f, v1, v2 = binop_numeric(state, e)
-    return f(v1 % v2)
+def _remainder_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_numeric(state, e, e1, e2, operator.mod)
 
 # '<<'
-def _left_shift_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_bit(state, e)
-    return a._integer(v1 << v2)
+def _left_shift_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_bit(state, e, e1, e2, operator.lshift)
 
 # '>>'
-def _right_shift_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_bit(state, e)
-    return a._integer(v1 >> v2)
+def _right_shift_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_bit(state, e, e1, e2, operator.rshift)
 
 # '&'
-def _bit_and_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_bit(state, e)
-    return a._integer(v1 & v2)
-    
+def _bit_and_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_bit(state, e, e1, e2, operator.and_)
+
 # '|'
-def _bit_or_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_bit(state, e)
-    return a._integer(v1 | v2)
+def _bit_or_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_bit(state, e, e1, e2, operator.or_)
 
 # '^'
-def _bit_xor_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_bit(state, e)
-    return a._integer(v1 ^ v2)
+def _bit_xor_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_bit(state, e, e1, e2, operator.xor)
 
 # '=='
-def _equal_(state: s.State, e: dict) -> tuple:
-    e1, e2 = eval_expression(state, e['e1']), eval_expression(state, e['e2'])
+def _equal_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
     return a._boolean(e1.value == e2.value)
 
 # '!='
-def _not_equal_(state: s.State, e: dict) -> tuple:
-    e1, e2 = eval_expression(state, e['e1']), eval_expression(state, e['e2'])
+def _not_equal_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
     return a._boolean(e1.value != e2.value)
 
 # '<'
-def _less_than_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_cmp(state, e)
-    return a._boolean(v1 < v2)
+def _less_than_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_cmp(state, e, e1, e2, operator.lt)
 
 # '>'
-def _greater_than_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_cmp(state, e)
-    return a._boolean(v1 > v2)
+def _greater_than_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_cmp(state, e, e1, e2, operator.gt)
 
 # '<='
-def _less_than_eq_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_cmp(state, e)
-    return a._boolean(v1 <= v2)
+def _less_than_eq_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_cmp(state, e, e1, e2, operator.le)
 
 # '>='
-def _greater_than_eq_(state: s.State, e: dict) -> tuple:
-    v1, v2 = binop_cmp(state, e)
-    return a._boolean(v1 >= v2)
+def _greater_than_eq_(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    return binop_cmp(state, e, e1, e2, operator.ge)
 
-# Binary operation functions
+# Binary operation functions, applied to the values of both operands.
 binops = {
-    '&&': expr( _logical_and_ ),
-    '||': expr( _logical_or_ ),
-    '+': expr( _add_concat_ ),
-    '-': expr( _subtract_ ),
-    '*': expr( _multiply_ ),
-    '/': expr( _divide_ ),
-    '%': expr( _remainder_ ),
-    '<<': expr( _left_shift_ ),
-    '>>': expr( _right_shift_ ),
-    '&': expr( _bit_and_ ),
-    '|': expr( _bit_or_ ),
-    '^': expr( _bit_xor_ ),
-    '==': expr( _equal_ ),
-    '!=': expr( _not_equal_ ),
-    '<': expr( _less_than_ ),
-    '>': expr( _greater_than_ ),
-    '<=': expr( _less_than_eq_ ),
-    '>=': expr( _greater_than_eq_ )
+    '&&': _logical_and_,
+    '||': _logical_or_,
+    '+': _add_concat_,
+    '-': _subtract_,
+    '*': _multiply_,
+    '/': _divide_,
+    '%': _remainder_,
+    '<<': _left_shift_,
+    '>>': _right_shift_,
+    '&': _bit_and_,
+    '|': _bit_or_,
+    '^': _bit_xor_,
+    '==': _equal_,
+    '!=': _not_equal_,
+    '<': _less_than_,
+    '>': _greater_than_,
+    '<=': _less_than_eq_,
+    '>=': _greater_than_eq_
+}
+
+# Operators that do not evaluate their second operand when the first decides the result,
+# by whether the first operand's value decides it.
+short_circuits = {
+    '&&': operator.not_,
+    '||': operator.truth
 }
 
 # Executes a given binary operation.
-def _determine_binop_(state: s.State, e: dict) -> tuple:  
-    op = e['op']
-    if op not in binops:
-        error(state, f"Line {e['line']}: unknown operator {op}.")
+def _determine_binop_(state: s.State, e: dict):
+    if e['op'] not in binops:
+        error(state, f"Line {e['line']}: unknown operator {e['op']}.")
+
+    return (yield from _binop_(state, e))
+
+# Executes a binary operation whose operator is known.
+def _binop_(state: s.State, e: dict):
+    op, e1 = e['op'], (yield expression(state, e['e1']))
+    if op in short_circuits and short_circuits[op](e1.value):
+        return e1
+
+    return apply_binop(state, e, e1, (yield expression(state, e['e2'])))
+
+# Adaptive specialization
+
+# An operation node runs the generic operation until it has run QUICKEN_AFTER times in a
+# run. It is then specialized to its operands' types, when there is a specialized operation
+# for them, and later runs check only that the types are the same. A node whose operand
+# types change goes back to the generic operation and waits BACKOFF more runs before it is
+# specialized again. Nodes are specialized in the run's caches, not in the AST, so a program
+# shared by several runs is never changed.
+
+# Number of runs of a node before it is specialized.
+QUICKEN_AFTER = 8
+
+# Number of runs of a node after its operand types change before it is specialized again.
+BACKOFF = 64
+
+# Specialized operations, each gives the generic operation's result for its operand types.
+def quick_integer(f):
+    return lambda x, y: a._integer(f(x.value, y.value))
+
+def quick_float(f):
+    return lambda x, y: a._float(f(x.value, y.value))
+
+def quick_boolean(f):
+    return lambda x, y: a._boolean(f(x.value, y.value))
+
+# Returns the specialized binary operations by operator and operand types.
+def specialized_binops() -> dict:
+    numbers, strings, ops = (a._integer, a._float), (a._string, a._rope), {}
+    for op, f in (('+', operator.add), ('-', operator.sub), ('*', operator.mul), ('%', operator.mod)):
+        ops[op, a._integer, a._integer] = quick_integer(f)
+        for t1, t2 in ((a._float, a._float), (a._integer, a._float), (a._float, a._integer)):
+            ops[op, t1, t2] = quick_float(f)
+
+    for t1 in numbers:
+        for t2 in numbers:
+            ops['/', t1, t2] = quick_float(operator.truediv)
+
+    for op, f in (('<<', operator.lshift), ('>>', operator.rshift), ('&', operator.and_), ('|', operator.or_), ('^', operator.xor)):
+        ops[op, a._integer, a._integer] = quick_integer(f)
+
+    pairs = [ (t1, t2) for types in (numbers, strings) for t1 in types for t2 in types ]
+    for op, f in (('<', operator.lt), ('>', operator.gt), ('<=', operator.le), ('>=', operator.ge), ('==', operator.eq), ('!=', operator.ne)):
+        for t1, t2 in pairs:
+            ops[op, t1, t2] = quick_boolean(f)
+
+    for t1 in strings:
+        for t2 in strings:
+            ops['+', t1, t2] = a.concat
+
+    return ops
+
+quick_binops = specialized_binops()
+
+# Specialized unary operations by operator and operand type.
+quick_unops = {
+    ('-', a._integer): lambda x: a._integer(x.value * -1),
+    ('-', a._float): lambda x: a._float(x.value * -1),
+    ('++', a._integer): lambda x: a._integer(x.value + 1),
+    ('++', a._float): lambda x: a._float(x.value + 1),
+    ('--', a._integer): lambda x: a._integer(x.value - 1),
+    ('--', a._float): lambda x: a._float(x.value - 1),
+    ('~', a._integer): lambda x: a._integer(~x.value)
+}
 
-    return binops[op](state, e)
+# Applies a node's binary operation to its operands. A specialized node holds its operand
+# types and operation in its entry of the run's caches, a node still running the generic
+# operation holds the number of times it has run.
+def apply_binop(state: s.State, e: dict, e1: tuple, e2: tuple) -> tuple:
+    if state is None or (caches := state.cache) is None or (quick := caches.quick) is None:
+        return binops[e['op']](state, e, e1, e2)
+
+    spec = quick.get(key := id(e), 0)
+    if type(spec) is tuple:
+        t1, t2, f = spec
+        if type(e1) is t1 and type(e2) is t2:
+            return f(e1, e2)
+
+        quick[key] = -BACKOFF
+    elif spec < QUICKEN_AFTER:
+        quick[key] = spec + 1
+    elif (f := quick_binops.get((e['op'], type(e1), type(e2)))) is not None:
+        quick[key] = (type(e1), type(e2), f)
+        return f(e1, e2)
+    else:
+        quick[key] = -BACKOFF
+
+    return binops[e['op']](state, e, e1, e2)
+
+# Applies a node's unary operation to its operand, specializing it as 'apply_binop' does.
+def apply_unop(state: s.State, e: dict, x: tuple) -> tuple:
+    if state is None or (caches := state.cache) is None or (quick := caches.quick) is None:
+        return unops[e['op']](state, e, x)
+
+    spec = quick.get(key := id(e), 0)
+    if type(spec) is tuple:
+        t, f = spec
+        if type(x) is t:
+            return f(x)
+
+        quick[key] = -BACKOFF
+    elif spec < QUICKEN_AFTER:
+        quick[key] = spec + 1
+    elif (f := quick_unops.get((e['op'], type(x)))) is not None:
+        quick[key] = (type(x), f)
+        return f(x)
+    else:
+        quick[key] = -BACKOFF
+
+    return unops[e['op']](state, e, x)
 
 # Built-in type function, returns type of argument
-def _type_(state, e) -> tuple:
+def _type_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for type(...): {len(args)}.")
 
-    return a._string(a.kind(eval_expression(state, args[0])))
+    return a._string(a.kind((yield expression(state, args[0]))))
 
 # Built-in ord function, returns the ascii value of the argument
-def _ord_(state, e) -> tuple:
+def _ord_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for ord(...): {len(args)}.")
 
-    character = eval_expression(state, args[0])
+    character = yield expression(state, args[0])
     if not a.is_string(character):  
         error(state, f"Line {e['line']}: expected a character for ord(...), received <{a.kind(character)}>.")
         
@@ -376,36 +648,38 @@ def _ord_(state, e) -> tuple:
     return a._integer(ord(character.value))
 
 # Built-in abs function, returns the absoulute value of the number argument.
-def _abs_(state, e) -> tuple:
+def _abs_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for abs(...): {len(args)}.")
 
-    number = eval_expression(state, args[0])
+    number = yield expression(state, args[0])
     if a.not_number(number):
         error(state, f"Line {e['line']}: invalid argument type for abs(...): <{a.kind(number)}>.")
 
     return a.int_or_float(number, abs(number.value))
 
 # Built-in len function, returns the number of elements in a collection or string length.      
-def _len_(state, e) -> tuple:
+def _len_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for len(...): {len(args)}.")
 
-    iterable = eval_expression(state, args[0])
+    iterable = yield expression(state, args[0])
     if a.not_iterable(iterable):
         error(state, f"Line {e['line']}: expected a string or collection for len(...), received <{a.kind(iterable)}>.")
 
-    return a._integer(len(iterable.value))
+    # A rope knows its length without joining its pieces.
+    return a._integer(iterable.size if type(iterable) is a._rope else len(iterable.value))
 
 # Built-in pow function, returns arg[0] to the power of arg[1].
-def _pow_(state, e) -> tuple:
+def _pow_(state, e):
     args = e['args']
     if len(args) != 2:
         error(state, f"Line {e['line']}: invalid argument count for pow(...): {len(args)}.")
 
-    b, p = eval_expression(state, args[0]), eval_expression(state, args[1])
+    b = yield expression(state, args[0])
+    p = yield expression(state, args[1])
     if a.not_numbers(b, p):
         error(state, f"Line {e['line']}: invalid argument types for pow(...), received <{a.kind(b)}> and <{a.kind(p)}>.")
     
@@ -415,20 +689,20 @@ def _pow_(state, e) -> tuple:
     return a._integer(pow(b.value, p.value))
 
 # Built-in bool function, returns the boolean value of the argument.
-def _bool_(state, e) -> tuple:
+def _bool_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for bool(...): {len(args)}.")
     
-    return a._boolean(bool(eval_expression(state, args[0]).value))
+    return a._boolean(bool((yield expression(state, args[0])).value))
 
 # Built-in int function, returns the greatest integer less than or equal to the argument number.
-def  _int_(state, e) -> tuple:
+def  _int_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for int(...): {len(args)}.")
 
-    num = eval_expression(state, args[0])
+    num = yield expression(state, args[0])
     # String literal
     if a.is_string(num):
         try:
@@ -442,12 +716,12 @@ def  _int_(state, e) -> tuple:
     return a._integer(int(num.value))
     
 # Built-in int function, returns the float representation of the argument number.
-def  _float_(state, e) -> tuple:
+def  _float_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for float(...): {len(args)}.")
 
-    num = eval_expression(state, args[0])
+    num = yield expression(state, args[0])
     # String literal
     if a.is_string(num):
         try:
@@ -472,19 +746,19 @@ def str_rep(expr) -> str:
     return str(expr.value)
 
 # Built-in str function, returns the string represention of the argument
-def _str_(state, e) -> tuple:
+def _str_(state, e):
     args = e['args']
     if len(args) != 1:
         error(state, f"Line {e['line']}: invalid argument count for str(...): {len(args)}.")
     
-    return a._string(str_rep(eval_expression(state, args[0])))
+    return a._string(str_rep((yield expression(state, args[0]))))
 
 # Prints arguments to output array.
-def _print_(state, e) -> tuple:
+def _print_(state, e):
     out = state.output
     # Append string representation of each argument.
     for arg in e['args']:
-        out.append(str_rep(eval_expression(state, arg)))
+        out.append(str_rep((yield expression(state, arg))))
         out.append(' ')
 
     out.append('\n')
@@ -504,59 +778,171 @@ built_funcs = {
     'print': expr( _print_ )
 }
 
-# Call Handle.
-def _call_(state: s.State, e: dict) -> tuple:
+# Finds the function of a call and evaluates its arguments. Returns the Call that runs its
+# body, or the result when a built-in function is called.
+def prepare_call(state: s.State, e: dict):
     f = e['fun']
 
-    func_expr, name = None, None
     # Named function.
     if f['kind'] == 'variable':
-        name = f['name']
-        res = s.find_in_scope(state, name)
+        values = resolve(state, f)
         # Named functions override built-in functions.
-        if res:
-            func_expr = res[1]
-        elif name in built_funcs:
-            # Return built-in function result.
-            return built_funcs[name](state, e)
+        if values is not None:
+            func_expr = values[f['name']]
         else:
-            error(state, f"Line {e['line']}: function {name}(...) is not defined.")
+            # Return built-in function result.
+            return (yield Builtin(state, e, f['name']))
     # Anonymous function.
     else:
-        func_expr = eval_expression(state, f)
+        func_expr = yield expression(state, f)
 
     if a.not_closure(func_expr):
         error(state, f"Line {e['line']}: invalid type for function call: <{a.kind(func_expr)}>.")
 
     func, args = func_expr.value, e['args']
-    # Set name to address if anonymous function.
-    if not name:
-        name = '(anonymous) func@' + str(hex(id(func)))
-    
     if len(args) != len(func.params):
-        error(state, f"Line {e['line']}: invalid argument count for {name}(...): Expected {len(func.params)}.")
-    # Assign parameters to arguments in the function environment.
-    env = func.new_env()
+        error(state, f"Line {e['line']}: invalid argument count for {call_name(e, func)}(...): Expected {len(func.params)}.")
+    # Assign parameters to arguments in the function environment. The function writes to
+    # the caller's output, its own states may be frozen in a snapshot and have none.
+    env = s.State({}, func.parent, state.output, state.cache)
+    values = env.value
     for param, arg in zip(func.params, args):
-        env[param] = eval_expression(state, arg)
+        values[param] = yield expression(state, arg)
+    if (caches := state.cache) is not None and caches.budget:
+        caches.budget.step(state)
+    # Look up the result of a memoized function.
+    if caches is not None and caches.memo_size and (key := memo_key(caches, func, values)) is not None:
+        memo = caches.memo(func)
+        if (val := memo.get(key)) is not None:
+            return val
+
+        return Call(memoized(memo, key, function_body(caches, e, func, env)), state, e, func)
     # Evaluate function block in it's own environment.
-    try:
-        result = eval_block(func.get_env(), func.body, Flags(True, False)) 
-    except RecursionError:
-        error(state, f"Line {e['line']}: maximum recursion depth exceeded for {name}(...).")
+    return Call(function_body(caches, e, func, env), state, e, func)
+
+# Generator for the body of a called function, timed when the run is profiled.
+def function_body(caches, e: dict, func: s.Closure, env: s.State):
+    body = block(env, func.body, func_flags)
+    if caches is None or caches.profile is None:
+        return body
+
+    f = e['fun']
+    return timed_call(caches.profile, f['name'] if f['kind'] == 'variable' else '(anonymous)', func.body, body)
+
+# Runs a function body for the profiler.
+def timed_call(profile: pr.Profile, name: str, body: list, task):
+    profile.call(name, body)
+    result = yield from task
+    profile.ret()
+    return result
+
+# Runs a node's handler for the profiler, timing it and the nodes it evaluates.
+def timed(profile: pr.Profile, e: dict, handler, *args):
+    profile.enter(e)
+    if type(res := handler(*args)) is types.GeneratorType:
+        res = yield from res
+
+    profile.exit()
+    return res
+
+# Name of the function a call makes, for error messages. Anonymous functions are named
+# by their address.
+def call_name(e: dict, func: s.Closure) -> str:
+    f = e['fun']
+    if f['kind'] == 'variable':
+        return f['name']
+
+    return '(anonymous) func@' + str(hex(id(func)))
+
+# Runs a call's body. A body that ends in a tail call returns the next Call, which runs
+# in place of the finished one, so tail calls do not add to the call depth.
+def make_call(call: Call):
+    result = yield call
+    while result and result[0] == 'tail':
+        result = yield result[1]
     # Return null if there is no return value
     if not result:
         return a._null(None)
 
     return result[1]
 
+# Runs the body of a memoized function to its result, tail calls included, and stores it.
+def memoized(memo: m.Memo, key: tuple, body):
+    result = yield from body
+    while result and result[0] == 'tail':
+        result = yield result[1]
+
+    val = a._null(None) if not result else result[1]
+    memo.put(key, val)
+    return 'return', val
+
+# Adds to 'key' the values a pure function reads from outside, and those read by the pure
+# functions it calls. Returns False when the function is not pure, or when one of the
+# variables it assigns is defined outside and would be changed.
+def memo_free(caches, func: s.Closure, key: list, seen: set) -> bool:
+    if (purity := caches.purity(func)) is None:
+        return False
+
+    for name in purity.locals:
+        if s.find_in_scope(func.parent, name):
+            return False
+
+    for name in purity.free:
+        if not (found := s.find_in_scope(func.parent, name)):
+            if name not in caches.pure_builtins:
+                return False
+            continue
+
+        val = found[1]
+        if type(val) is a._closure:
+            key.append(val.value)
+            if val.value not in seen:
+                seen.add(val.value)
+                if not memo_free(caches, val.value, key, seen):
+                    return False
+        elif type(val) in m.primitives:
+            key.append(m.value_key(val))
+        else:
+            return False
+
+    return True
+
+# Returns the key a call to a pure function is memoized by, or None when the call cannot
+# be memoized.
+def memo_key(caches, func: s.Closure, values: dict) -> tuple | None:
+    key = []
+    for val in values.values():
+        if type(val) not in m.primitives:
+            return None
+
+        key.append(m.value_key(val))
+
+    return tuple(key) if memo_free(caches, func, key, {func}) else None
+
+# Call Handle.
+def _call_(state: s.State, e: dict):
+    call = yield from prepare_call(state, e)
+    if type(call) is not Call:
+        return call
+    # Same as make_call, without a generator of its own.
+    result = yield call
+    while result and result[0] == 'tail':
+        result = yield result[1]
+
+    return a._null(None) if not result else result[1]
+
 
 # Ternary handle
-def _ternary_(state: s.State, e: dict) -> tuple:
-    return eval_expression(state, e['trueExpr']) if eval_expression(state, e['test']).value else eval_expression(state, e['falseExpr'])
+def _ternary_(state: s.State, e: dict):
+    test = yield expression(state, e['test'])
+    return (yield expression(state, e['trueExpr'] if test.value else e['falseExpr']))
+
+# Reports an expression of unknown kind.
+def _unknown_expression_(state: s.State, e: dict):
+    error(state, f"Line {e['line']}: unknown expression: <{e['kind']}>.")
 
 # Expressions
-expressions = {
+expressions = Handlers({
     'null': expr( _null_ ),
     'boolean': expr( _boolean_ ),
     'string': expr( _string_ ),
@@ -571,87 +957,346 @@ expressions = {
     'binop': expr( _determine_binop_ ),
     'call': expr( _call_ ),
     'ternary': expr( _ternary_ ),
+}, _unknown_expression_)
+
+# Expressions of validated programs, their operators are known.
+valid_expressions = Handlers({ **expressions, 'unop': expr( _unop_ ), 'binop': expr( _binop_ ) }, _unknown_expression_)
+
+
+# Call-free expressions
+
+# Only calls need to be suspended on the evaluator's stack, so an expression that makes
+# none is evaluated on python's stack instead, without a generator for each node. Nodes
+# are found to be call-free once per run, up to 'DIRECT_HEIGHT' levels deep so python's
+# recursion stays bounded.
+
+# Deepest expression evaluated on python's stack.
+DIRECT_HEIGHT = 32
+
+# Evaluates collection
+def _collection_value_(state: s.State, e: dict) -> tuple:
+    value = a.Table()
+    for key, val in e['value'].items():
+        value[key] = direct(state, val)
+
+    return a._collection(value)
+
+# Determines the attribute of an expression.
+def attribute_value(state: s.State, e: dict):
+    match e['kind']:
+        case 'attribute':
+            return e['attribute']
+        case 'subscriptor':
+            return attribute_key(state, e, direct(state, e['expr']))
+
+    return None
+
+# Handles attribute reference
+def _attribute_value_(state: s.State, e: dict) -> tuple:
+    return get_attribute(state, e, direct(state, e['collection']))
+
+# Handles subscriptor reference
+def _subscriptor_value_(state: s.State, e: dict) -> tuple:
+    collection = direct(state, e['collection'])
+    return get_subscript(state, e, collection, direct(state, e['expr']))
+
+# Assigns collection attribute or variable the argument value.
+def assign_value(state: s.State, e: dict, val: tuple) -> tuple | None:
+    match e['kind']:
+        case 'identifier' | 'variable':
+            return assign_variable(state, e, val)
+
+    attribute = attribute_value(state, e)
+    if attribute is None or attribute == '':
+        return None
+
+    return assign_attribute(state, e, direct(state, e['collection']), attribute, val)
+
+# Executes a given unary operation
+def _unop_value_(state: s.State, e: dict) -> tuple:
+    op, x = e['op'], direct(state, e['expr'])
+    res = apply_unop(state, e, x)
+    if op in prefixes and not assign_value(state, e['expr'], res):
+        invalid_prefix(state, e, x)
+
+    return res
+
+# Executes a given binary operation.
+def _binop_value_(state: s.State, e: dict) -> tuple:
+    op, e1 = e['op'], direct(state, e['e1'])
+    if op in short_circuits and short_circuits[op](e1.value):
+        return e1
+
+    return apply_binop(state, e, e1, direct(state, e['e2']))
+
+# Ternary handle
+def _ternary_value_(state: s.State, e: dict) -> tuple:
+    test = direct(state, e['test'])
+    return direct(state, e['trueExpr'] if test.value else e['falseExpr'])
+
+# Call-free expressions
+direct_values = {
+    'null': _null_,
+    'boolean': _boolean_,
+    'string': _string_,
+    'integer': _integer_num_,
+    'float': _float_num_,
+    'variable': _variable_,
+    'collection': _collection_value_,
+    'closure': _closure_,
+    'subscriptor': _subscriptor_value_,
+    'attribute': _attribute_value_,
+    'unop': _unop_value_,
+    'binop': _binop_value_,
+    'ternary': _ternary_value_,
 }
 
-# Evaluates a given expression
-def eval_expression(state: s.State, e: dict) -> tuple:
+# Evaluates a call-free expression.
+def direct(state: s.State, e: dict) -> tuple:
+    return direct_values[e['kind']](state, e)
+
+# Returns whether an expression or simple statement makes no calls and is at most 'height'
+# levels deep.
+def call_free(e: dict, height: int = DIRECT_HEIGHT) -> bool:
+    if height == 0:
+        return False
+
+    height -= 1
+    match e['kind']:
+        case 'null' | 'boolean' | 'string' | 'integer' | 'float' | 'variable' | 'closure':
+            return True
+        case 'collection':
+            return all(call_free(val, height) for val in e['value'].values())
+        case 'attribute':
+            return call_free(e['collection'], height)
+        case 'subscriptor':
+            return call_free(e['collection'], height) and call_free(e['expr'], height)
+        case 'unop':
+            return e['op'] in unops and call_free(e['expr'], height)
+        case 'binop':
+            return e['op'] in binops and call_free(e['e1'], height) and call_free(e['e2'], height)
+        case 'ternary':
+            return all(call_free(e[part], height) for part in ('test', 'trueExpr', 'falseExpr'))
+        # Statements
+        case 'static':
+            return call_free(e['expr'], height)
+        case 'return':
+            return e['expr']['kind'] != 'call' and call_free(e['expr'], height)
+        case 'assignment':
+            return call_free(e['expr'], height) and all(target_free(t, height) for t in e['assignArr'])
+
+    return False
+
+# Returns whether assigning to a target makes no calls. Targets that cannot be assigned are
+# left to the generic path to report.
+def target_free(e: dict, height: int) -> bool:
+    match e['kind']:
+        case 'identifier' | 'variable':
+            return True
+        case 'attribute':
+            return call_free(e['collection'], height)
+        case 'subscriptor':
+            return call_free(e['collection'], height) and call_free(e['expr'], height)
+
+    return False
+
+# Expressions with children, evaluated directly when they make no calls.
+compound = { 'collection', 'subscriptor', 'attribute', 'unop', 'binop', 'ternary' }
+
+# Starts a given expression, returns its value or a generator that evaluates it.
+def expression(state: s.State, e: dict):
     kind = e['kind']
-    if kind not in expressions:
-        error(state, f"Line {e['line']}: unknown expression: <{kind}>.") 
-    
+    if state and (caches := state.cache) is not None:
+        if kind in compound and caches.call_free(e):
+            return direct(state, e)
+
+        if caches.profile is not None:
+            return timed(caches.profile, e, caches.expressions[kind], state, e)
+
+        return caches.expressions[kind](state, e)
+
     return expressions[kind](state, e)
 
+# Evaluates a given expression
+def eval_expression(state: s.State, e: dict, max_depth: int = MAX_DEPTH) -> tuple:
+    return Interpreter(max_depth).eval_expression(state, e)
+
 
 # Statement functions
 
 # Evaluates static statement
-def _static_(state: s.State, s: dict, flags: tuple) -> None:
-    eval_expression(state, s['expr'])
+def _static_(state: s.State, s: dict, flags: tuple):
+    yield expression(state, s['expr'])
     return None
 
 # Evaluates assignment statement
-def _assignment_(state: s.State, s: dict, flags: tuple) -> None:
-    val = eval_expression(state, s['expr'])
+def _assignment_(state: s.State, s: dict, flags: tuple):
+    val = yield expression(state, s['expr'])
     for e in s['assignArr']:
-        if not assign_val(state, e, val):
+        if not (yield from assign_val(state, e, val)):
            error(state, f"Line {e['line']}: unknown assignment type: <{e['kind']}>.") 
 
     return None
 
 # Evaluates if statement
-def _if_(state: s.State, e: dict, flags: tuple) -> tuple | None:
-    new_state = s.State({}, state, state.output)
+def _if_(state: s.State, e: dict, flags: tuple):
+    new_state = s.State({}, state, state.output, state.cache)
     for i in e['truePartArr']:
-        if eval_expression(state, i['test']).value:
-            return eval_block(new_state, i['part'], flags)
+        if (yield expression(state, i['test'])).value:
+            return (yield from block(new_state, i['part'], flags))
     
-    return eval_block(new_state, e['falsePart'], flags)
+    return (yield from block(new_state, e['falsePart'], flags))
 
 # Evaluates while statement
-def _while_(state: s.State, e: dict, flags: tuple) -> tuple | None:
-    new_state = s.State({}, state, state.output)
+def _while_(state: s.State, e: dict, flags: tuple):
+    new_state = s.State({}, state, state.output, state.cache)
     new_flags = Flags(flags.in_func, True)
 
-    res = None
-    while eval_expression(state, e['test']).value:
-        if (res := eval_block(new_state, e['body'], new_flags)):
+    res, budget, generator = None, state.cache and state.cache.budget, types.GeneratorType
+    while True:
+        # A test that makes no calls is evaluated without the evaluator.
+        if type(test := expression(state, e['test'])) is generator:
+            test = yield test
+
+        if not test.value:
+            break
+
+        if budget:
+            budget.step(state)
+
+        if (res := (yield from block(new_state, e['body'], new_flags))):
             match res[0]:
-                case 'return' | 'break':
+                case 'return' | 'break' | 'tail':
                     return res
                 # case 'continue' 
 
     return None
 
+# Comparisons a counted loop's test may use.
+counted_tests = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+# Recognizes 'for (...; i < bound; ++i)', where the bound is an integer literal or a
+# variable and both names are defined once the initializers have run. Returns the state
+# value holding the counter, its name, the step, the comparison and a function returning
+# the bound, or None for any other loop.
+def counted_loop(state: s.State, e: dict) -> tuple | None:
+    test, updates = e['test'], e['updates']
+    if test['kind'] != 'binop' or test['op'] not in counted_tests or len(updates) != 1:
+        return None
+
+    counter, bound, update = test['e1'], test['e2'], updates[0]
+    if counter['kind'] != 'variable' or update['kind'] != 'static':
+        return None
+
+    step = update['expr']
+    if step['kind'] != 'unop' or step['op'] not in ('++', '--') or step['expr']['kind'] != 'variable' or step['expr']['name'] != counter['name']:
+        return None
+
+    name = counter['name']
+    if not (found := s.find_in_scope(state, name)):
+        return None
+
+    match bound['kind']:
+        case 'integer':
+            try:
+                limit = a._integer(int(bound['value']))
+            except:
+                return None
+
+            get_bound = lambda: limit
+        case 'variable':
+            if not (where := s.find_in_scope(state, bound['name'])):
+                return None
+
+            values, bound_name = where[0], bound['name']
+            get_bound = lambda: values[bound_name]
+        case _:
+            return None
+
+    return found[0], name, 1 if step['op'] == '++' else -1, counted_tests[test['op']], get_bound
+
+# Runs a counted loop on python integers while the counter holds an integer and the bound
+# a number. Variables never move to another state once defined, so the counter and bound
+# are read straight from the values that hold them. Returns the loop's result, or 'test'
+# or 'update' for the step the generic loop resumes at when an operand changes type.
+def count(state: s.State, e: dict, flags: tuple, values: dict, name: str, step: int, cmp, get_bound):
+    body, budget = e['body'], state.cache and state.cache.budget
+    while True:
+        if budget:
+            budget.step(state)
+
+        x, bound = values[name], get_bound()
+        if type(x) is not a._integer or type(x.value) is not int or a.not_number(bound):
+            return 'test'
+
+        if not cmp(x.value, bound.value):
+            return None
+
+        if (res := (yield from block(state, body, flags))) and res[0] != 'continue':
+            return res
+
+        x = values[name]
+        if type(x) is not a._integer or type(x.value) is not int:
+            return 'update'
+
+        values[name] = a._integer(x.value + step)
+
 # Evaluates for statement
-def _for_(state: s.State, e: dict, flags: tuple) -> tuple | None:
-    new_state = s.State({}, state, state.output)
+def _for_(state: s.State, e: dict, flags: tuple):
+    new_state = s.State({}, state, state.output, state.cache)
     for stmt in e['inits']:
         # Flags not required for initializer statements.
-        eval_statement(new_state, stmt)
+        yield statement(new_state, stmt)
 
     new_flags = Flags(flags.in_func, True)
-    res = None
-    while eval_expression(new_state, e['test']).value:
-        if (res := eval_block(new_state, e['body'], new_flags)):
+    if (counted := counted_loop(new_state, e)):
+        res = yield from count(new_state, e, new_flags, *counted)
+        if res != 'test' and res != 'update':
+            return res
+        # The generic loop takes over where the counted loop stopped.
+        if res == 'update':
+            for stmt in e['updates']:
+                yield statement(new_state, stmt)
+
+    res, budget, generator = None, state.cache and state.cache.budget, types.GeneratorType
+    while True:
+        if type(test := expression(new_state, e['test'])) is generator:
+            test = yield test
+
+        if not test.value:
+            break
+
+        if budget:
+            budget.step(state)
+
+        if (res := (yield from block(new_state, e['body'], new_flags))):
             match res[0]:
-                case 'return' | 'break':
+                case 'return' | 'break' | 'tail':
                     return res
                 # case 'continue'
 
         for stmt in e['updates']:
             # Flags not required for update statements.
-            eval_statement(new_state, stmt)
+            if type(update := statement(new_state, stmt)) is generator:
+                yield update
         
     return None
 
 # Evaluates delete statement
-def _delete_(state: s.State, e: dict, flags: tuple) -> None:
+def _delete_(state: s.State, e: dict, flags: tuple):
     expr = e['expr']
-    attribute = determine_attribute(state, expr) 
-    if not attribute:
+    attribute = yield from determine_attribute(state, expr)
+    if attribute is None or attribute == '':
         error(state, f"Line {e['line']}: cannot delete <{expr['kind']}>.")
 
-    collection = eval_expression(state, expr['collection'])
+    attribute = str(attribute)
+
+    collection = yield expression(state, expr['collection'])
     if a.not_collection(collection):
         error(state, f"Line {e['line']}: invalid collection type for attribute deletion '{attribute}': <{a.kind(collection)}>.")
     
@@ -663,11 +1308,21 @@ def _delete_(state: s.State, e: dict, flags: tuple) -> None:
     return None 
 
 # Evaluates return statement
-def _return_(state: s.State, e: dict, flags: tuple) -> tuple:
+def _return_(state: s.State, e: dict, flags: tuple):
     if not flags.in_func:
         error(state, f"Line {e['line']}: return outside of function.") 
 
-    return 'return', eval_expression(state,  e['expr'])
+    return (yield from _valid_return_(state, e, flags))
+
+# Evaluates a return statement known to be inside a function.
+def _valid_return_(state: s.State, e: dict, flags: tuple):
+    expr = e['expr']
+    # A call in return position is made by the caller, after this function has ended.
+    if expr['kind'] == 'call':
+        call = yield from prepare_call(state, expr)
+        return ('tail' if type(call) is Call else 'return'), call
+
+    return 'return', (yield expression(state, expr))
 
 def _break_(state: s.State, e: dict, flags: tuple) -> tuple:
     if not flags.in_loop:
@@ -681,8 +1336,19 @@ def _continue_(state: s.State, e: dict, flags: tuple) -> tuple:
 
     return 'continue', None
 
+# Evaluates a break or continue statement known to be inside a loop.
+def _valid_break_(state: s.State, e: dict, flags: tuple) -> tuple:
+    return 'break', None
+
+def _valid_continue_(state: s.State, e: dict, flags: tuple) -> tuple:
+    return 'continue', None
+
+# Reports a statement of unknown kind.
+def _unknown_statement_(state: s.State, e: dict, flags: tuple):
+    error(state, f"Unknown statement: <{e['kind']}>.")
+
 # Statements
-statements = {
+statements = Handlers({
     'static': stmt( _static_ ),
     'assignment': stmt( _assignment_ ),
     'if': stmt( _if_ ),
@@ -692,34 +1358,450 @@ statements = {
     'return': stmt( _return_ ),
     'break': stmt( _break_ ),
     'continue':  stmt( _continue_ )
+}, _unknown_statement_)
+
+# Statements of validated programs, each return, break and continue is in place.
+valid_statements = Handlers({
+    **statements,
+    'return': stmt( _valid_return_ ),
+    'break': stmt( _valid_break_ ),
+    'continue': stmt( _valid_continue_ )
+}, _unknown_statement_)
+
+# Evaluates static statement
+def _static_value_(state: s.State, s: dict, flags: tuple) -> None:
+    direct(state, s['expr'])
+    return None
+
+# Evaluates assignment statement
+def _assignment_value_(state: s.State, s: dict, flags: tuple) -> None:
+    val = direct(state, s['expr'])
+    for e in s['assignArr']:
+        if not assign_value(state, e, val):
+           error(state, f"Line {e['line']}: unknown assignment type: <{e['kind']}>.") 
+
+    return None
+
+# Evaluates return statement
+def _return_value_(state: s.State, e: dict, flags: tuple) -> tuple:
+    if not flags.in_func:
+        error(state, f"Line {e['line']}: return outside of function.") 
+
+    return 'return', direct(state, e['expr'])
+
+# Evaluates a return statement known to be inside a function.
+def _valid_return_value_(state: s.State, e: dict, flags: tuple) -> tuple:
+    return 'return', direct(state, e['expr'])
+
+# Statements that make no calls, run without a generator.
+direct_statements = {
+    'static': _static_value_,
+    'assignment': _assignment_value_,
+    'return': _return_value_
 }
 
-# Executes a given ast statement
-def eval_statement(state: s.State, e: dict, flags: tuple = Flags(False, False)) -> tuple | None:
+# Statements of validated programs that make no calls.
+valid_direct_statements = { **direct_statements, 'return': _valid_return_value_ }
+
+# Starts a given ast statement, returns its result or a generator that executes it.
+def statement(state: s.State, e: dict, flags: tuple = Flags(False, False)):
     kind = e['kind']
-    if kind not in statements:
-        error(state, f"Unknown statement: <{kind}>.") 
+    if state and (caches := state.cache) is not None:
+        if kind in direct_statements and caches.call_free(e):
+            return caches.direct_statements[kind](state, e, flags)
+
+        if caches.profile is not None:
+            return timed(caches.profile, e, caches.statements[kind], state, e, flags)
+
+        return caches.statements[kind](state, e, flags)
 
     return statements[kind](state, e, flags)
 
+# Executes a given ast statement
+def eval_statement(state: s.State, e: dict, flags: tuple = Flags(False, False), max_depth: int = MAX_DEPTH) -> tuple | None:
+    return Interpreter(max_depth).eval_statement(state, e, flags)
 
-# Evaluates a block of code, searches for return value.
-def eval_block(state: s.State, b: list, flags: tuple = Flags(False, False)) -> tuple | None:
-    ret_val = None
+
+# Generator for a block of code, searches for return value. Statements run directly are
+# not yielded to the evaluator.
+def block(state: s.State, b: list, flags: tuple = Flags(False, False)):
+    ret_val, generator = None, types.GeneratorType
     for stmt in b:
-        if (ret_val := eval_statement(state, stmt, flags)):
+        if type(ret_val := statement(state, stmt, flags)) is generator:
+            ret_val = yield ret_val
+
+        if ret_val:
             break
     
     return ret_val
 
+# Evaluates a block of code, searches for return value.
+def eval_block(state: s.State, b: list, flags: tuple = Flags(False, False), max_depth: int = MAX_DEPTH) -> tuple | None:
+    return Interpreter(max_depth).eval_block(state, b, flags)
+
+
+# Validation
+
+# Flags of a loop's initializers and updates, and of the program's top level.
+no_flags = Flags(False, False)
+
+# Returns the messages of the errors a program's nodes raise when they run: unknown
+# expressions, statements and operators, and return, break or continue statements out of
+# place. Messages are the ones the run reports and are listed in program order. A program
+# with none runs without these checks. Nodes are visited from a stack of (node, flags)
+# pairs, where the flags of an expression are None.
+def validate(p: list) -> list:
+    problems, stack = [], [ (stmt, no_flags) for stmt in reversed(p) ]
+    while stack:
+        e, flags = stack.pop()
+        children = []
+        if flags is None:
+            validate_expression(e, problems, children)
+        else:
+            validate_statement(e, flags, problems, children)
+
+        stack.extend(reversed(children))
+
+    return problems
+
+# Checks an expression, adding the nodes it evaluates to 'children'.
+def validate_expression(e: dict, problems: list, children: list) -> None:
+    match e['kind']:
+        case 'null' | 'boolean' | 'string' | 'integer' | 'float' | 'variable':
+            pass
+        case 'collection':
+            children.extend((val, None) for val in e['value'].values())
+        case 'closure':
+            children.extend((stmt, func_flags) for stmt in e['body'])
+        case 'attribute':
+            children.append((e['collection'], None))
+        case 'subscriptor':
+            children.extend(((e['collection'], None), (e['expr'], None)))
+        case 'unop':
+            if e['op'] not in unops:
+                problems.append(f"Line {e['line']}: unknown operator {e['op']}.")
+            children.append((e['expr'], None))
+        case 'binop':
+            if e['op'] not in binops:
+                problems.append(f"Line {e['line']}: unknown operator {e['op']}.")
+            children.extend(((e['e1'], None), (e['e2'], None)))
+        case 'call':
+            if e['fun']['kind'] != 'variable':
+                children.append((e['fun'], None))
+            children.extend((arg, None) for arg in e['args'])
+        case 'ternary':
+            children.extend((e[part], None) for part in ('test', 'trueExpr', 'falseExpr'))
+        case kind:
+            problems.append(f"Line {e['line']}: unknown expression: <{kind}>.")
+
+# Adds the expressions assigning to a target evaluates to 'children'. Other targets are
+# reported by the assignment that runs them.
+def validate_target(e: dict, children: list) -> None:
+    match e['kind']:
+        case 'attribute':
+            children.append((e['collection'], None))
+        case 'subscriptor':
+            children.extend(((e['expr'], None), (e['collection'], None)))
+
+# Checks a statement run with 'flags', adding the nodes it runs to 'children'.
+def validate_statement(e: dict, flags: tuple, problems: list, children: list) -> None:
+    match e['kind']:
+        case 'static':
+            children.append((e['expr'], None))
+        case 'assignment':
+            children.append((e['expr'], None))
+            for target in e['assignArr']:
+                validate_target(target, children)
+        case 'if':
+            for part in e['truePartArr']:
+                children.append((part['test'], None))
+                children.extend((stmt, flags) for stmt in part['part'])
+            children.extend((stmt, flags) for stmt in e['falsePart'])
+        case 'while':
+            children.append((e['test'], None))
+            children.extend((stmt, Flags(flags.in_func, True)) for stmt in e['body'])
+        case 'for':
+            children.extend((stmt, no_flags) for stmt in e['inits'])
+            children.append((e['test'], None))
+            children.extend((stmt, Flags(flags.in_func, True)) for stmt in e['body'])
+            children.extend((stmt, no_flags) for stmt in e['updates'])
+        case 'delete':
+            validate_target(e['expr'], children)
+        case 'return':
+            if not flags.in_func:
+                problems.append(f"Line {e['line']}: return outside of function.")
+            children.append((e['expr'], None))
+        case 'break':
+            if not flags.in_loop:
+                problems.append(f"Line {e['line']}: break outside of loop.")
+        case 'continue':
+            if not flags.in_loop:
+                problems.append(f"Line {e['line']}: continue outside of loop.")
+        case kind:
+            problems.append(f"Unknown statement: <{kind}>.")
+
+
+# Caches kept for one run of a program: the inline caches of nodes naming variables and,
+# when functions are memoized, the analysis and memo table of each function.
+class Caches:
+    def __init__(self, memo_size: int = 0, builtins: dict = built_funcs, adaptive: bool = True) -> None:
+        self.nodes = {}
+        # Operation nodes specialized to their operand types, when the run is adaptive.
+        self.quick = {} if adaptive else None
+        # Limits on the run's steps.
+        self.budget = None
+        # Profile the run records to.
+        self.profile = None
+        # Lookups that found nothing, and the number of variables defined so far.
+        self.misses = {}
+        self.defines = 0
+        # Expressions found to make no calls.
+        self.direct = {}
+        # Free variables of the program's closures, when the program has been analysed.
+        self.scopes = None
+        # Handlers of the run's nodes, those of a validated program make fewer checks.
+        self.expressions, self.statements, self.direct_statements = expressions, statements, direct_statements
+        self.memo_size = memo_size
+        self.memos = {}
+        self.analysis = {}
+        # Built-in functions a pure function may call.
+        self.pure_builtins = { name for name in m.pure_builtins if builtins.get(name) is built_funcs[name] }
+
+    # Returns whether an expression or statement can be run directly, finding out once per run.
+    # Profiled runs time every node, and run none directly.
+    def call_free(self, e: dict) -> bool:
+        if (free := self.direct.get(id(e))) is None:
+            if self.profile is not None:
+                return False
+
+            try:
+                free = call_free(e)
+            except KeyError:
+                free = False
+
+            self.direct[id(e)] = free
+
+        return free
+
+    # Runs a program that validates without the checks validation makes. A program with
+    # problems is run with them, so each error is reported when its node runs.
+    def validate(self, p: list) -> bool:
+        try:
+            valid = not validate(p)
+        except (KeyError, TypeError, AttributeError):
+            valid = False
+
+        if valid:
+            self.expressions, self.statements, self.direct_statements = valid_expressions, valid_statements, valid_direct_statements
+
+        return valid
+
+    # Returns the Purity of a function, analysing its body once per run.
+    def purity(self, func: s.Closure) -> m.Purity | None:
+        body = id(func.body)
+        if body not in self.analysis:
+            self.analysis[body] = m.purity(func.params, func.body)
+
+        return self.analysis[body]
+
+    # Returns the memo table of a function.
+    def memo(self, func: s.Closure) -> m.Memo:
+        if func not in self.memos:
+            self.memos[func] = m.Memo(self.memo_size)
+
+        return self.memos[func]
+
+
+# Runs programs with its own call depth limit and built-in functions. Every run keeps its
+# call stack to itself, so one instance can run programs on any number of threads. With a
+# 'memo_size', calls to pure functions are memoized, keeping up to that many results per
+# function, and 'memo_stats' counts the hits, misses and evictions of every run. Runs are
+# 'adaptive' unless told otherwise, specializing operations to their operand types.
+class Interpreter:
+    def __init__(self, max_depth: int = MAX_DEPTH, builtins: dict | None = None, memo_size: int = 0, adaptive: bool = True) -> None:
+        self.max_depth = max_depth
+        self.adaptive = adaptive
+        self.builtins = dict(built_funcs if builtins is None else builtins)
+        self.memo_size = memo_size
+        self.memo_stats = dict(hits=0, misses=0, evictions=0)
+        self.lock = threading.Lock()
+
+    # Runs a handler to completion. Each generator it yields is pushed on the stack and
+    # resumed in its place, other values are sent straight back. A call pushes a marker
+    # below its body so the number of active calls is known.
+    def evaluate(self, task):
+        if type(task) is not types.GeneratorType:
+            return task
+
+        stack, depth, val = [], 0, None
+        push, pop, generator = stack.append, stack.pop, types.GeneratorType
+        max_depth, builtins = self.max_depth, self.builtins
+        while True:
+            try:
+                req = task.send(val)
+            except StopIteration as done:
+                if not stack:
+                    return done.value
+
+                task, val = pop(), done.value
+                if task is None:
+                    task, depth = pop(), depth - 1
+
+                continue
+
+            if type(req) is generator:
+                push(task)
+                task, val = req, None
+            elif type(req) is Call:
+                if depth >= max_depth:
+                    error(req.state, f"Line {req.e['line']}: maximum recursion depth exceeded for {call_name(req.e, req.func)}(...).")
+
+                push(task)
+                push(None)
+                task, val, depth = req.body, None, depth + 1
+            elif type(req) is Builtin:
+                if (f := builtins.get(req.name)) is None:
+                    error(req.state, f"Line {req.e['line']}: function {req.name}(...) is not defined.")
+
+                val = f(req.state, req.e)
+                if type(val) is generator:
+                    push(task)
+                    task, val = val, None
+            else:
+                val = req
+
+    # Makes the tail call left by a statement or block evaluated outside of a call.
+    def complete(self, result: tuple | None) -> tuple | None:
+        if result and result[0] == 'tail':
+            return 'return', self.evaluate(make_call(result[1]))
+
+        return result
+
+    # Evaluates a given expression
+    def eval_expression(self, state: s.State, e: dict) -> tuple:
+        return self.evaluate(expression(state, e))
+
+    # Executes a given ast statement
+    def eval_statement(self, state: s.State, e: dict, flags: tuple = Flags(False, False)) -> tuple | None:
+        return self.complete(self.evaluate(statement(state, e, flags)))
+
+    # Evaluates a block of code, searches for return value.
+    def eval_block(self, state: s.State, b: list, flags: tuple = Flags(False, False)) -> tuple | None:
+        return self.complete(self.evaluate(block(state, b, flags)))
+
+    # Evaluates a program's AST and produces its output. Output goes to a new list unless
+    # another sink is given, and the program stops once it writes more than 'limit' bytes
+    # or once the 'stop' event is set. With 'profile', True or a profiler.Profile to add
+    # the run to, the result's 'profile' holds the run's times. A run taking more than
+    # 'fuel' steps, loop iterations and calls, or running for more than 'timeout' seconds
+    # ends with a 'timeout' result holding the output written so far. A run given a
+    # 'snapshot' starts from the global state its prelude left.
+    def interp_program(self, p, output=None, limit: int | None = None, stop: threading.Event | None = None, profile=None,
+                       fuel: int | None = None, timeout: float | None = None, snapshot: sn.Snapshot | None = None) -> dict:
+        out, caches = [] if output is None else output, Caches(self.memo_size, self.builtins, self.adaptive)
+        if stop or fuel is not None or timeout is not None:
+            caches.budget = Budget(fuel, None if timeout is None else time.monotonic() + timeout, stop)
+        if profile:
+            caches.profile = pr.Profile() if profile is True else profile
+            caches.profile.start()
+        # A prelude that failed validation leaves functions that need the checks.
+        if snapshot is None or snapshot.valid:
+            caches.validate(p)
+        caches.scopes = cl.analyse(p) if snapshot is None else snapshot.analyse(p)
+        values, copies = ({}, None) if snapshot is None else snapshot.start()
+        token = sn.active.set(copies)
+        try:
+            self.eval_block(s.State(values, None, out if limit is None else o.Limited(out, limit), caches), p)
+            result = dict(kind='ok', output=out)
+        except Timeout:
+            result = dict(kind='timeout', output=out)
+        except (ScopeScriptError, o.OutputLimit) as err:
+            result = dict(kind='error', output=[str(err)])
+        except:
+            result = dict(kind='error', output=[])
+        finally:
+            sn.active.reset(token)
+            with self.lock:
+                for memo in caches.memos.values():
+                    self.memo_stats['hits'] += memo.hits
+                    self.memo_stats['misses'] += memo.misses
+                    self.memo_stats['evictions'] += memo.evictions
+
+        if caches.profile is not None:
+            caches.profile.finish()
+            result['profile'] = caches.profile
+
+        return result
+
+    # Runs a prelude and returns a Snapshot of the global state it leaves, for later runs to
+    # start from. A prelude that fails raises its ScopeScriptError.
+    def snapshot(self, prelude: list) -> sn.Snapshot:
+        out, caches = [], Caches(self.memo_size, self.builtins, self.adaptive)
+        valid = caches.validate(prelude)
+        caches.scopes = cl.analyse(prelude, open=True)
+        state = s.State({}, None, out, caches)
+        self.eval_block(state, prelude)
+        return sn.Snapshot(prelude, state.value, out, caches.scopes, valid)
+
+    # Runs a program on another thread and yields its printed lines as they are produced,
+    # then returns the program's result. A program whose lines are no longer wanted stops
+    # at its next print, or within CHECK_INTERVAL loop iterations and calls.
+    def stream_program(self, p, limit: int | None = None):
+        lines, closed = queue.SimpleQueue(), threading.Event()
+        def send(line):
+            if closed.is_set():
+                raise o.OutputLimit('Output closed.')
+
+            lines.put(line)
+
+        thread = threading.Thread(target=lambda: lines.put(self.interp_program(p, o.Callback(send), limit, closed)), daemon=True)
+        thread.start()
+        try:
+            while type(item := lines.get()) is str:
+                yield item
+        finally:
+            closed.set()
+        # The lines have been yielded already, an error result carries its message.
+        return item if item['kind'] == 'error' else dict(kind='ok', output=[])
+
+
+# Raises python's recursion limit to at least 'limit' for the duration of a block, for
+# backends that recurse on the python stack. Threads running at the same time share the
+# highest limit asked for, python's own limit is restored when the last of them leaves.
+class RecursionLimit:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.limits = []
+        self.saved = None
+
+    @contextlib.contextmanager
+    def __call__(self, limit: int):
+        with self.lock:
+            if not self.limits:
+                self.saved = sys.getrecursionlimit()
+
+            self.limits.append(limit)
+            sys.setrecursionlimit(max(self.saved, *self.limits))
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.limits.remove(limit)
+                if not self.limits:
+                    sys.setrecursionlimit(self.saved)
+
+recursion_limit = RecursionLimit()
+
 
 # Evaluates a program's AST and prdouces an output and final program state.
-def interp_program(p):
-    out = []
-    try:
-        eval_block(s.State({}, None, out), p)
-        return dict(kind='ok', output=out)
-    except AssertionError:
-        return dict(kind='error', output=out)
-    except:
-        return dict(kind='error', output=[])
\ No newline at end of file
+def interp_program(p, max_depth: int = MAX_DEPTH, output=None, limit: int | None = None, stop: threading.Event | None = None, profile=None,
+                   fuel: int | None = None, timeout: float | None = None, snapshot: sn.Snapshot | None = None):
+    return Interpreter(max_depth).interp_program(p, output, limit, stop, profile, fuel, timeout, snapshot)
+
+# Runs a prelude and returns a snapshot of its global state, see Interpreter.snapshot.
+def snapshot(prelude: list, max_depth: int = MAX_DEPTH) -> sn.Snapshot:
+    return Interpreter(max_depth).snapshot(prelude)
+
+# Streams a program's printed lines, see Interpreter.stream_program.
+def stream_program(p, max_depth: int = MAX_DEPTH, limit: int | None = None):
+    return Interpreter(max_depth).stream_program(p, limit)
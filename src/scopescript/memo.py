@@ -0,0 +1,135 @@
+import math
+from collections import OrderedDict, namedtuple
+
+from scopescript import atoms as a
+
+# Memoization of pure functions. A function body is pure when it prints nothing, changes
+# no collection and creates no collection or closure, so its result depends only on its
+# arguments and on the variables it reads from outside. Its calls are then looked up by
+# those values in a least recently used table of the function's results.
+
+# Names a pure body assigns to and names it reads from outside, with its parameters left out.
+Purity = namedtuple('Purity', ['locals', 'free'])
+
+# Atoms that can be part of a memo key.
+primitives = { a._null, a._boolean, a._integer, a._float, a._string, a._rope }
+
+# Returns the part of a memo key holding a primitive value. Floats keep their sign, so 0.0
+# and -0.0 are told apart, and a rope is keyed as the string it joins to.
+def value_key(val: tuple) -> tuple:
+    if type(val) is a._float:
+        return a._float, val.value, math.copysign(1, val.value)
+    if type(val) is a._rope:
+        return a._string, val.value
+
+    return type(val), val.value
+
+# Built-in functions without side effects.
+pure_builtins = { 'type', 'ord', 'abs', 'len', 'pow', 'bool', 'int', 'float', 'str' }
+
+# Raised by the analysis when a body is not pure.
+class Impure(Exception):
+    pass
+
+# Records the names an expression reads and assigns.
+def expression(e: dict, reads: set, writes: set) -> None:
+    match e['kind']:
+        case 'null' | 'boolean' | 'string' | 'integer' | 'float':
+            pass
+        case 'variable':
+            reads.add(e['name'])
+        case 'attribute':
+            expression(e['collection'], reads, writes)
+        case 'subscriptor':
+            expression(e['collection'], reads, writes)
+            expression(e['expr'], reads, writes)
+        case 'unop':
+            if e['op'] in ('++', '--'):
+                target(e['expr'], reads, writes)
+            expression(e['expr'], reads, writes)
+        case 'binop':
+            expression(e['e1'], reads, writes)
+            expression(e['e2'], reads, writes)
+        case 'ternary':
+            for part in (e['test'], e['trueExpr'], e['falseExpr']):
+                expression(part, reads, writes)
+        case 'call':
+            f = e['fun']
+            if f['kind'] != 'variable' or f['name'] == 'print':
+                raise Impure
+
+            reads.add(f['name'])
+            for arg in e['args']:
+                expression(arg, reads, writes)
+        case _:
+            raise Impure
+
+# Records the variable an assignment writes to, only variables may be assigned.
+def target(e: dict, reads: set, writes: set) -> None:
+    if e['kind'] not in ('identifier', 'variable'):
+        raise Impure
+
+    writes.add(e['name'])
+
+# Records the names a block reads and assigns.
+def block(b: list, reads: set, writes: set) -> None:
+    for stmt in b:
+        match stmt['kind']:
+            case 'static' | 'return':
+                expression(stmt['expr'], reads, writes)
+            case 'assignment':
+                expression(stmt['expr'], reads, writes)
+                for e in stmt['assignArr']:
+                    target(e, reads, writes)
+            case 'if':
+                for part in stmt['truePartArr']:
+                    expression(part['test'], reads, writes)
+                    block(part['part'], reads, writes)
+                block(stmt['falsePart'], reads, writes)
+            case 'while':
+                expression(stmt['test'], reads, writes)
+                block(stmt['body'], reads, writes)
+            case 'for':
+                block(stmt['inits'], reads, writes)
+                expression(stmt['test'], reads, writes)
+                block(stmt['updates'], reads, writes)
+                block(stmt['body'], reads, writes)
+            case 'break' | 'continue':
+                pass
+            case _:
+                raise Impure
+
+# Analyses a function, returns its Purity or None when it is not pure.
+def purity(params: list, body: list) -> Purity | None:
+    reads, writes = set(), set()
+    try:
+        block(body, reads, writes)
+    except (Impure, KeyError, RecursionError):
+        return None
+
+    local = writes.difference(params)
+    return Purity(tuple(local), tuple(reads.difference(params, local)))
+
+# A function's results by key, holding at most 'size' of them. The least recently used
+# result is evicted to make room for a new one.
+class Memo:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.table = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    # Returns the result stored for 'key', or None.
+    def get(self, key: tuple) -> tuple | None:
+        if (val := self.table.get(key)) is None:
+            self.misses += 1
+            return None
+
+        self.table.move_to_end(key)
+        self.hits += 1
+        return val
+
+    def put(self, key: tuple, val: tuple) -> None:
+        self.table[key] = val
+        if len(self.table) > self.size:
+            self.table.popitem(last=False)
+            self.evictions += 1
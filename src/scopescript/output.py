@@ -0,0 +1,52 @@
+# Output sinks. A program writes its output one string at a time through 'append', so a
+# python list is the default sink and any object with an 'append' method can take its
+# place. print appends each argument and a ' ' separator, then a single '\n'.
+
+# Raised when a program's output goes past its byte limit.
+class OutputLimit(Exception):
+    pass
+
+# Writes output to a file-like object as it is produced.
+class Writer:
+    def __init__(self, file, flush: bool = False) -> None:
+        self.file = file
+        self.flush = flush
+
+    def append(self, text: str) -> None:
+        self.file.write(text)
+        if self.flush and text == '\n':
+            self.file.flush()
+
+# Calls 'f' with the text of each printed line, without its newline. Printed strings may
+# hold newlines of their own, so output is split on every newline it contains.
+class Callback:
+    def __init__(self, f) -> None:
+        self.f = f
+        self.line = []
+
+    def append(self, text: str) -> None:
+        if '\n' not in text:
+            self.line.append(text)
+            return
+
+        lines = text.split('\n')
+        self.line.append(lines[0])
+        lines[0] = ''.join(self.line)
+        self.line = [lines.pop()]
+        for line in lines:
+            self.f(line)
+
+# Passes output on to 'sink' until more than 'limit' bytes of UTF-8 have been written,
+# then stops the program.
+class Limited:
+    def __init__(self, sink, limit: int) -> None:
+        self.sink = sink
+        self.limit = limit
+        self.size = 0
+
+    def append(self, text: str) -> None:
+        self.size += len(text) if text.isascii() else len(text.encode())
+        if self.size > self.limit:
+            raise OutputLimit(f"Output limit of {self.limit} bytes exceeded.")
+
+        self.sink.append(text)
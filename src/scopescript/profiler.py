@@ -0,0 +1,128 @@
+import collections, time
+
+# Deterministic profiling of interpreted programs. The interpreter reports every node it
+# starts and finishes, and every call it makes, to the run's Profile. Nodes are timed with
+# the time spent in the nodes they evaluate taken out as self time. A node, line or
+# function active more than once at a time, as in recursion, adds only its outermost time
+# to its cumulative time.
+
+# Root frame of the collapsed stacks.
+ROOT = '<program>'
+
+# Times of a node, line or function: how often it ran, its self and its cumulative time.
+class Stats:
+    __slots__ = ('hits', 'self', 'cumulative')
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.self = self.cumulative = 0.0
+
+# Records the nodes, lines and functions of the runs it is given. A profile records one run
+# at a time, and may be given several runs in turn to add them up.
+class Profile:
+    def __init__(self, clock=time.perf_counter) -> None:
+        self.clock = clock
+        # Node stats by node id, with the node.
+        self.nodes = {}
+        self.lines = collections.defaultdict(Stats)
+        # Function stats by the id of the function's body, with its name and line.
+        self.functions = {}
+        # Self time of each stack of function names ending in a line.
+        self.stacks = collections.defaultdict(float)
+        self.start()
+
+    # Prepares for a new run.
+    def start(self) -> None:
+        # Active nodes: node, line, start time and time spent in its children.
+        self.frames = []
+        # Active calls: function key and start time, and the names of the call stack.
+        self.calls = []
+        self.names = [ROOT]
+        self.active = collections.Counter()
+
+    # Finishes the nodes and calls left active by a run that stopped with an error.
+    def finish(self) -> None:
+        while self.frames:
+            self.exit()
+
+        while self.calls:
+            self.ret()
+
+    # Starts timing a node.
+    def enter(self, e: dict) -> None:
+        line = e.get('line')
+        if line is None and self.frames:
+            line = self.frames[-1][1]
+
+        self.active[id(e)] += 1
+        self.active[('line', line)] += 1
+        self.frames.append([e, line, self.clock(), 0.0])
+
+    # Finishes timing the node entered last.
+    def exit(self) -> None:
+        e, line, start, children = self.frames.pop()
+        elapsed = self.clock() - start
+        own = elapsed - children
+        if self.frames:
+            self.frames[-1][3] += elapsed
+
+        if (key := id(e)) not in self.nodes:
+            self.nodes[key] = (e, Stats())
+
+        for key, stats in ((key, self.nodes[key][1]), (('line', line), self.lines[line])):
+            stats.hits += 1
+            stats.self += own
+            self.active[key] -= 1
+            if not self.active[key]:
+                stats.cumulative += elapsed
+
+        self.stacks[(*self.names, f'line {line}')] += own
+
+    # Starts timing a call to a function, named by the call.
+    def call(self, name: str, body: list) -> None:
+        if (key := id(body)) not in self.functions:
+            line = body[0].get('line') if body else None
+            self.functions[key] = (name, line, body, Stats())
+
+        self.active[('function', key)] += 1
+        self.calls.append((key, self.clock()))
+        self.names.append(name)
+
+    # Finishes timing the call made last.
+    def ret(self) -> None:
+        key, start = self.calls.pop()
+        self.names.pop()
+        stats = self.functions[key][3]
+        stats.hits += 1
+        self.active[('function', key)] -= 1
+        if not self.active[('function', key)]:
+            stats.cumulative += self.clock() - start
+
+    # Returns a text report of the lines, functions and nodes taking the most time, sorted
+    # by self time, or by call time for functions. 'limit' rows are kept in each section.
+    def report(self, limit: int = 20) -> str:
+        ms = lambda t: f'{t * 1000:.3f}'
+        rows = ['Lines', f"{'line':>6} {'hits':>10} {'self ms':>12} {'cum ms':>12}"]
+        for line, stats in sorted(self.lines.items(), key=lambda item: -item[1].self)[:limit]:
+            rows.append(f"{str(line):>6} {stats.hits:>10} {ms(stats.self):>12} {ms(stats.cumulative):>12}")
+
+        rows += ['', 'Functions', f"{'function':<24} {'line':>6} {'calls':>10} {'total ms':>12}"]
+        for name, line, _, stats in sorted(self.functions.values(), key=lambda f: -f[3].cumulative)[:limit]:
+            rows.append(f"{name:<24} {str(line):>6} {stats.hits:>10} {ms(stats.cumulative):>12}")
+
+        rows += ['', 'Nodes', f"{'node':<24} {'line':>6} {'hits':>10} {'self ms':>12} {'cum ms':>12}"]
+        for e, stats in sorted(self.nodes.values(), key=lambda n: -n[1].self)[:limit]:
+            node = e['kind'] + (f" {e['op']}" if 'op' in e else '')
+            rows.append(f"{node:<24} {str(e.get('line')):>6} {stats.hits:>10} {ms(stats.self):>12} {ms(stats.cumulative):>12}")
+
+        return '\n'.join(rows) + '\n'
+
+    # Returns the self time of every stack in the collapsed format of flame graph tools, one
+    # 'frame;frame;... microseconds' line per stack.
+    def collapsed(self) -> str:
+        lines = []
+        for stack, own in sorted(self.stacks.items()):
+            if (us := round(own * 1e6)) > 0:
+                lines.append(f"{';'.join(stack)} {us}")
+
+        return ''.join(line + '\n' for line in lines)
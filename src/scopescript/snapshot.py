@@ -0,0 +1,199 @@
+import contextvars
+from collections.abc import MutableMapping
+
+from scopescript import atoms as a
+from scopescript import scope as s
+from scopescript import closures as cl
+
+# Warm-start snapshots. A prelude is run once and the global state it leaves is frozen:
+# every state value dict and collection table reachable from it, through variables,
+# collections and closures, is replaced by a frozen copy that is never changed. Runs
+# started from the snapshot share the frozen objects. A run reading one reads its frozen
+# data until the run first writes to it, the write makes a copy for that run alone and the
+# run reads and writes its copy from then on. So no run sees another's changes, and
+# processes forked after the snapshot was made share its memory.
+
+# Copies of frozen objects made by the running program, by the id of the frozen object.
+active = contextvars.ContextVar('active', default=None)
+
+# Raised when a snapshot is changed outside of a run.
+class FrozenError(TypeError):
+    pass
+
+# Data shared by the runs of a snapshot, with the copy the running program made of it.
+class Frozen:
+    # Returns the data a run reads, its copy if it made one.
+    def view(self):
+        if (copies := active.get()) is None:
+            return self.data
+
+        return copies.get(id(self), self.data)
+
+    # Returns the running program's copy of the data, making it on the first write.
+    def writable(self):
+        if (copies := active.get()) is None:
+            raise FrozenError('A snapshot cannot be changed outside of a run.')
+
+        if (copy := copies.get(id(self))) is None:
+            copy = copies[id(self)] = self.copy()
+
+        return copy
+
+# The values of a frozen state.
+class FrozenDict(Frozen):
+    def __init__(self) -> None:
+        self.data = {}
+
+    def copy(self) -> dict:
+        return dict(self.data)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.view()
+
+    def __getitem__(self, name: str) -> tuple:
+        return self.view()[name]
+
+    def __setitem__(self, name: str, val: tuple) -> None:
+        self.writable()[name] = val
+
+    def get(self, name: str, default=None):
+        return self.view().get(name, default)
+
+    def items(self):
+        return self.view().items()
+
+    def values(self):
+        return self.view().values()
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __len__(self) -> int:
+        return len(self.view())
+
+    def __repr__(self) -> str:
+        return repr(self.view())
+
+# The table of a frozen collection.
+class FrozenTable(Frozen, MutableMapping):
+    def __init__(self) -> None:
+        self.data = a.Table()
+
+    def copy(self) -> a.Table:
+        table = a.Table()
+        table.list, table.rest = list(self.data.list), dict(self.data.rest)
+        return table
+
+    def get(self, key: str, default=None):
+        return self.view().get(key, default)
+
+    def __getitem__(self, key: str) -> tuple:
+        return self.view()[key]
+
+    def __setitem__(self, key: str, val: tuple) -> None:
+        self.writable()[key] = val
+
+    def __delitem__(self, key: str) -> None:
+        del self.writable()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.view()
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def items(self):
+        return self.view().items()
+
+    def __len__(self) -> int:
+        return len(self.view())
+
+    def __repr__(self) -> str:
+        return repr(self.view())
+
+# Makes the frozen copy of a global state. Objects are frozen once, so shared and cyclic
+# collections stay shared and cyclic, and their contents are frozen from a work list rather
+# than by recursion.
+class Freezer:
+    def __init__(self) -> None:
+        self.done = {}
+        self.work = []
+
+    # Returns the frozen copy of an atom. Ropes are joined, their pieces may be shared.
+    def atom(self, val: tuple) -> tuple:
+        match type(val):
+            case a._collection:
+                return a._collection(self.frozen(val.value, FrozenTable))
+            case a._closure:
+                return a._closure(self.closure(val.value))
+            case a._rope:
+                return a._string(val.value)
+
+        return val
+
+    # Returns the frozen copy of a state's values or of a table, queueing its contents. A run
+    # from a snapshot may hold frozen objects, they are frozen as the run sees them, so one
+    # and the copy the run made of it are frozen once.
+    def frozen(self, data, kind):
+        if isinstance(data, Frozen):
+            data = data.view()
+
+        if (copy := self.done.get(id(data))) is None:
+            copy = self.done[id(data)] = kind()
+            self.work.append((data, copy))
+
+        return copy
+
+    def state(self, state: s.State | None) -> s.State | None:
+        if state is None:
+            return None
+
+        if (copy := self.done.get(id(state))) is None:
+            copy = self.done[id(state)] = s.State(self.frozen(state.value, FrozenDict), self.state(state.parent), None, None)
+
+        return copy
+
+    def closure(self, func: s.Closure) -> s.Closure:
+        if (copy := self.done.get(id(func))) is None:
+            copy = self.done[id(func)] = s.Closure(func.params, func.body, self.state(func.parent))
+
+        return copy
+
+    # Freezes a global state's values.
+    def freeze(self, values: dict) -> FrozenDict:
+        top = self.frozen(values, FrozenDict)
+        while self.work:
+            data, copy = self.work.pop()
+            if type(copy) is FrozenDict:
+                copy.data = { name: self.atom(val) for name, val in data.items() }
+            else:
+                table = data if type(data) is a.Table else a.Table(data)
+                copy.data.list = [ self.atom(val) for val in table.list ]
+                copy.data.rest = { key: self.atom(val) for key, val in table.rest.items() }
+
+        return top
+
+# The frozen global state left by a prelude, with the prelude's output. 'scopes' is the
+# prelude's closures.Analysis, kept with the prelude so the closures it made and the ones
+# its functions make in later runs keep only the variables they name. 'valid' is whether
+# the prelude validated, later runs call its functions and skip the checks only if it did.
+class Snapshot:
+    def __init__(self, prelude: list, values: dict, output: list, scopes: cl.Analysis | None, valid: bool) -> None:
+        self.prelude = prelude
+        self.values = Freezer().freeze(values)
+        self.output = output
+        self.scopes = scopes
+        self.valid = valid
+
+    # Starts a run, returns its global values and its copies of frozen objects.
+    def start(self) -> tuple:
+        values = self.values.copy()
+        return values, { id(self.values): values }
+
+    # Analyses a program run from the snapshot, 'open' when others may follow it. Names the
+    # prelude assigns count as assigned, its functions may change them.
+    def analyse(self, p: list, open: bool = False) -> cl.Analysis | None:
+        if self.scopes is None or (scopes := cl.analyse(p, open)) is None:
+            return None
+
+        return cl.Analysis({ **self.scopes.captures, **scopes.captures }, scopes.assigned | self.scopes.assigned)
@@ -0,0 +1,756 @@
+import collections, operator
+
+from scopescript import atoms as a
+from scopescript import scope as s
+from scopescript import interpreter as i
+from scopescript import compiler as c
+from scopescript import vm as v
+
+# The transpiler is an ahead-of-time backend. A program's AST is translated to python
+# source once and compiled with compile(), so arithmetic, comparisons, branches and
+# loops run as python bytecode instead of through the interpreter's dispatch tables.
+# Every state is a python list held in a local variable and indexed with the compiler's
+# (depth, slot) addresses. Every function literal becomes a python function made by a
+# factory that receives the states visible where the function is created. Operations
+# check types inline and fall back to helpers that report the interpreter's errors.
+
+# File name of generated code.
+FILENAME = '<scopescript>'
+
+# Compiled program, 'calls' maps lines of the source to the calls made on them.
+Code = collections.namedtuple('Code', ['source', 'program', 'calls'])
+
+# Lines of generated python source.
+class Writer:
+    def __init__(self, depth: int) -> None:
+        self.lines = []
+        self.depth = depth
+    # Appends a line with the calls made on it.
+    def line(self, text: str, calls: list = []) -> None:
+        self.lines.append((self.depth, text, calls))
+
+# Translation state of a program.
+class Emitter:
+    def __init__(self) -> None:
+        self.consts = {}
+        self.frames = {}
+        self.funcs = []
+        self.pending = []
+        self.temps = 0
+    # Adds a value to the globals of the generated code and returns its name.
+    def const(self, val) -> str:
+        name = f'k{len(self.consts)}'
+        self.consts[name] = val
+        return name
+    # Returns a new temporary variable name.
+    def temp(self) -> str:
+        self.temps += 1
+        return f't{self.temps}'
+    # Returns the variable name of a scope's state.
+    def frame(self, scope: c.Scope) -> str:
+        if scope not in self.frames:
+            self.frames[scope] = f's{len(self.frames)}'
+
+        return self.frames[scope]
+    # Returns the calls collected for the next line.
+    def calls(self) -> list:
+        calls, self.pending = self.pending, []
+        return calls
+
+
+# Run time helpers, generated code reports errors through the state 'st'.
+
+# Reports an error with a message built when it is reached.
+def fail(state: s.State, msg):
+    i.error(state, msg())
+
+# Reports an undefined variable.
+def undefined(state: s.State, e: dict):
+    i.error(state, f"Line {e['line']}: Variable '{e['name']}' is not defined.")
+
+# Reports a call to something that cannot be called with its arguments.
+def bad_call(state: s.State, site: tuple, func):
+    e, name = site
+    if func is c.unassigned:
+        i.error(state, f"Line {e['line']}: function {name}(...) is not defined.")
+
+    if a.not_closure(func):
+        i.error(state, f"Line {e['line']}: invalid type for function call: <{a.kind(func)}>.")
+
+    i.error(state, f"Line {e['line']}: invalid argument count for {v.func_name(name, func.value)}(...): Expected {len(func.value.params)}.")
+
+# Bitwise binary operation.
+def bit(state: s.State, e: dict, f, v1: tuple, v2: tuple) -> tuple:
+    if a.not_integers(v1, v2):
+        v.binop_error(state, e, v1, v2)
+
+    return a._integer(f(v1.value, v2.value))
+
+# '~'
+def bit_not(state: s.State, e: dict, x: tuple) -> tuple:
+    if not a.is_integer(x):
+        i.error(state, f"Line {e['line']}: invalid operand type for '~': <{a.kind(x)}>.")
+
+    return a._integer(~x.value)
+
+# Unary plus or minus
+def sign(state: s.State, e: dict, x: tuple, fact: int) -> tuple:
+    if a.not_number(x):
+        i.error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
+
+    return a.int_or_float(x, x.value * fact)
+
+# Prefix increment or decrement, returns the new value.
+def prefix(state: s.State, e: dict, x: tuple, step: int) -> tuple:
+    if a.not_number(x):
+        i.error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
+
+    return a.int_or_float(x, x.value + step)
+
+# Reports a prefix operation on something that cannot be assigned.
+def prefix_error(state: s.State, e: dict, x: tuple):
+    i.error(state, f"Line {e['line']}: invalid prefix syntax for {e['op']}: <{a.kind(x)}>.")
+
+# Converts a subscript to an attribute for assignment or deletion.
+def key(state: s.State, e: dict, r: tuple) -> str:
+    if a.not_subscriptable(r):
+        i.error(state, f"Line {e['line']}: invalid key type for attribute assignment: <{a.kind(r)}>.")
+
+    return str(r.value)
+
+# Assigns a collection attribute.
+def store_item(state: s.State, e: dict, val: tuple, attribute: str, collection: tuple) -> tuple:
+    if a.not_collection(collection):
+        i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
+
+    collection.value[attribute] = val
+    return val
+
+# Assigns the first state that holds a variable, 'own' otherwise.
+def store_name(val: tuple, addrs: tuple, own: tuple) -> tuple:
+    for frame, slot in addrs:
+        if frame[slot] is not c.unassigned:
+            frame[slot] = val
+            return val
+
+    own[0][own[1]] = val
+    return val
+
+# Reads a collection attribute.
+def attribute(state: s.State, e: dict, collection: tuple) -> tuple:
+    if a.not_collection(collection):
+        i.error(state, f"Line {e['line']}: invalid collection type for attribute '{e['attribute']}': <{a.kind(collection)}>.")
+
+    return collection.value.get(e['attribute'], NULL)
+
+# Deletes a collection attribute.
+def delete(state: s.State, e: dict, attribute: str, collection: tuple) -> None:
+    if a.not_collection(collection):
+        i.error(state, f"Line {e['line']}: invalid collection type for attribute deletion '{attribute}': <{a.kind(collection)}>.")
+
+    if attribute not in collection.value:
+        i.error(state, f"Line {e['expr']['line']}: unknown attribute reference: '{attribute}'.")
+
+    del collection.value[attribute]
+
+NULL = a._null(None)
+
+# Names available to generated code.
+helpers = {
+    'U': c.unassigned, 'NULL': NULL, 'ONCE': (None,), 'State': s.State, 'Closure': s.Closure,
+    '_integer': a._integer, '_float': a._float, '_boolean': a._boolean, '_string': a._string,
+    '_collection': a._collection, '_closure': a._closure, 'str_rep': i.str_rep,
+    'fail': fail, 'undefined': undefined, 'bad_call': bad_call, 'numeric': v.numeric,
+    'compare': v.compare, 'bit': bit, 'bit_not': bit_not, 'sign': sign, 'prefix': prefix,
+    'prefix_error': prefix_error, 'key': key, 'store_item': store_item, 'store_name': store_name,
+    'attribute': attribute, 'subscript': v.subscript, 'delete': delete,
+    'assign_error': v.assign_error
+}
+
+
+# Expression translation, expressions translate to python expressions.
+
+# Python reference to an address in a state.
+def ref(em: Emitter, scope: c.Scope, addr: tuple) -> str:
+    depth, slot = addr
+    for _ in range(depth):
+        scope = scope.parent
+
+    return f'{em.frame(scope)}[{slot}]'
+
+# Python expression for a new state of 'size' slots.
+def new_frame(size: int) -> str:
+    return f'[{", ".join(["U"] * size)}]' if size <= 8 else f'[U] * {size}'
+
+# Looks up addresses in order, 'other' is evaluated when none are assigned.
+def lookup(em: Emitter, scope: c.Scope, addrs: list, other: str) -> str:
+    if other == 'U' and len(addrs) == 1:
+        return ref(em, scope, addrs[0])
+
+    t = em.temp()
+    for addr in reversed(addrs):
+        other = f'{t} if ({t} := {ref(em, scope, addr)}) is not U else {other}'
+
+    return f'({other})'
+
+# Python expression that reports an error with a message built when it is reached.
+def failure(em: Emitter, msg) -> str:
+    return f'fail(st, {em.const(msg)})'
+
+# Translates a literal, a failing literal is evaluated at run time.
+def literal(em: Emitter, f, e: dict) -> str:
+    try:
+        return em.const(f(e))
+    except:
+        return f'{em.const(lambda: f(e))}()'
+
+# Translates a variable reference.
+def _variable_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    addrs, bound = scope.resolve(e['name'])
+    if bound and len(addrs) == 1:
+        return ref(em, scope, addrs[0])
+
+    return lookup(em, scope, addrs, f'undefined(st, {em.const(e)})')
+
+# Translates a variable assignment to an expression.
+def store_expr(em: Emitter, e: dict, scope: c.Scope, val: str) -> str:
+    addrs, bound = scope.resolve(e['name'])
+    own = addrs[0] if addrs and addrs[0][0] == 0 else None
+    if len(addrs) == 1 and (bound or own):
+        (depth, slot), t = addrs[0], em.temp()
+        return f'({em.frame(hop(scope, depth))}.__setitem__({slot}, {t} := {val}) or {t})'
+
+    addrs = ', '.join(f'({em.frame(hop(scope, d))}, {slot})' for d, slot in addrs)
+    return f'store_name({val}, ({addrs},), ({em.frame(scope)}, {own[1] if own else None}))'
+
+# Translates a variable assignment to statements.
+def store_lines(em: Emitter, w: Writer, e: dict, scope: c.Scope, val: str) -> None:
+    addrs, bound = scope.resolve(e['name'])
+    own = addrs[0] if addrs and addrs[0][0] == 0 else None
+    if len(addrs) == 1 and (bound or own):
+        w.line(f'{ref(em, scope, addrs[0])} = {val}')
+        return
+
+    for n, addr in enumerate(addrs):
+        w.line(f'{"elif" if n else "if"} {ref(em, scope, addr)} is not U:')
+        w.depth += 1
+        w.line(f'{ref(em, scope, addr)} = {val}')
+        w.depth -= 1
+
+    if own:
+        w.line('else:')
+        w.depth += 1
+        w.line(f'{ref(em, scope, own)} = {val}')
+        w.depth -= 1
+
+# Static scope 'depth' levels above 'scope'.
+def hop(scope: c.Scope, depth: int) -> c.Scope:
+    for _ in range(depth):
+        scope = scope.parent
+
+    return scope
+
+# Translates a collection.
+def _collection_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    items = ', '.join(f'{key!r}: {translate_expression(em, val, scope)}' for key, val in e['value'].items())
+    return f'_collection({{{items}}})'
+
+# Translates a closure. Its body becomes a python function returned by a factory
+# that takes every state from the closure's scope to the global state.
+def _closure_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    params, names = e['params'], {}
+    for param in params:
+        names.setdefault(param, len(names))
+
+    slots, inner = [ names[param] for param in params ], c.Scope(names, scope)
+    inner.bound.update(params)
+    c.bind_names(e['body'], names, inner)
+    chain, outer = [], scope
+    while outer:
+        chain.append(em.frame(outer))
+        outer = outer.parent
+
+    n, frame, args = len(em.funcs), em.frame(inner), [ f'p{k}' for k in range(len(params)) ]
+    w, pending = Writer(1), em.pending
+    em.funcs.append(w)
+    em.pending = []
+    w.line(f'def mk_{n}({", ".join(chain)}):')
+    w.depth += 1
+    w.line(f'def f_{n}({", ".join(args)}):')
+    w.depth += 1
+    if slots == list(range(len(params))):
+        w.line(f'{frame} = [{", ".join(args + ["U"] * (len(names) - len(params)))}]')
+    else:
+        w.line(f'{frame} = {new_frame(len(names))}')
+        for arg, slot in zip(args, slots):
+            w.line(f'{frame}[{slot}] = {arg}')
+
+    # Count the call, a call past the depth limit is reported like python's own limit.
+    w.line('if calls[0] >= max_depth: raise RecursionError')
+    w.line('calls[0] += 1')
+    w.line('try:')
+    w.depth += 1
+    translate_block(em, w, e['body'], inner, i.Flags(True, False), None)
+    w.line('return NULL')
+    w.depth -= 1
+    w.line('finally:')
+    w.line('    calls[0] -= 1')
+    w.depth -= 1
+    w.line(f'return f_{n}')
+    em.pending = pending
+    return f'_closure(Closure({em.const(params)}, mk_{n}({", ".join(chain)}), None))'
+
+# Translates attribute reference.
+def _handle_attribute_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    t = em.temp()
+    collection = translate_expression(em, e['collection'], scope)
+    return f'({t}.value.get({e["attribute"]!r}, NULL) if type({t} := {collection}) is _collection else attribute(st, {em.const(e)}, {t}))'
+
+# Translates subscriptor.
+def _handle_subscriptor_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    collection, expr = translate_expression(em, e['collection'], scope), translate_expression(em, e['expr'], scope)
+    return f'subscript(st, {em.const(e)}, {collection}, {expr})'
+
+# Translates a prefix increment or decrement.
+def translate_prefix(em: Emitter, e: dict, scope: c.Scope, step: int) -> str:
+    target, k, x = e['expr'], em.const(e), em.temp()
+    new = f'prefix(st, {k}, ({x} := {translate_expression(em, target, scope)}), {step})'
+    match target['kind']:
+        case 'identifier' | 'variable':
+            return store_expr(em, target, scope, new)
+        case 'attribute' if target['attribute']:
+            collection = translate_expression(em, target['collection'], scope)
+            return f'store_item(st, {em.const(target)}, {new}, {target["attribute"]!r}, {collection})'
+        case 'subscriptor':
+            t, attr, kt = em.temp(), em.temp(), em.const(target)
+            expr, collection = translate_expression(em, target['expr'], scope), translate_expression(em, target['collection'], scope)
+            return f'(store_item(st, {kt}, {t}, {attr}, {collection}) if ({t} := {new}, {attr} := key(st, {kt}, {expr}))[1] else prefix_error(st, {k}, {x}))'
+
+    return f'({new}, prefix_error(st, {k}, {x}))'
+
+# Translates a unary operation.
+def _determine_unop_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    op = e['op']
+    if op in ('++', '--'):
+        return translate_prefix(em, e, scope, 1 if op == '++' else -1)
+
+    if op not in ('!', '~', '+', '-'):
+        return failure(em, lambda: f"Line {e['line']}: unknown operator {op}.")
+
+    t, x = em.temp(), translate_expression(em, e['expr'], scope)
+    match op:
+        case '!':
+            return f'_boolean(not {x}.value)'
+        case '~':
+            return f'(_integer(~{t}.value) if type({t} := {x}) is _integer else bit_not(st, {em.const(e)}, {t}))'
+        case '+':
+            return f'({t} if type({t} := {x}) is _integer else sign(st, {em.const(e)}, {t}, 1))'
+        case '-':
+            return f'(_integer(-{t}.value) if type({t} := {x}) is _integer else sign(st, {em.const(e)}, {t}, -1))'
+
+# Binary operations, their python operators, the type of integer results and the helper for other types.
+binops = {
+    '+': ('+', '_integer', 'numeric', operator.add, ', True'),
+    '-': ('-', '_integer', 'numeric', operator.sub, ''),
+    '*': ('*', '_integer', 'numeric', operator.mul, ''),
+    '/': ('/', '_float', 'numeric', operator.truediv, ', False, True'),
+    '%': ('%', '_integer', 'numeric', operator.mod, ''),
+    '<<': ('<<', '_integer', 'bit', operator.lshift, ''),
+    '>>': ('>>', '_integer', 'bit', operator.rshift, ''),
+    '&': ('&', '_integer', 'bit', operator.and_, ''),
+    '|': ('|', '_integer', 'bit', operator.or_, ''),
+    '^': ('^', '_integer', 'bit', operator.xor, ''),
+    '<': ('<', '_boolean', 'compare', operator.lt, ''),
+    '>': ('>', '_boolean', 'compare', operator.gt, ''),
+    '<=': ('<=', '_boolean', 'compare', operator.le, ''),
+    '>=': ('>=', '_boolean', 'compare', operator.ge, '')
+}
+
+# Translates a binary operation.
+def _determine_binop_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    op = e['op']
+    if op not in binops and op not in ('&&', '||', '==', '!='):
+        return failure(em, lambda: f"Line {e['line']}: unknown operator {op}.")
+
+    x, y = translate_expression(em, e['e1'], scope), translate_expression(em, e['e2'], scope)
+    match op:
+        case '&&' | '||':
+            t = em.temp()
+            return f'({t} if {"not " if op == "&&" else ""}({t} := {x}).value else {y})'
+        case '==' | '!=':
+            return f'_boolean({x}.value {op} {y}.value)'
+
+    py, result, helper, f, extra = binops[op]
+    t1, t2 = em.temp(), em.temp()
+    return (f'({result}({t1}.value {py} {t2}.value) if type({t1} := {x}) is type({t2} := {y}) is _integer '
+        f'else {helper}(st, {em.const(e)}, {em.const(f)}, {t1}, {t2}{extra}))')
+
+# Translates a call to a built-in function.
+def builtin(em: Emitter, name: str, e: dict, scope: c.Scope) -> str:
+    args = [ translate_expression(em, arg, scope) for arg in e['args'] ]
+    if name == 'print':
+        return '(' + ''.join(f"_extend((str_rep({arg}), ' ')), " for arg in args) + "_append('\\n'), NULL)[-1]"
+
+    count, f = v.built_funcs[name]
+    if len(args) != count:
+        return failure(em, lambda: c.arg_count_message(e, name))
+
+    return f'{em.const(f)}(st, {em.const(e)}, [{", ".join(args)}])'
+
+# Translates a call, named functions override built-in functions.
+def _call_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    f, name, other = e['fun'], None, None
+    if f['kind'] == 'variable':
+        name = f['name']
+        addrs, bound = scope.resolve(name)
+        has_builtin = name == 'print' or name in v.built_funcs
+        if not addrs:
+            if has_builtin:
+                return builtin(em, name, e, scope)
+
+            return failure(em, lambda: f"Line {e['line']}: function {name}(...) is not defined.")
+
+        if bound and len(addrs) == 1:
+            func = ref(em, scope, addrs[0])
+        else:
+            func = lookup(em, scope, addrs, 'U')
+            other = has_builtin and builtin(em, name, e, scope)
+    else:
+        func = translate_expression(em, f, scope)
+
+    t, n = em.temp(), len(e['args'])
+    args = ', '.join(translate_expression(em, arg, scope) for arg in e['args'])
+    site = em.const((e, name))
+    em.pending.append((e, name, t))
+    error = f'bad_call(st, {site}, {t})'
+    if other:
+        error = f'({other} if {t} is U else {error})'
+
+    return f'({t}.value.body({args}) if type({t} := {func}) is _closure and len({t}.value.params) == {n} else {error})'
+
+# Translates ternary.
+def _ternary_(em: Emitter, e: dict, scope: c.Scope) -> str:
+    test = translate_expression(em, e['test'], scope)
+    true_expr, false_expr = translate_expression(em, e['trueExpr'], scope), translate_expression(em, e['falseExpr'], scope)
+    return f'({true_expr} if {test}.value else {false_expr})'
+
+# Expressions
+expressions = {
+    'null': lambda em, e, scope: literal(em, lambda e: a._null(None), e),
+    'boolean': lambda em, e, scope: literal(em, lambda e: a._boolean(e['value']), e),
+    'string': lambda em, e, scope: literal(em, lambda e: a._string(e['value']), e),
+    'integer': lambda em, e, scope: literal(em, lambda e: a._integer(int(e['value'])), e),
+    'float': lambda em, e, scope: literal(em, lambda e: a._float(float(e['value'])), e),
+    'variable': _variable_,
+    'collection': _collection_,
+    'closure': _closure_,
+    'subscriptor': _handle_subscriptor_,
+    'attribute': _handle_attribute_,
+    'unop': _determine_unop_,
+    'binop': _determine_binop_,
+    'call': _call_,
+    'ternary': _ternary_,
+}
+
+# Translates a given expression
+def translate_expression(em: Emitter, e: dict, scope: c.Scope) -> str:
+    kind = e['kind']
+    if kind not in expressions:
+        return failure(em, lambda: f"Line {e['line']}: unknown expression: <{kind}>.")
+
+    return expressions[kind](em, e, scope)
+
+# Translates a test to a python truth value, comparisons skip creating a boolean.
+def translate_test(em: Emitter, e: dict, scope: c.Scope) -> str:
+    if e['kind'] == 'binop' and e['op'] in ('<', '>', '<=', '>=', '==', '!='):
+        op, x, y = e['op'], translate_expression(em, e['e1'], scope), translate_expression(em, e['e2'], scope)
+        if op in ('==', '!='):
+            return f'{x}.value {op} {y}.value'
+
+        py, _, helper, f, _ = binops[op]
+        t1, t2 = em.temp(), em.temp()
+        return (f'({t1}.value {py} {t2}.value if type({t1} := {x}) is type({t2} := {y}) is _integer '
+            f'else {helper}(st, {em.const(e)}, {em.const(f)}, {t1}, {t2}).value)')
+
+    if e['kind'] == 'unop' and e['op'] == '!':
+        return f'not {translate_expression(em, e["expr"], scope)}.value'
+
+    return f'{translate_expression(em, e, scope)}.value'
+
+# Expressions whose value may be None, the value of a call that ended with break.
+def maybe_none(e: dict) -> bool:
+    match e['kind']:
+        case 'null' | 'boolean' | 'string' | 'integer' | 'float' | 'collection' | 'closure' | 'unop':
+            return False
+        case 'binop':
+            return e['op'] in ('&&', '||')
+
+    return True
+
+
+# Statement translation, statements translate to lines of 'w'. 'loop' is the
+# kind of the innermost loop, a continue in a for loop leaves a one pass loop
+# around the body so the updates still run.
+
+# Translates static statement
+def _static_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    x = e['expr']
+    if x['kind'] == 'unop' and x['op'] in ('++', '--') and x['expr']['kind'] in ('identifier', 'variable'):
+        addrs, bound = scope.resolve(x['expr']['name'])
+        if len(addrs) == 1 and (bound or addrs[0][0] == 0):
+            # Increments a variable in place.
+            t, target, step = em.temp(), ref(em, scope, addrs[0]), 1 if x['op'] == '++' else -1
+            w.line(f'{t} = {translate_expression(em, x["expr"], scope)}', em.calls())
+            w.line(f'{target} = _integer({t}.value {"+" if step > 0 else "-"} 1) if type({t}) is _integer else prefix(st, {em.const(x)}, {t}, {step})')
+            return
+
+    w.line(translate_expression(em, x, scope), em.calls())
+
+# Translates assignment statement
+def _assignment_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    targets, t = e['assignArr'], em.temp()
+    w.line(f'{t} = {translate_expression(em, e["expr"], scope)}', em.calls())
+    for n, target in enumerate(targets):
+        kt = em.const(target)
+        match target['kind']:
+            case 'identifier' | 'variable':
+                store_lines(em, w, target, scope, t)
+            case 'attribute' if target['attribute']:
+                collection = translate_expression(em, target['collection'], scope)
+                w.line(f'store_item(st, {kt}, {t}, {target["attribute"]!r}, {collection})', em.calls())
+            case 'subscriptor':
+                attr = em.temp()
+                w.line(f'{attr} = key(st, {kt}, {translate_expression(em, target["expr"], scope)})', em.calls())
+                w.line(f'if not {attr}: assign_error(st, {kt})')
+                collection = translate_expression(em, target['collection'], scope)
+                w.line(f'store_item(st, {kt}, {t}, {attr}, {collection})', em.calls())
+            case _:
+                w.line(f'assign_error(st, {kt})')
+
+        if n == 0 and maybe_none(e['expr']):
+            w.line(f'if {t} is None: assign_error(st, {kt})')
+
+    scope.assign(c.assigned_names(e))
+
+# Translates if statement, the chosen part runs in a new state.
+def _if_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    names = {}
+    for p in e['truePartArr']:
+        c.bind_names(p['part'], names, scope)
+
+    inner = c.Scope(c.bind_names(e['falsePart'], names, scope), scope)
+    frame, parts = em.frame(inner), e['truePartArr']
+    for n, p in enumerate(parts):
+        w.line(f'{"elif" if n else "if"} {translate_test(em, p["test"], scope)}:', em.calls())
+        w.depth += 1
+        inner.bound = set()
+        w.line(f'{frame} = {new_frame(len(names))}')
+        translate_block(em, w, p['part'], inner, flags, loop)
+        w.depth -= 1
+
+    if parts:
+        w.line('else:')
+        w.depth += 1
+
+    inner.bound = set()
+    w.line(f'{frame} = {new_frame(len(names))}')
+    translate_block(em, w, e['falsePart'], inner, flags, loop)
+    if parts:
+        w.depth -= 1
+
+# Translates while statement, the test runs in the enclosing state and the body
+# runs in one state for every iteration.
+def _while_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    inner = c.Scope(c.bind_names(e['body'], {}, scope), scope)
+    w.line(f'{em.frame(inner)} = {new_frame(len(inner.names))}')
+    w.line(f'while {translate_test(em, e["test"], scope)}:', em.calls())
+    w.depth += 1
+    translate_body(em, w, e['body'], inner, i.Flags(flags.in_func, True), 'while')
+    w.depth -= 1
+
+# Translates for statement, initializers and updates are translated without flags.
+def _for_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    names = c.bind_names(e['body'], c.bind_names(e['updates'], c.bind_names(e['inits'], {}, scope), scope), scope)
+    inner = c.Scope(names, scope)
+    w.line(f'{em.frame(inner)} = {new_frame(len(names))}')
+    for x in e['inits']:
+        translate_statement(em, w, x, inner, i.Flags(False, False), None)
+
+    w.line(f'while {translate_test(em, e["test"], inner)}:', em.calls())
+    w.depth += 1
+    # Updates are translated first, they never rely on assignments in the body.
+    updates = Writer(w.depth)
+    for x in e['updates']:
+        translate_statement(em, updates, x, inner, i.Flags(False, False), None)
+
+    once = continues(e['body'])
+    if once:
+        w.line('for _ in ONCE:')
+        w.depth += 1
+
+    translate_body(em, w, e['body'], inner, i.Flags(flags.in_func, True), 'for')
+    if once:
+        w.depth -= 1
+
+    w.lines.extend(updates.lines)
+    w.depth -= 1
+
+# Whether a block continues its own loop.
+def continues(b: list) -> bool:
+    for x in b:
+        match x['kind']:
+            case 'continue':
+                return True
+            case 'if' if any(continues(p['part']) for p in x['truePartArr']) or continues(x['falsePart']):
+                return True
+
+    return False
+
+# Translates delete statement
+def _delete_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    expr = e['expr']
+    cannot = failure(em, lambda: f"Line {e['line']}: cannot delete <{expr['kind']}>.")
+    match expr['kind']:
+        case 'attribute' if expr['attribute']:
+            attr = repr(expr['attribute'])
+        case 'subscriptor':
+            attr = em.temp()
+            w.line(f'{attr} = key(st, {em.const(expr)}, {translate_expression(em, expr["expr"], scope)})', em.calls())
+            w.line(f'if not {attr}: {cannot}')
+        case _:
+            w.line(cannot)
+            return
+
+    w.line(f'delete(st, {em.const(e)}, {attr}, {translate_expression(em, expr["collection"], scope)})', em.calls())
+
+# Translates return statement
+def _return_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    if not flags.in_func:
+        w.line(failure(em, lambda: f"Line {e['line']}: return outside of function."))
+        return
+
+    w.line(f'return {translate_expression(em, e["expr"], scope)}', em.calls())
+
+# Translates break statement. A break ends every enclosing loop of its function, the
+# call then produces no value. A break outside of functions ends the program.
+def _break_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    if not flags.in_loop:
+        w.line(failure(em, lambda: f"Line {e['line']}: break outside of loop."))
+        return
+
+    w.line('return None' if flags.in_func else 'return')
+
+# Translates continue statement
+def _continue_(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    if not flags.in_loop:
+        w.line(failure(em, lambda: f"Line {e['line']}: continue outside of loop."))
+        return
+
+    w.line('break' if loop == 'for' else 'continue')
+
+# Statements
+statements = {
+    'static': _static_,
+    'assignment': _assignment_,
+    'if': _if_,
+    'while': _while_,
+    'for': _for_,
+    'delete': _delete_,
+    'return': _return_,
+    'break': _break_,
+    'continue': _continue_
+}
+
+# Translates a given statement
+def translate_statement(em: Emitter, w: Writer, e: dict, scope: c.Scope, flags: tuple, loop: str) -> None:
+    kind = e['kind']
+    if kind not in statements:
+        w.line(failure(em, lambda: f"Unknown statement: <{kind}>."))
+    else:
+        statements[kind](em, w, e, scope, flags, loop)
+
+# Translates the block of a compound statement, python requires at least one line.
+def translate_body(em: Emitter, w: Writer, b: list, scope: c.Scope, flags: tuple, loop: str) -> None:
+    start = len(w.lines)
+    translate_block(em, w, b, scope, flags, loop)
+    if len(w.lines) == start:
+        w.line('pass')
+
+# Translates a block of code
+def translate_block(em: Emitter, w: Writer, b: list, scope: c.Scope, flags: tuple, loop: str) -> None:
+    for x in b:
+        translate_statement(em, w, x, scope, flags, loop)
+
+
+# Translates a program's AST to python source, returns the source, its globals and its calls.
+def transpile(p: list) -> tuple:
+    em, scope = Emitter(), c.Scope(c.bind_names(p, {}), None)
+    body = Writer(1)
+    body.line(f'{em.frame(scope)} = {new_frame(len(scope.names))}')
+    translate_block(em, body, p, scope, i.Flags(False, False), None)
+    lines = [ (0, 'def program(out, max_depth):', []), (1, 'st, calls = State(None, None, out), [0]', []), (1, '_extend, _append = out.extend, out.append', []) ]
+    for w in em.funcs:
+        lines.extend(w.lines)
+
+    lines.extend(body.lines)
+    source = '\n'.join('    ' * depth + text for depth, text, _ in lines) + '\n'
+    return source, em.consts, { n + 1: calls for n, (_, _, calls) in enumerate(lines) if calls }
+
+# Translates and compiles a program's AST, the result can be executed any number of times
+# with run_program. Programs nested deeper than python's parser allows use the compiler,
+# as do those too deep to translate, which have no source.
+def compile_program(p: list) -> Code:
+    try:
+        with i.recursion_limit(c.RECURSION_LIMIT):
+            source, consts, calls = transpile(p)
+    except RecursionError:
+        return Code(None, c.compile_program(p), {})
+    try:
+        code = compile(source, FILENAME, 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        return Code(source, c.compile_program(p), {})
+
+    namespace = dict(helpers, **consts)
+    exec(code, namespace)
+    return Code(source, namespace['program'], calls)
+
+# Message for python's recursion limit, reported for the innermost call.
+def recursion_message(code: Code, err: RecursionError) -> str | None:
+    tb, msg = err.__traceback__, None
+    while tb:
+        frame = tb.tb_frame
+        if frame.f_code.co_filename == FILENAME:
+            for e, name, t in code.calls.get(tb.tb_lineno, []):
+                if a.kind(func := frame.f_locals.get(t)) == 'closure':
+                    msg = f"Line {e['line']}: maximum recursion depth exceeded for {v.func_name(name, func.value)}(...)."
+                    break
+
+        tb = tb.tb_next
+
+    return msg
+
+# Executes a compiled program and produces its output. Like the interpreter, it stops a
+# program making more than 'max_depth' nested calls.
+def run_program(code: Code, max_depth: int = i.MAX_DEPTH) -> dict:
+    out = []
+    try:
+        with i.recursion_limit(max(c.RECURSION_LIMIT, c.RECURSION_LIMIT * max_depth // i.MAX_DEPTH)):
+            code.program(out, max_depth)
+
+        return dict(kind='ok', output=out)
+    except i.ScopeScriptError as err:
+        return dict(kind='error', output=[str(err)])
+    except RecursionError as err:
+        msg = recursion_message(code, err)
+        return dict(kind='error', output=[msg] if msg else [])
+    except:
+        return dict(kind='error', output=[])
+
+# Translates and executes a program's AST.
+def interp_program(p: list) -> dict:
+    try:
+        code = compile_program(p)
+    except:
+        return dict(kind='error', output=[])
+
+    return run_program(code)
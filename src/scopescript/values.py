@@ -0,0 +1,141 @@
+from scopescript import atoms as a
+from scopescript import scope as s
+
+# Native value representation. Integers, floats, strings and booleans are python's own
+# int, float, str and bool, null is None, collections are dicts and closures are Closure
+# objects. Types are checked by identity, so booleans are never mistaken for integers.
+# Atoms are only created when a value leaves the runtime.
+
+# Integer holding a boolean, the result of '&', '|' or '^' between booleans.
+class IntBool(int):
+    def __str__(self) -> str:
+        return str(bool(self))
+
+    __repr__ = __str__
+
+# Returns an arithmetic method of IntFloat. Results stay integers unless the other operand
+# is a float, as the interpreter keeps the type of integer operands.
+def int_float(f):
+    def method(self, other):
+        res = f(self, other)
+        return res if res is NotImplemented or type(other) is float else IntFloat(res)
+
+    return method
+
+# Integer holding a float, the result of pow(...) between integers with a negative exponent.
+class IntFloat(float):
+    __add__, __radd__ = int_float(float.__add__), int_float(float.__radd__)
+    __sub__, __rsub__ = int_float(float.__sub__), int_float(float.__rsub__)
+    __mul__, __rmul__ = int_float(float.__mul__), int_float(float.__rmul__)
+    __mod__, __rmod__ = int_float(float.__mod__), int_float(float.__rmod__)
+
+    def __abs__(self):
+        return IntFloat(float.__abs__(self))
+
+# Value of a call that ended with a break, every use of it fails.
+class Broken:
+    def fail(self, *args):
+        raise AttributeError("'NoneType' object has no attribute 'value'")
+
+    __bool__ = __str__ = __repr__ = __eq__ = __ne__ = fail
+    __hash__ = object.__hash__
+
+broken = Broken()
+
+# Type names
+kinds = {
+    bool: 'boolean',
+    int: 'integer',
+    IntBool: 'integer',
+    IntFloat: 'integer',
+    float: 'float',
+    str: 'string',
+    type(None): 'null',
+    dict: 'collection',
+    s.Closure: 'closure',
+    Broken: 'NoneType'
+}
+
+numbers = frozenset([int, float, bool, IntBool, IntFloat])
+
+integers = frozenset([int, bool, IntBool, IntFloat])
+
+booleans = frozenset([bool, IntBool])
+
+# Returns type name
+def kind(val) -> str:
+    return kinds[type(val)]
+
+# Number test
+def not_number(val) -> bool:
+    return type(val) not in numbers
+
+def not_numbers(v1, v2) -> bool:
+    return type(v1) not in numbers or type(v2) not in numbers
+
+# Integer test
+def is_integer(val) -> bool:
+    return type(val) in integers
+
+def not_integers(v1, v2) -> bool:
+    return type(v1) not in integers or type(v2) not in integers
+
+# String test
+def are_strings(v1, v2) -> bool:
+    return type(v1) is str and type(v2) is str
+
+# Subscriptable test
+def not_subscriptable(val) -> bool:
+    return type(val) is dict or type(val) is s.Closure
+
+# Iterable test
+def not_iterable(val) -> bool:
+    return type(val) is not str and type(val) is not dict
+
+def format_collection(collection: dict) -> dict:
+    return { k: format_collection(v) if type(v) is dict else v for k, v in collection.items() }
+
+# Returns string representation of the argument
+def str_rep(val) -> str:
+    if type(val) is dict:
+        return str(format_collection(val))
+
+    return str(val)
+
+# Converts a native value to an atom.
+def to_atom(val) -> tuple:
+    match val:
+        case Broken():
+            return None
+        case IntBool():
+            return a._integer(bool(val))
+        case IntFloat():
+            return a._integer(float(val))
+        case bool():
+            return a._boolean(val)
+        case int():
+            return a._integer(val)
+        case float():
+            return a._float(val)
+        case str():
+            return a._string(val)
+        case None:
+            return a._null(None)
+        case dict():
+            return a._collection({ k: to_atom(v) for k, v in val.items() })
+
+    return a._closure(val)
+
+# Converts an atom to a native value.
+def from_atom(atom: tuple):
+    match a.kind(atom):
+        case 'NoneType':
+            return broken
+        case 'integer' if type(atom.value) is bool:
+            return IntBool(atom.value)
+        case 'integer' if type(atom.value) is float:
+            return IntFloat(atom.value)
+        case 'collection':
+            return { k: from_atom(v) for k, v in atom.value.items() }
+
+    return atom.value
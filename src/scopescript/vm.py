@@ -0,0 +1,1017 @@
+import array, collections
+
+from scopescript import atoms as a
+from scopescript import scope as s
+from scopescript import interpreter as i
+from scopescript import compiler as c
+
+# The virtual machine is a second execution engine. A program's AST is lowered to a
+# compact instruction stream, an array of integer opcodes and operands with a pool of
+# constants, and executed by a single dispatch loop with an explicit operand stack.
+# Function calls push a record on the machine's own call stack instead of recursing.
+# Variables use the compiler's (depth, slot) addressing and fixed-size list states.
+
+# Opcodes, each followed by its integer operands.
+(CONST, LOAD_FAST, LOAD_DEEP, LOAD_NAME, STORE_FAST, STORE_DEEP, STORE_NAME, POP, NIP,
+ ADD, SUB, MUL, LT, NUMERIC, BIT, CMP, EQ, NE, NOT, BIT_NOT, SIGN,
+ JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+ COLLECTION, CLOSURE, ATTR, SUBSCR, KEY, JUMP_IF_EMPTY, STORE_ATTR, STORE_SUBSCR, DELETE,
+ PREFIX, PREFIX_FAIL, ASSIGN_FAIL, FAIL, THUNK,
+ ENTER, NEW_FRAME, ENTER_TOP, LEAVE,
+ LOAD_CALLEE, CHECK_CALL, CALL, RETURN, BREAK_RETURN, HALT,
+ PRINT_ARG, PRINT_END, BUILTIN) = range(52)
+
+# Maximum number of active function calls, the same as every other backend's.
+MAX_DEPTH = i.MAX_DEPTH
+
+# Compiled code of a program or function body. Distinct parameters fill the leading
+# slots of a call state followed by 'pad', 'slots' maps repeated parameters otherwise.
+Code = collections.namedtuple('Code', ['ops', 'consts', 'size', 'params', 'slots', 'pad'])
+
+# Builds one instruction stream.
+class Assembler:
+    def __init__(self) -> None:
+        self.ops = []
+        self.consts = []
+    # Appends an instruction.
+    def emit(self, *ins) -> None:
+        self.ops.extend(ins)
+    # Adds a constant to the pool and returns its index.
+    def const(self, val) -> int:
+        self.consts.append(val)
+        return len(self.consts) - 1
+    # Appends a jump instruction and returns the position of its target operand.
+    def jump(self, op: int, *args) -> int:
+        self.emit(op, *args, -1)
+        return len(self.ops) - 1
+    # Points a jump target at the current position.
+    def land(self, at: int) -> None:
+        self.ops[at] = len(self.ops)
+
+    def code(self, size: int, params: list = [], slots=None, pad: list = []) -> Code:
+        return Code(array.array('i', self.ops), self.consts, size, params, slots, pad)
+
+
+# Loop context for continue statements, the loop's state and its continue target.
+Loop = collections.namedtuple('Loop', ['scope', 'targets'])
+
+# Number of parent links between two static scopes.
+def hops(scope: c.Scope, outer: c.Scope) -> int:
+    n = 0
+    while scope is not outer:
+        scope, n = scope.parent, n + 1
+
+    return n
+
+
+# Expression lowering
+
+# Lowers a literal, a failing literal is evaluated at run time.
+def literal(asm: Assembler, f, e: dict) -> None:
+    try:
+        asm.emit(CONST, asm.const(f(e)))
+    except:
+        asm.emit(THUNK, asm.const(lambda: f(e)))
+
+# Lowers a runtime error.
+def fail(asm: Assembler, msg) -> None:
+    asm.emit(FAIL, asm.const(msg))
+
+# Lowers a variable load.
+def load(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    addrs, bound = scope.resolve(e['name'])
+    if bound and len(addrs) == 1:
+        depth, slot = addrs[0]
+        if depth == 0:
+            asm.emit(LOAD_FAST, slot)
+        else:
+            asm.emit(LOAD_DEEP, depth, slot)
+    else:
+        asm.emit(LOAD_NAME, asm.const((addrs, e)))
+
+# Lowers a variable store, the value stays on the stack.
+def store(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    addrs, bound = scope.resolve(e['name'])
+    own = addrs[0][1] if addrs and addrs[0][0] == 0 else None
+    k = asm.const(e)
+    if len(addrs) == 1 and (bound or own is not None):
+        depth, slot = addrs[0]
+        if depth == 0:
+            asm.emit(STORE_FAST, slot, k)
+        else:
+            asm.emit(STORE_DEEP, depth, slot, k)
+    else:
+        asm.emit(STORE_NAME, asm.const((addrs, own)), k)
+
+# Lowers a store of the value on top of the stack into an assignment target.
+# Returns the jump to patch for targets that cannot be assigned, None otherwise.
+def assign(asm: Assembler, e: dict, scope: c.Scope) -> int | None:
+    match e['kind']:
+        case 'identifier' | 'variable':
+            store(asm, e, scope)
+            return None
+        case 'attribute' if e['attribute']:
+            lower_expression(asm, e['collection'], scope)
+            asm.emit(STORE_ATTR, asm.const((e, e['attribute'])))
+            return None
+        case 'subscriptor':
+            lower_expression(asm, e['expr'], scope)
+            asm.emit(KEY, asm.const(e))
+            empty = asm.jump(JUMP_IF_EMPTY)
+            lower_expression(asm, e['collection'], scope)
+            asm.emit(STORE_SUBSCR, asm.const(e))
+            return empty
+
+    return asm.jump(JUMP)
+
+# Lowers a collection.
+def _collection_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    items = e['value']
+    for val in items.values():
+        lower_expression(asm, val, scope)
+
+    asm.emit(COLLECTION, asm.const(tuple(items)), len(items))
+
+# Lowers a closure, its body is lowered to its own code.
+def _closure_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    params, names = e['params'], {}
+    for param in params:
+        names.setdefault(param, len(names))
+
+    slots, inner = [ names[param] for param in params ], c.Scope(names, scope)
+    inner.bound.update(params)
+    c.bind_names(e['body'], names, inner)
+    body = Assembler()
+    lower_block(body, e['body'], inner, i.Flags(True, False), None)
+    body.emit(CONST, body.const(a._null(None)), RETURN)
+    if slots == list(range(len(params))):
+        code = body.code(len(names), params, None, [c.unassigned] * (len(names) - len(params)))
+    else:
+        code = body.code(len(names), params, slots)
+
+    asm.emit(CLOSURE, asm.const(code))
+
+# Lowers attribute reference.
+def _handle_attribute_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    lower_expression(asm, e['collection'], scope)
+    asm.emit(ATTR, asm.const((e, e['attribute'])))
+
+# Lowers subscriptor.
+def _handle_subscriptor_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    lower_expression(asm, e['collection'], scope)
+    lower_expression(asm, e['expr'], scope)
+    asm.emit(SUBSCR, asm.const(e))
+
+# Lowers a unary operation.
+def _determine_unop_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    op = e['op']
+    match op:
+        case '!':
+            lower_expression(asm, e['expr'], scope)
+            asm.emit(NOT)
+        case '~':
+            lower_expression(asm, e['expr'], scope)
+            asm.emit(BIT_NOT, asm.const(e))
+        case '+' | '-':
+            lower_expression(asm, e['expr'], scope)
+            asm.emit(SIGN, asm.const((e, 1 if op == '+' else -1)))
+        case '++' | '--':
+            # Leaves the old and new values, the old value reports invalid targets.
+            lower_expression(asm, e['expr'], scope)
+            asm.emit(PREFIX, asm.const((e, 1 if op == '++' else -1)))
+            invalid = assign(asm, e['expr'], scope)
+            asm.emit(NIP)
+            if invalid is not None:
+                done = asm.jump(JUMP)
+                asm.land(invalid)
+                asm.emit(PREFIX_FAIL, asm.const(e))
+                asm.land(done)
+        case _:
+            fail(asm, lambda: f"Line {e['line']}: unknown operator {op}.")
+
+# Binary operations lowered to instructions with their own fast paths.
+fast_binops = { '+': ADD, '-': SUB, '*': MUL, '<': LT }
+
+# Binary operations lowered to generic instructions and their operator functions.
+binops = {
+    '/': (NUMERIC, lambda x, y: x / y, False, True),
+    '%': (NUMERIC, lambda x, y: x % y, False, False),
+    '<<': (BIT, lambda x, y: x << y),
+    '>>': (BIT, lambda x, y: x >> y),
+    '&': (BIT, lambda x, y: x & y),
+    '|': (BIT, lambda x, y: x | y),
+    '^': (BIT, lambda x, y: x ^ y),
+    '>': (CMP, lambda x, y: x > y),
+    '<=': (CMP, lambda x, y: x <= y),
+    '>=': (CMP, lambda x, y: x >= y)
+}
+
+# Lowers a binary operation.
+def _determine_binop_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    op = e['op']
+    if op in ('&&', '||'):
+        lower_expression(asm, e['e1'], scope)
+        end = asm.jump(JUMP_IF_FALSE_OR_POP if op == '&&' else JUMP_IF_TRUE_OR_POP)
+        lower_expression(asm, e['e2'], scope)
+        asm.land(end)
+        return
+
+    if op not in fast_binops and op not in binops and op not in ('==', '!='):
+        fail(asm, lambda: f"Line {e['line']}: unknown operator {op}.")
+        return
+
+    lower_expression(asm, e['e1'], scope)
+    lower_expression(asm, e['e2'], scope)
+    if op in fast_binops:
+        asm.emit(fast_binops[op], asm.const(e))
+    elif op in binops:
+        ins, *rest = binops[op]
+        asm.emit(ins, asm.const((e, *rest)))
+    else:
+        asm.emit(EQ if op == '==' else NE)
+
+# Lowers a call to a built-in function.
+def builtin(asm: Assembler, name: str, e: dict, scope: c.Scope) -> None:
+    args = e['args']
+    if name == 'print':
+        for arg in args:
+            lower_expression(asm, arg, scope)
+            asm.emit(PRINT_ARG)
+
+        asm.emit(PRINT_END)
+        return
+
+    count, f = built_funcs[name]
+    if len(args) != count:
+        fail(asm, lambda: c.arg_count_message(e, name))
+        return
+
+    for arg in args:
+        lower_expression(asm, arg, scope)
+
+    asm.emit(BUILTIN, asm.const((f, e)), count)
+
+# Lowers a call, named functions override built-in functions.
+def _call_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    f, args, name = e['fun'], e['args'], None
+    has_builtin = False
+    if f['kind'] == 'variable':
+        name = f['name']
+        has_builtin = name == 'print' or name in built_funcs
+        addrs, bound = scope.resolve(name)
+        if not addrs:
+            if has_builtin:
+                builtin(asm, name, e, scope)
+            else:
+                fail(asm, lambda: f"Line {e['line']}: function {name}(...) is not defined.")
+            return
+
+        if bound and len(addrs) == 1:
+            load(asm, f, scope)
+            has_builtin = False
+        else:
+            other = asm.jump(LOAD_CALLEE, asm.const((addrs, e, name)))
+    else:
+        lower_expression(asm, f, scope)
+
+    k = asm.const((e, name, len(args)))
+    asm.emit(CHECK_CALL, k)
+    for arg in args:
+        lower_expression(asm, arg, scope)
+
+    asm.emit(CALL, len(args), k)
+    if name and not (bound and len(addrs) == 1):
+        done = asm.jump(JUMP)
+        asm.land(other)
+        if has_builtin:
+            builtin(asm, name, e, scope)
+        else:
+            fail(asm, lambda: f"Line {e['line']}: function {name}(...) is not defined.")
+        asm.land(done)
+
+# Lowers ternary.
+def _ternary_(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    lower_expression(asm, e['test'], scope)
+    false_part = asm.jump(POP_JUMP_IF_FALSE)
+    lower_expression(asm, e['trueExpr'], scope)
+    done = asm.jump(JUMP)
+    asm.land(false_part)
+    lower_expression(asm, e['falseExpr'], scope)
+    asm.land(done)
+
+# Expressions
+expressions = {
+    'null': lambda asm, e, scope: literal(asm, lambda e: a._null(None), e),
+    'boolean': lambda asm, e, scope: literal(asm, lambda e: a._boolean(e['value']), e),
+    'string': lambda asm, e, scope: literal(asm, lambda e: a._string(e['value']), e),
+    'integer': lambda asm, e, scope: literal(asm, lambda e: a._integer(int(e['value'])), e),
+    'float': lambda asm, e, scope: literal(asm, lambda e: a._float(float(e['value'])), e),
+    'variable': load,
+    'collection': _collection_,
+    'closure': _closure_,
+    'subscriptor': _handle_subscriptor_,
+    'attribute': _handle_attribute_,
+    'unop': _determine_unop_,
+    'binop': _determine_binop_,
+    'call': _call_,
+    'ternary': _ternary_,
+}
+
+# Lowers a given expression, its value is left on the stack.
+def lower_expression(asm: Assembler, e: dict, scope: c.Scope) -> None:
+    kind = e['kind']
+    if kind not in expressions:
+        fail(asm, lambda: f"Line {e['line']}: unknown expression: <{kind}>.")
+    else:
+        expressions[kind](asm, e, scope)
+
+
+# Statement lowering, statements leave the stack as they found it.
+
+# Lowers static statement
+def _static_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    lower_expression(asm, e['expr'], scope)
+    asm.emit(POP)
+
+# Lowers assignment statement
+def _assignment_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    lower_expression(asm, e['expr'], scope)
+    invalid = [ (t, assign(asm, t, scope)) for t in e['assignArr'] ]
+    scope.assign(c.assigned_names(e))
+    asm.emit(POP)
+    invalid = [ (t, at) for t, at in invalid if at is not None ]
+    if invalid:
+        done = asm.jump(JUMP)
+        for t, at in invalid:
+            asm.land(at)
+            asm.emit(ASSIGN_FAIL, asm.const(t))
+
+        asm.land(done)
+
+# Lowers if statement, the chosen part runs in a new state.
+def _if_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    names = {}
+    for p in e['truePartArr']:
+        c.bind_names(p['part'], names, scope)
+
+    inner = c.Scope(c.bind_names(e['falsePart'], names, scope), scope)
+    done = []
+    for p in e['truePartArr']:
+        lower_expression(asm, p['test'], scope)
+        next_part = asm.jump(POP_JUMP_IF_FALSE)
+        inner.bound = set()
+        asm.emit(ENTER, len(names))
+        lower_block(asm, p['part'], inner, flags, loop)
+        asm.emit(LEAVE, 1)
+        done.append(asm.jump(JUMP))
+        asm.land(next_part)
+
+    inner.bound = set()
+    asm.emit(ENTER, len(names))
+    lower_block(asm, e['falsePart'], inner, flags, loop)
+    asm.emit(LEAVE, 1)
+    for at in done:
+        asm.land(at)
+
+# Lowers while statement, the test runs in the enclosing state and the body
+# runs in one state kept on the stack for every iteration.
+def _while_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    inner = c.Scope(c.bind_names(e['body'], {}, scope), scope)
+    asm.emit(NEW_FRAME, len(inner.names))
+    test = len(asm.ops)
+    lower_expression(asm, e['test'], scope)
+    end = asm.jump(POP_JUMP_IF_FALSE)
+    asm.emit(ENTER_TOP)
+    body = Loop(inner, [])
+    lower_block(asm, e['body'], inner, i.Flags(flags.in_func, True), body)
+    for at in body.targets:
+        asm.land(at)
+
+    asm.emit(LEAVE, 1, JUMP, test)
+    asm.land(end)
+    asm.emit(POP)
+
+# Lowers for statement, initializers and updates are lowered without flags.
+def _for_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    names = c.bind_names(e['body'], c.bind_names(e['updates'], c.bind_names(e['inits'], {}, scope), scope), scope)
+    inner = c.Scope(names, scope)
+    asm.emit(ENTER, len(names))
+    for x in e['inits']:
+        lower_statement(asm, x, inner, i.Flags(False, False), None)
+
+    test = len(asm.ops)
+    lower_expression(asm, e['test'], inner)
+    end = asm.jump(POP_JUMP_IF_FALSE)
+    # Updates also run after a body that continued early.
+    updates = Assembler()
+    updates.consts = asm.consts
+    for x in e['updates']:
+        lower_statement(updates, x, inner, i.Flags(False, False), None)
+
+    body = Loop(inner, [])
+    lower_block(asm, e['body'], inner, i.Flags(flags.in_func, True), body)
+    for at in body.targets:
+        asm.land(at)
+
+    start = len(asm.ops)
+    asm.emit(*[ op + start if is_target else op for op, is_target in relocate(updates.ops) ])
+    asm.emit(JUMP, test)
+    asm.land(end)
+    asm.emit(LEAVE, 1)
+
+# Operand positions of jump targets in an instruction stream.
+jump_operands = {
+    JUMP: 0, POP_JUMP_IF_FALSE: 0, JUMP_IF_FALSE_OR_POP: 0, JUMP_IF_TRUE_OR_POP: 0,
+    JUMP_IF_EMPTY: 0, LOAD_CALLEE: 1
+}
+
+# Number of operands of each instruction.
+operand_counts = {
+    CONST: 1, LOAD_FAST: 1, LOAD_DEEP: 2, LOAD_NAME: 1, STORE_FAST: 2, STORE_DEEP: 3, STORE_NAME: 2,
+    POP: 0, NIP: 0, ADD: 1, SUB: 1, MUL: 1, LT: 1, NUMERIC: 1, BIT: 1, CMP: 1, EQ: 0, NE: 0,
+    NOT: 0, BIT_NOT: 1, SIGN: 1, JUMP: 1, POP_JUMP_IF_FALSE: 1, JUMP_IF_FALSE_OR_POP: 1,
+    JUMP_IF_TRUE_OR_POP: 1, COLLECTION: 2, CLOSURE: 1, ATTR: 1, SUBSCR: 1, KEY: 1,
+    JUMP_IF_EMPTY: 1, STORE_ATTR: 1, STORE_SUBSCR: 1, DELETE: 1, PREFIX: 1, PREFIX_FAIL: 1,
+    ASSIGN_FAIL: 1, FAIL: 1, THUNK: 1, ENTER: 1, NEW_FRAME: 1, ENTER_TOP: 0, LEAVE: 1,
+    LOAD_CALLEE: 2, CHECK_CALL: 1, CALL: 2, RETURN: 0, BREAK_RETURN: 0, HALT: 0,
+    PRINT_ARG: 0, PRINT_END: 0, BUILTIN: 2
+}
+
+# Pairs each word of an instruction stream with whether it is a jump target.
+def relocate(ops: list) -> list:
+    res, pc = [], 0
+    while pc < len(ops):
+        op, n = ops[pc], operand_counts[ops[pc]]
+        target = jump_operands.get(op)
+        res.append((op, False))
+        res.extend((ops[pc + 1 + k], k == target) for k in range(n))
+        pc += 1 + n
+
+    return res
+
+# Lowers delete statement.
+def _delete_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    expr = e['expr']
+    match expr['kind']:
+        case 'attribute' if expr['attribute']:
+            asm.emit(CONST, asm.const(expr['attribute']))
+            invalid = None
+        case 'subscriptor':
+            lower_expression(asm, expr['expr'], scope)
+            asm.emit(KEY, asm.const(expr))
+            invalid = asm.jump(JUMP_IF_EMPTY)
+        case _:
+            fail(asm, lambda: f"Line {e['line']}: cannot delete <{expr['kind']}>.")
+            return
+
+    lower_expression(asm, expr['collection'], scope)
+    asm.emit(DELETE, asm.const((e, expr)))
+    if invalid is not None:
+        done = asm.jump(JUMP)
+        asm.land(invalid)
+        fail(asm, lambda: f"Line {e['line']}: cannot delete <{expr['kind']}>.")
+        asm.land(done)
+
+# Lowers return statement
+def _return_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    if not flags.in_func:
+        fail(asm, lambda: f"Line {e['line']}: return outside of function.")
+        return
+
+    lower_expression(asm, e['expr'], scope)
+    asm.emit(RETURN)
+
+# Lowers break statement. A break ends every enclosing loop of its function, the
+# call then produces no value. A break outside of functions ends the program.
+def _break_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    if not flags.in_loop:
+        fail(asm, lambda: f"Line {e['line']}: break outside of loop.")
+        return
+
+    asm.emit(BREAK_RETURN if flags.in_func else HALT)
+
+# Lowers continue statement, leaves nested states and jumps to the end of the loop body.
+def _continue_(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    if not flags.in_loop:
+        fail(asm, lambda: f"Line {e['line']}: continue outside of loop.")
+        return
+
+    if (n := hops(scope, loop.scope)):
+        asm.emit(LEAVE, n)
+
+    loop.targets.append(asm.jump(JUMP))
+
+# Statements
+statements = {
+    'static': _static_,
+    'assignment': _assignment_,
+    'if': _if_,
+    'while': _while_,
+    'for': _for_,
+    'delete': _delete_,
+    'return': _return_,
+    'break': _break_,
+    'continue': _continue_
+}
+
+# Lowers a given statement
+def lower_statement(asm: Assembler, e: dict, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    kind = e['kind']
+    if kind not in statements:
+        fail(asm, lambda: f"Unknown statement: <{kind}>.")
+    else:
+        statements[kind](asm, e, scope, flags, loop)
+
+# Lowers a block of code
+def lower_block(asm: Assembler, b: list, scope: c.Scope, flags: tuple, loop: Loop) -> None:
+    for x in b:
+        lower_statement(asm, x, scope, flags, loop)
+
+
+# Run time helpers for uncommon paths.
+
+# Reports an unsupported binary operation.
+def binop_error(state: s.State, e: dict, v1: tuple, v2: tuple):
+    i.error(state, f"Line {e['line']}: operator '{e['op']}' not supported between types <{a.kind(v1)}> and <{a.kind(v2)}>.")
+
+# Built-in functions, each receives the call node and its evaluated arguments.
+# Argument counts are checked before any argument is evaluated.
+
+# Built-in type function
+def _type_(state, e, args) -> tuple:
+    return a._string(a.kind(args[0]))
+
+# Built-in ord function
+def _ord_(state, e, args) -> tuple:
+    character = args[0]
+    if not a.is_string(character):
+        i.error(state, f"Line {e['line']}: expected a character for ord(...), received <{a.kind(character)}>.")
+
+    if len(character.value) != 1:
+        i.error(state, f"Line {e['line']}: expected a character for ord(...), received a string of length {len(character.value)}.")
+
+    return a._integer(ord(character.value))
+
+# Built-in abs function
+def _abs_(state, e, args) -> tuple:
+    number = args[0]
+    if a.not_number(number):
+        i.error(state, f"Line {e['line']}: invalid argument type for abs(...): <{a.kind(number)}>.")
+
+    return a.int_or_float(number, abs(number.value))
+
+# Built-in len function
+def _len_(state, e, args) -> tuple:
+    iterable = args[0]
+    if a.not_iterable(iterable):
+        i.error(state, f"Line {e['line']}: expected a string or collection for len(...), received <{a.kind(iterable)}>.")
+
+    return a._integer(len(iterable.value))
+
+# Built-in pow function
+def _pow_(state, e, args) -> tuple:
+    b, p = args
+    if a.not_numbers(b, p):
+        i.error(state, f"Line {e['line']}: invalid argument types for pow(...), received <{a.kind(b)}> and <{a.kind(p)}>.")
+
+    if a.any_floats(b, p):
+        return a._float(pow(b.value, p.value))
+
+    return a._integer(pow(b.value, p.value))
+
+# Built-in bool function
+def _bool_(state, e, args) -> tuple:
+    return a._boolean(bool(args[0].value))
+
+# Built-in int function
+def _int_(state, e, args) -> tuple:
+    num = args[0]
+    if a.is_string(num):
+        try:
+            return a._integer(int(num.value))
+        except:
+            i.error(state, f"Line {e['line']}: invalid literal for int(...) with base 10: '{num.value}'.")
+
+    if a.not_number(num):
+        i.error(state, f"Line {e['line']}: invalid argument type for int(...): <{a.kind(num)}>.")
+
+    return a._integer(int(num.value))
+
+# Built-in float function
+def _float_(state, e, args) -> tuple:
+    num = args[0]
+    if a.is_string(num):
+        try:
+            return a._float(float(num.value))
+        except:
+            i.error(state, f"Line {e['line']}: could not convert string for float(...): '{num.value}'.")
+
+    if a.not_number(num):
+        i.error(state, f"Line {e['line']}: invalid argument type for float(...): <{a.kind(num)}>.")
+
+    return a._float(float(num.value))
+
+# Built-in str function
+def _str_(state, e, args) -> tuple:
+    return a._string(i.str_rep(args[0]))
+
+# Built-in functions and their argument counts. print takes any number of arguments
+# and writes each one as soon as it is evaluated, so it is compiled separately.
+built_funcs = {
+    'type': (1, _type_),
+    'ord': (1, _ord_),
+    'abs': (1, _abs_),
+    'pow': (2, _pow_),
+    'len': (1, _len_),
+    'bool': (1, _bool_),
+    'int': (1, _int_),
+    'float': (1, _float_),
+    'str': (1, _str_)
+}
+
+
+# Numeric binary operation, strings are joined when 'str' is set.
+def numeric(state: s.State, e: dict, f, v1: tuple, v2: tuple, str=False, float=False) -> tuple:
+    if str and a.are_strings(v1, v2):
+        return a._string(f(v1.value, v2.value))
+
+    if a.not_numbers(v1, v2):
+        binop_error(state, e, v1, v2)
+
+    if float or a.any_floats(v1, v2):
+        return a._float(f(v1.value, v2.value))
+
+    return a._integer(f(v1.value, v2.value))
+
+# Comparison binary operation.
+def compare(state: s.State, e: dict, f, v1: tuple, v2: tuple) -> tuple:
+    if a.not_numbers(v1, v2) and not a.are_strings(v1, v2):
+        binop_error(state, e, v1, v2)
+
+    return a._boolean(f(v1.value, v2.value))
+
+# Subscriptor on a collection or string.
+def subscript(state: s.State, e: dict, collection: tuple, attribute: tuple) -> tuple:
+    if a.not_collection(collection):
+        if a.is_string(collection) and a.is_integer(attribute):
+            str_len, index = len(collection.value), attribute.value
+            if not -str_len <= index < str_len:
+                i.error(state, f"Line {e['line']}: invalid string index for '{collection.value}': {index}.")
+
+            return a._string(collection.value[index])
+
+        i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute.value}': <{a.kind(collection)}>.")
+
+    if a.not_subscriptable(attribute):
+        i.error(state, f"Line {e['line']}: invalid key type for attribute '{attribute.value}': <{a.kind(attribute)}>.")
+
+    return collection.value.get(str(attribute.value), a._null(None))
+
+# Name of a called function for error messages.
+def func_name(name: str | None, func: s.Closure) -> str:
+    return name or '(anonymous) func@' + str(hex(id(func)))
+
+# Reports a failed assignment, the value of a call that ended with break cannot be assigned.
+def assign_error(state: s.State, t: dict):
+    i.error(state, f"Line {t['line']}: unknown assignment type: <{t['kind']}>.")
+
+
+# Executes compiled code in a fresh global state writing to 'out'.
+def execute(code: Code, out: list, max_depth: int = MAX_DEPTH) -> None:
+    _integer, _boolean, null, unassigned = a._integer, a._boolean, a._null(None), c.unassigned
+    ops, consts, pc = code.ops, code.consts, 0
+    state = s.State([unassigned] * code.size, None, out)
+    stack, calls = [], []
+    push, pop = stack.append, stack.pop
+    while True:
+        op = ops[pc]
+        if op == LOAD_FAST:
+            push(state.value[ops[pc + 1]])
+            pc += 2
+        elif op == CONST:
+            push(consts[ops[pc + 1]])
+            pc += 2
+        elif op == LOAD_DEEP:
+            curr = state
+            for _ in range(ops[pc + 1]):
+                curr = curr.parent
+            push(curr.value[ops[pc + 2]])
+            pc += 3
+        elif op == STORE_FAST:
+            if (val := stack[-1]) is None:
+                assign_error(state, consts[ops[pc + 2]])
+            state.value[ops[pc + 1]] = val
+            pc += 3
+        elif op == POP:
+            pop()
+            pc += 1
+        elif op == ADD:
+            v2, v1 = pop(), stack[-1]
+            if type(v1) is _integer and type(v2) is _integer:
+                stack[-1] = _integer(v1.value + v2.value)
+            else:
+                stack[-1] = numeric(state, consts[ops[pc + 1]], lambda x, y: x + y, v1, v2, str=True)
+            pc += 2
+        elif op == SUB:
+            v2, v1 = pop(), stack[-1]
+            if type(v1) is _integer and type(v2) is _integer:
+                stack[-1] = _integer(v1.value - v2.value)
+            else:
+                stack[-1] = numeric(state, consts[ops[pc + 1]], lambda x, y: x - y, v1, v2)
+            pc += 2
+        elif op == LT:
+            v2, v1 = pop(), stack[-1]
+            if type(v1) is _integer and type(v2) is _integer:
+                stack[-1] = _boolean(v1.value < v2.value)
+            else:
+                stack[-1] = compare(state, consts[ops[pc + 1]], lambda x, y: x < y, v1, v2)
+            pc += 2
+        elif op == POP_JUMP_IF_FALSE:
+            pc = ops[pc + 1] if not pop().value else pc + 2
+        elif op == JUMP:
+            pc = ops[pc + 1]
+        elif op == LOAD_NAME:
+            addrs, e = consts[ops[pc + 1]]
+            curr, depth, val = state, 0, unassigned
+            for d, slot in addrs:
+                while depth < d:
+                    curr, depth = curr.parent, depth + 1
+                if (val := curr.value[slot]) is not unassigned:
+                    break
+
+            if val is unassigned:
+                i.error(state, f"Line {e['line']}: Variable '{e['name']}' is not defined.")
+            push(val)
+            pc += 2
+        elif op == STORE_DEEP:
+            if (val := stack[-1]) is None:
+                assign_error(state, consts[ops[pc + 3]])
+            curr = state
+            for _ in range(ops[pc + 1]):
+                curr = curr.parent
+            curr.value[ops[pc + 2]] = val
+            pc += 4
+        elif op == STORE_NAME:
+            (addrs, own), val = consts[ops[pc + 1]], stack[-1]
+            if val is None:
+                assign_error(state, consts[ops[pc + 2]])
+            curr, depth = state, 0
+            for d, slot in addrs:
+                while depth < d:
+                    curr, depth = curr.parent, depth + 1
+                if curr.value[slot] is not unassigned:
+                    curr.value[slot] = val
+                    break
+            else:
+                state.value[own] = val
+            pc += 3
+        elif op == CALL:
+            n, k = ops[pc + 1], ops[pc + 2]
+            base = len(stack) - n - 1
+            func = stack[base].value
+            if len(calls) >= max_depth:
+                e, name, _ = consts[k]
+                i.error(state, f"Line {e['line']}: maximum recursion depth exceeded for {func_name(name, func)}(...).")
+            body = func.body
+            if body.slots is None:
+                frame = stack[base + 1:] + body.pad
+            else:
+                frame = [unassigned] * body.size
+                for slot, val in zip(body.slots, stack[base + 1:]):
+                    frame[slot] = val
+            del stack[base:]
+            calls.append((ops, consts, pc + 3, state, base))
+            state = s.State(frame, func.parent, func.parent.output)
+            ops, consts, pc = body.ops, body.consts, 0
+        elif op == CHECK_CALL:
+            e, name, n = consts[ops[pc + 1]]
+            func = stack[-1]
+            if a.not_closure(func):
+                i.error(state, f"Line {e['line']}: invalid type for function call: <{a.kind(func)}>.")
+            if n != len(func.value.params):
+                i.error(state, f"Line {e['line']}: invalid argument count for {func_name(name, func.value)}(...): Expected {len(func.value.params)}.")
+            pc += 2
+        elif op == RETURN:
+            val = pop()
+            ops, consts, pc, state, base = calls.pop()
+            del stack[base:]
+            push(val)
+        elif op == MUL:
+            v2, v1 = pop(), stack[-1]
+            if type(v1) is _integer and type(v2) is _integer:
+                stack[-1] = _integer(v1.value * v2.value)
+            else:
+                stack[-1] = numeric(state, consts[ops[pc + 1]], lambda x, y: x * y, v1, v2)
+            pc += 2
+        elif op == NUMERIC:
+            e, f, is_str, is_float = consts[ops[pc + 1]]
+            v2 = pop()
+            stack[-1] = numeric(state, e, f, stack[-1], v2, is_str, is_float)
+            pc += 2
+        elif op == CMP:
+            e, f = consts[ops[pc + 1]]
+            v2 = pop()
+            stack[-1] = compare(state, e, f, stack[-1], v2)
+            pc += 2
+        elif op == BIT:
+            e, f = consts[ops[pc + 1]]
+            v2, v1 = pop(), stack[-1]
+            if a.not_integers(v1, v2):
+                binop_error(state, e, v1, v2)
+            stack[-1] = _integer(f(v1.value, v2.value))
+            pc += 2
+        elif op == EQ:
+            v2 = pop()
+            stack[-1] = _boolean(stack[-1].value == v2.value)
+            pc += 1
+        elif op == NE:
+            v2 = pop()
+            stack[-1] = _boolean(stack[-1].value != v2.value)
+            pc += 1
+        elif op == JUMP_IF_FALSE_OR_POP:
+            if not stack[-1].value:
+                pc = ops[pc + 1]
+            else:
+                pop()
+                pc += 2
+        elif op == JUMP_IF_TRUE_OR_POP:
+            if stack[-1].value:
+                pc = ops[pc + 1]
+            else:
+                pop()
+                pc += 2
+        elif op == NOT:
+            stack[-1] = _boolean(not stack[-1].value)
+            pc += 1
+        elif op == BIT_NOT:
+            x = stack[-1]
+            if not a.is_integer(x):
+                e = consts[ops[pc + 1]]
+                i.error(state, f"Line {e['line']}: invalid operand type for '~': <{a.kind(x)}>.")
+            stack[-1] = _integer(~x.value)
+            pc += 2
+        elif op == SIGN:
+            (e, fact), x = consts[ops[pc + 1]], stack[-1]
+            if a.not_number(x):
+                i.error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
+            stack[-1] = a.int_or_float(x, x.value * fact)
+            pc += 2
+        elif op == PREFIX:
+            (e, step), x = consts[ops[pc + 1]], stack[-1]
+            if a.not_number(x):
+                i.error(state, f"Line {e['line']}: invalid operand type for {e['op']}: <{a.kind(x)}>.")
+            push(a.int_or_float(x, x.value + step))
+            pc += 2
+        elif op == NIP:
+            del stack[-2]
+            pc += 1
+        elif op == ATTR:
+            (e, attribute), collection = consts[ops[pc + 1]], stack[-1]
+            if a.not_collection(collection):
+                i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
+            stack[-1] = collection.value.get(attribute, null)
+            pc += 2
+        elif op == SUBSCR:
+            attribute = pop()
+            stack[-1] = subscript(state, consts[ops[pc + 1]], stack[-1], attribute)
+            pc += 2
+        elif op == KEY:
+            r = stack[-1]
+            if a.not_subscriptable(r):
+                e = consts[ops[pc + 1]]
+                i.error(state, f"Line {e['line']}: invalid key type for attribute assignment: <{a.kind(r)}>.")
+            stack[-1] = str(r.value)
+            pc += 2
+        elif op == JUMP_IF_EMPTY:
+            if not stack[-1]:
+                pop()
+                pc = ops[pc + 1]
+            else:
+                pc += 2
+        elif op == STORE_ATTR:
+            (e, attribute), collection = consts[ops[pc + 1]], pop()
+            if a.not_collection(collection):
+                i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
+            collection.value[attribute] = stack[-1]
+            if stack[-1] is None:
+                assign_error(state, e)
+            pc += 2
+        elif op == STORE_SUBSCR:
+            e, collection, attribute = consts[ops[pc + 1]], pop(), pop()
+            if a.not_collection(collection):
+                i.error(state, f"Line {e['line']}: invalid collection type for attribute '{attribute}': <{a.kind(collection)}>.")
+            collection.value[attribute] = stack[-1]
+            if stack[-1] is None:
+                assign_error(state, e)
+            pc += 2
+        elif op == DELETE:
+            (e, expr), collection, attribute = consts[ops[pc + 1]], pop(), pop()
+            if a.not_collection(collection):
+                i.error(state, f"Line {e['line']}: invalid collection type for attribute deletion '{attribute}': <{a.kind(collection)}>.")
+            if attribute in collection.value:
+                del collection.value[attribute]
+            else:
+                i.error(state, f"Line {expr['line']}: unknown attribute reference: '{attribute}'.")
+            pc += 2
+        elif op == COLLECTION:
+            keys, n = consts[ops[pc + 1]], ops[pc + 2]
+            vals = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            push(a._collection(dict(zip(keys, vals))))
+            pc += 3
+        elif op == CLOSURE:
+            push(a._closure(s.Closure(consts[ops[pc + 1]].params, consts[ops[pc + 1]], state)))
+            pc += 2
+        elif op == ENTER:
+            state = s.State([unassigned] * ops[pc + 1], state, state.output)
+            pc += 2
+        elif op == LEAVE:
+            for _ in range(ops[pc + 1]):
+                state = state.parent
+            pc += 2
+        elif op == NEW_FRAME:
+            push(s.State([unassigned] * ops[pc + 1], state, state.output))
+            pc += 2
+        elif op == ENTER_TOP:
+            state = stack[-1]
+            pc += 1
+        elif op == LOAD_CALLEE:
+            addrs, e, name = consts[ops[pc + 1]]
+            curr, depth, val = state, 0, unassigned
+            for d, slot in addrs:
+                while depth < d:
+                    curr, depth = curr.parent, depth + 1
+                if (val := curr.value[slot]) is not unassigned:
+                    break
+
+            if val is unassigned:
+                pc = ops[pc + 2]
+            else:
+                push(val)
+                pc += 3
+        elif op == PRINT_ARG:
+            state.output.append(i.str_rep(pop()))
+            state.output.append(' ')
+            pc += 1
+        elif op == PRINT_END:
+            state.output.append('\n')
+            push(null)
+            pc += 1
+        elif op == BUILTIN:
+            (f, e), n = consts[ops[pc + 1]], ops[pc + 2]
+            args = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            push(f(state, e, args))
+            pc += 3
+        elif op == BREAK_RETURN:
+            ops, consts, pc, state, base = calls.pop()
+            del stack[base:]
+            push(None)
+        elif op == HALT:
+            return
+        elif op == PREFIX_FAIL:
+            e, x = consts[ops[pc + 1]], stack[-2]
+            i.error(state, f"Line {e['line']}: invalid prefix syntax for {e['op']}: <{a.kind(x)}>.")
+        elif op == ASSIGN_FAIL:
+            assign_error(state, consts[ops[pc + 1]])
+        elif op == FAIL:
+            i.error(state, consts[ops[pc + 1]]())
+        elif op == THUNK:
+            push(consts[ops[pc + 1]]())
+            pc += 2
+
+
+# Lowers a program's AST to code, the result can be executed any number of times with run_program.
+# Lowering recurses on the python stack, a program nested too deeply to lower fails when it runs.
+def compile_program(p: list) -> Code:
+    try:
+        with i.recursion_limit(c.RECURSION_LIMIT):
+            scope = c.Scope(c.bind_names(p, {}), None)
+            asm = Assembler()
+            lower_block(asm, p, scope, i.Flags(False, False), None)
+    except RecursionError:
+        scope, asm = c.Scope({}, None), Assembler()
+        fail(asm, lambda: 'Program is nested too deeply to compile.')
+
+    asm.emit(HALT)
+    return asm.code(len(scope.names))
+
+# Executes a compiled program and produces its output.
+def run_program(code: Code, max_depth: int = MAX_DEPTH) -> dict:
+    out = []
+    try:
+        execute(code, out, max_depth)
+        return dict(kind='ok', output=out)
+    except i.ScopeScriptError as err:
+        return dict(kind='error', output=[str(err)])
+    except:
+        return dict(kind='error', output=[])
+
+# Lowers and executes a program's AST.
+def interp_program(p: list) -> dict:
+    try:
+        code = compile_program(p)
+    except:
+        return dict(kind='error', output=[])
+
+    return run_program(code)
@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import astcache as ac
+from scopescript import vm as v
+
+def print_sum(x, y):
+    return [{'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print', 'line': 1}, 'args': [
+        {'kind': 'binop', 'op': '+', 'e1': {'kind': 'integer', 'value': x}, 'e2': {'kind': 'float', 'value': y}, 'line': 1}], 'line': 1}, 'line': 1}]
+
+def test_binary_program():
+    p = print_sum('1', '2.5')
+    q = ac.loads(ac.dumps(p))
+    args = q[0]['expr']['args'][0]
+    # Number literals are parsed once, strings are interned.
+    assert args['e1']['value'] == 1 and args['e2']['value'] == 2.5
+    assert q[0]['kind'] is sys.intern(''.join(['sta', 'tic']))
+    assert i.interp_program(q) == i.interp_program(p) == {'kind': 'ok', 'output': ['3.5', ' ', '\n']}
+    # A literal that cannot be parsed is left for the interpreter to report.
+    assert ac.normalize(print_sum('x', '1'))[0]['expr']['args'][0]['e1']['value'] == 'x'
+    try:
+        ac.loads(b'{}')
+        assert False
+    except ValueError:
+        pass
+
+def test_cache(tmp_path):
+    text = json.dumps(print_sum('2', '0.5'))
+    cache = ac.Cache(str(tmp_path))
+    p = cache.load(text)
+    assert i.interp_program(p)['output'] == ['2.5', ' ', '\n']
+    assert os.path.exists(cache.path(ac.digest(text)))
+    # The same text is found in memory, then in the directory by another cache.
+    assert cache.load(text) is p
+    other = ac.Cache(str(tmp_path))
+    assert other.load(text) == p and other.programs.misses == 1
+    assert other.load(print_sum('2', '0.5')) == p
+    code = other.compile(text, v)
+    assert other.compile(text, v) is code and v.run_program(code)['output'] == ['2.5', ' ', '\n']
+    # Equal ASTs built in another key order, sharing no strings, have the same digest.
+    q = json.loads(json.dumps(print_sum('2', '0.5')))
+    q[0] = dict(reversed(q[0].items()))
+    assert q == print_sum('2', '0.5') and ac.digest(q) == ac.digest(print_sum('2', '0.5'))
+    assert other.load(q) is other.load(print_sum('2', '0.5'))
@@ -0,0 +1,24 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import batch as b
+
+def print_int(n):
+    return [{'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': [{'kind': 'integer', 'value': str(n)}], 'line': 1}, 'line': 1}]
+
+infinite = [{'kind': 'while', 'test': {'kind': 'boolean', 'value': True}, 'body': [], 'line': 1}]
+
+def test_interp_many():
+    programs = [print_int(n) for n in range(20)] + [[{'kind': 'static', 'expr': {'kind': 'variable', 'name': 'x', 'line': 2}, 'line': 2}]]
+    results = dict(b.interp_many(programs, workers=2, chunksize=3))
+    assert results == { index: i.interp_program(p) for index, p in enumerate(programs) }
+
+def test_interp_many_timeout():
+    results = dict(b.interp_many([print_int(1), infinite, print_int(2)], workers=2, chunksize=1, timeout=0.2))
+    assert results == {0: {'kind': 'ok', 'output': ['1', ' ', '\n']}, 1: {'kind': 'timeout', 'output': []}, 2: {'kind': 'ok', 'output': ['2', ' ', '\n']}}
+    b.shutdown()
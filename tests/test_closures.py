@@ -0,0 +1,88 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import compiler as c
+from scopescript import closures as cl
+from scopescript import atoms as a
+from scopescript import scope as s
+
+def var(name):
+    return {'kind': 'variable', 'name': name, 'line': 1}
+
+def num(n):
+    return {'kind': 'integer', 'value': str(n)}
+
+def assign(name, expr):
+    return {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name}], 'expr': expr, 'line': 1}
+
+def func(params, *body):
+    return {'kind': 'closure', 'params': params, 'body': list(body), 'line': 1}
+
+def call(f, *args):
+    return {'kind': 'call', 'fun': var(f) if type(f) is str else f, 'args': list(args), 'line': 1}
+
+def ret(expr):
+    return {'kind': 'return', 'expr': expr, 'line': 1}
+
+def show(*args):
+    return {'kind': 'static', 'expr': call('print', *args), 'line': 1}
+
+def add(e1, e2):
+    return {'kind': 'binop', 'op': '+', 'e1': e1, 'e2': e2, 'line': 1}
+
+def run(p):
+    result = i.interp_program(p)
+    assert result == c.run_program(c.compile_program(p))
+    return ''.join(result['output'])
+
+def test_analyse():
+    inner = func(['x'], assign('c', add(var('c'), var('x'))), ret(add(var('c'), var('k'))))
+    make = func(['k'], assign('c', num(0)), ret(inner))
+    analysis = cl.analyse([assign('make', make)])
+    assert set(analysis.captures[id(inner)].free) == {'c', 'k'}
+    assert analysis.captures[id(inner)].levels == (frozenset({'c'}),)
+    assert analysis.captures[id(inner)].beyond == frozenset({'make'})
+    # Names a function assigns that are not defined around it are its own.
+    assert set(analysis.captures[id(make)].free) == {'c'} and analysis.assigned == {'make', 'c'}
+
+def test_flat_environment():
+    big = {'kind': 'collection', 'value': { str(n): num(n) for n in range(100) }}
+    make = func(['k'], assign('big', big), ret(func(['x'], ret(add(var('x'), var('k'))))))
+    counter = func([], assign('n', num(0)), ret(func([], assign('n', add(var('n'), num(1))), ret(var('n')))))
+    p = [assign('make', make), assign('add', call('make', num(2))), assign('counter', counter), assign('next', call('counter'))]
+    caches = i.Caches()
+    caches.scopes = cl.analyse(p)
+    state = s.State({}, None, [], caches)
+    i.eval_block(state, p)
+    # A parameter is never assigned, its value is copied and the state around it let go.
+    env = state.value['add'].value.parent
+    assert env.value == { 'k': a._integer(2) } and env.parent is None
+    # An assigned variable is shared with the state that holds it.
+    env = state.value['next'].value.parent
+    assert 'n' in env.value and env.parent is None
+    assert i.eval_expression(state, call('next')) == a._integer(1) and i.eval_expression(state, call('next')) == a._integer(2)
+
+def test_flat_semantics():
+    # A variable defined after the function is made is the one it assigns.
+    assert run([assign('f', func([], assign('x', num(1)), ret(var('x')))), assign('x', num(5)), show(call('f'), var('x'))]) == '1 1 \n'
+    assert run([assign('f', func([], assign('x', num(1)), ret(var('x')))), show(call('f')), assign('x', num(5)), show(var('x'))]) == '1 \n5 \n'
+    # Functions defined later, called from a function made inside another.
+    outer = func([], ret(func([], ret(call('helper')))))
+    assert run([assign('g', call('outer')), assign('outer', outer), assign('helper', func([], ret(num(7)))), show(call('g'))]) == "Line 1: function outer(...) is not defined."
+    assert run([assign('outer', outer), assign('g', call('outer')), assign('helper', func([], ret(num(7)))), show(call('g'))]) == '7 \n'
+    # Closures made in the same call share its variables.
+    pair = func([], assign('n', num(0)), ret({'kind': 'collection', 'value': {
+        'inc': func([], assign('n', add(var('n'), num(1)))),
+        'get': func([], ret(var('n')))}}))
+    get = lambda name: {'kind': 'attribute', 'collection': var('p'), 'attribute': name, 'line': 1}
+    assert run([assign('pair', pair), assign('p', call('pair')),
+                {'kind': 'static', 'expr': call(get('inc')), 'line': 1}, {'kind': 'static', 'expr': call(get('inc')), 'line': 1}, show(call(get('get')))]) == '2 \n'
+    # A variable assigned inside a loop around the function is defined in the loop's state.
+    loop = {'kind': 'while', 'test': {'kind': 'binop', 'op': '<', 'e1': var('i'), 'e2': num(3), 'line': 1}, 'body': [
+        assign('f', func([], ret(var('y')))), assign('y', var('i')), assign('i', add(var('i'), num(1))), show(call('f'))], 'line': 1}
+    assert run([assign('i', num(0)), loop]) == '0 \n1 \n2 \n'
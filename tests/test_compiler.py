@@ -0,0 +1,154 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import compiler as c
+from scopescript import values as v
+from scopescript import atoms as a
+
+def print_stmt(*args):
+    return {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': list(args), 'line': 1}, 'line': 1}
+
+def test_run_repeatedly():
+    code = c.compile_program([print_stmt({'kind': 'integer', 'value': '1'})])
+    assert c.run_program(code) == {'kind': 'ok', 'output': ['1', ' ', '\n']}
+    assert c.run_program(code) == {'kind': 'ok', 'output': ['1', ' ', '\n']}
+
+def test_fresh_state_per_run():
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x', 'line': 1}], 'expr': {'kind': 'integer', 'value': '1'}, 'line': 1},
+        print_stmt({'kind': 'unop', 'op': '++', 'expr': {'kind': 'variable', 'name': 'x', 'line': 1}, 'line': 1})]
+    code = c.compile_program(p)
+    assert c.run_program(code)['output'] == ['2', ' ', '\n']
+    assert c.run_program(code)['output'] == ['2', ' ', '\n']
+
+def test_recursive_closure():
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'fib', 'line': 1}], 'expr': {'kind': 'closure', 'params': ['n'], 'body': [
+            {'kind': 'if', 'truePartArr': [{'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name': 'n', 'line': 1}, 'e2': {'kind': 'integer', 'value': '2'}, 'line': 1},
+                'part': [{'kind': 'return', 'expr': {'kind': 'variable', 'name': 'n', 'line': 1}, 'line': 1}]}], 'falsePart': [], 'line': 1},
+            {'kind': 'return', 'expr': {'kind': 'binop', 'op': '+', 'line': 1,
+                'e1': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'fib', 'line': 1}, 'args': [{'kind': 'binop', 'op': '-', 'e1': {'kind': 'variable', 'name': 'n', 'line': 1}, 'e2': {'kind': 'integer', 'value': '1'}, 'line': 1}], 'line': 1},
+                'e2': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'fib', 'line': 1}, 'args': [{'kind': 'binop', 'op': '-', 'e1': {'kind': 'variable', 'name': 'n', 'line': 1}, 'e2': {'kind': 'integer', 'value': '2'}, 'line': 1}], 'line': 1}}, 'line': 1}], 'line': 1}, 'line': 1},
+        print_stmt({'kind': 'call', 'fun': {'kind': 'variable', 'name': 'fib', 'line': 1}, 'args': [{'kind': 'integer', 'value': '10'}], 'line': 1})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['55', ' ', '\n']}
+
+def test_for_loop():
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 't', 'line': 1}], 'expr': {'kind': 'integer', 'value': '0'}, 'line': 1},
+        {'kind': 'for', 'line': 1,
+        'inits': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x', 'line': 1}], 'expr': {'kind': 'integer', 'value': '0'}, 'line': 1}]
+        , 'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name':'x', 'line': 1}, 'e2':{'kind': 'integer', 'value': '10'}, 'line': 1}
+        , 'updates': [{'kind': 'static', 'expr':{'kind':'unop', 'op':'++', 'expr': { 'kind': 'variable', 'name': 'x', 'line': 1 }, 'line': 1}, 'line': 1}]
+        , 'body':[{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 't', 'line': 1}], 'expr': {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 't', 'line': 1}, 'e2': {'kind': 'variable', 'name': 'x', 'line': 1}, 'line': 1}, 'line': 1}]},
+        print_stmt({'kind': 'variable', 'name': 't', 'line': 1})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['45', ' ', '\n']}
+
+def test_undefined_variable():
+    p = [print_stmt({'kind': 'integer', 'value': '1'}), print_stmt({'kind': 'variable', 'name': 'x', 'line': 2})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'error', 'output': ["Line 2: Variable 'x' is not defined."]}
+
+def test_return_outside_function():
+    p = [print_stmt(), {'kind': 'return', 'expr': {'kind': 'integer', 'value': '1'}, 'line': 3}]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'error', 'output': ['Line 3: return outside of function.']}
+
+def test_unreached_error():
+    p = [{'kind': 'if', 'truePartArr': [{'test': {'kind': 'boolean', 'value': False}, 'part': [{'kind': 'break', 'line': 1}]}], 'falsePart': [], 'line': 1}, print_stmt()]
+    assert c.run_program(c.compile_program(p)) == {'kind': 'ok', 'output': ['\n']}
+
+def test_binop_type_error():
+    p = [print_stmt({'kind': 'binop', 'op': '*', 'e1': {'kind': 'string', 'value': 'a'}, 'e2': {'kind': 'null'}, 'line': 4})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'error', 'output': ["Line 4: operator '*' not supported between types <string> and <null>."]}
+
+def test_python_error():
+    p = [print_stmt({'kind': 'binop', 'op': '/', 'e1': {'kind': 'integer', 'value': '1'}, 'e2': {'kind': 'integer', 'value': '0'}, 'line': 1})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'error', 'output': []}
+
+def test_resolve_addresses():
+    outer = c.Scope({'x': 0, 'y': 1}, None)
+    inner = c.Scope({'x': 0}, outer)
+    assert inner.resolve('x') == ([(0, 0), (1, 0)], False)
+    assert inner.resolve('y') == ([(1, 1)], False)
+    assert inner.resolve('z') == ([], False)
+    outer.bound.add('x')
+    assert inner.resolve('x') == ([(0, 0), (1, 0)], True)
+    assert c.bind_names([{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x'}, {'kind': 'identifier', 'name': 'w'}]}], {}, inner) == {'w': 0}
+
+def test_assignment_in_one_branch():
+    assign = lambda name: {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name, 'line': 1}], 'expr': {'kind': 'integer', 'value': '1'}, 'line': 1}
+    p = [{'kind': 'if', 'truePartArr': [{'test': {'kind': 'boolean', 'value': False}, 'part': [assign('x')]}], 'falsePart': [assign('y'), print_stmt({'kind': 'variable', 'name': 'x', 'line': 2})], 'line': 1}]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'error', 'output': ["Line 2: Variable 'x' is not defined."]}
+
+def test_assignment_in_outer_state():
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x', 'line': 1}], 'expr': {'kind': 'integer', 'value': '1'}, 'line': 1},
+        {'kind': 'while', 'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name': 'x', 'line': 1}, 'e2': {'kind': 'integer', 'value': '3'}, 'line': 1},
+            'body': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x', 'line': 1}], 'expr': {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 'x', 'line': 1}, 'e2': {'kind': 'integer', 'value': '1'}, 'line': 1}, 'line': 1}], 'line': 1},
+        print_stmt({'kind': 'variable', 'name': 'x', 'line': 1})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['3', ' ', '\n']}
+
+def test_boolean_bitwise():
+    t = {'kind': 'boolean', 'value': True}
+    x = {'kind': 'binop', 'op': '&', 'e1': t, 'e2': t, 'line': 1}
+    p = [print_stmt(x, {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'type', 'line': 1}, 'args': [x], 'line': 1}, {'kind': 'binop', 'op': '+', 'e1': x, 'e2': t, 'line': 1})]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['True', ' ', 'integer', ' ', '2', ' ', '\n']}
+
+def test_integer_pow():
+    # pow(2, -1) is an integer holding a float, and arithmetic with integers keeps it one.
+    call = lambda f, *args: {'kind': 'call', 'fun': {'kind': 'variable', 'name': f, 'line': 1}, 'args': list(args), 'line': 1}
+    half = call('pow', {'kind': 'integer', 'value': '2'}, {'kind': 'integer', 'value': '-1'})
+    plus = {'kind': 'binop', 'op': '+', 'e1': half, 'e2': {'kind': 'integer', 'value': '1'}, 'line': 1}
+    p = [print_stmt(half, call('type', half), plus, call('type', plus), call('type', call('abs', half)))]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['0.5', ' ', 'integer', ' ', '1.5', ' ', 'integer', ' ', 'integer', ' ', '\n']}
+
+def test_key_errors():
+    # 3[{'0': 2, 'k': 'q'}] and {}[{'0': 2, 'k': 'q'}] report the key as the interpreter does.
+    key = {'kind': 'collection', 'value': {'0': {'kind': 'integer', 'value': '2'}, 'k': {'kind': 'string', 'value': 'q'}}}
+    for collection in ({'kind': 'integer', 'value': '3'}, {'kind': 'collection', 'value': {}}):
+        p = [print_stmt({'kind': 'subscriptor', 'collection': collection, 'expr': key, 'line': 1})]
+        assert c.run_program(c.compile_program(p)) == i.interp_program(p)
+        assert "'{'0': integer(value=2), 'k': string(value='q')}'" in i.interp_program(p)['output'][0]
+
+def test_native_values():
+    atom = a._collection({'a': a._integer(1), 'b': a._collection({'c': a._string('s')}), 'd': a._integer(True), 'e': a._null(None)})
+    val = v.from_atom(atom)
+    assert val == {'a': 1, 'b': {'c': 's'}, 'd': True, 'e': None}
+    assert type(val['d']) is v.IntBool and v.kind(val['d']) == 'integer' and v.str_rep(val['d']) == 'True'
+    assert v.to_atom(val) == atom
+    assert v.kind(True) == 'boolean' and v.is_integer(True) and not v.is_integer(1.0)
+
+def test_local_defined_later_outside():
+    # f = () => { q = 1; return q; }; print(f()); q = 9; print(f(), q);
+    # g = () => { w = 4; return () => w; }; h = g(); w = 7; print(h(), g()(), w);
+    var = lambda name: {'kind': 'variable', 'name': name, 'line': 1}
+    num = lambda n: {'kind': 'integer', 'value': n}
+    assign = lambda name, e: {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name, 'line': 1}], 'expr': e, 'line': 1}
+    call = lambda f: {'kind': 'call', 'fun': f, 'args': [], 'line': 1}
+    closure = lambda body: {'kind': 'closure', 'params': [], 'body': body}
+    p = [assign('f', closure([assign('q', num('1')), {'kind': 'return', 'expr': var('q'), 'line': 1}])), print_stmt(call(var('f'))), assign('q', num('9')), print_stmt(call(var('f')), var('q')),
+        assign('g', closure([assign('w', num('4')), {'kind': 'return', 'expr': closure([{'kind': 'return', 'expr': var('w'), 'line': 1}]), 'line': 1}])),
+        assign('h', call(var('g'))), assign('w', num('7')), print_stmt(call(var('h')), call(call(var('g'))), var('w'))]
+    assert c.run_program(c.compile_program(p)) == i.interp_program(p) == {'kind': 'ok', 'output': ['1', ' ', '\n', '1', ' ', '1', ' ', '\n', '4', ' ', '4', ' ', '4', ' ', '\n']}
+
+def test_max_depth():
+    # Anonymous (n) => n == 0 ? 0 : 1 + down(n - 1), bound to 'down'.
+    n, call = {'kind': 'variable', 'name': 'n', 'line': 1}, lambda arg: {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'down', 'line': 1}, 'args': [arg], 'line': 1}
+    body = [{'kind': 'return', 'expr': {'kind': 'ternary', 'test': {'kind': 'binop', 'op': '==', 'e1': n, 'e2': {'kind': 'integer', 'value': '0'}, 'line': 1}, 'trueExpr': {'kind': 'integer', 'value': '0'},
+        'falseExpr': {'kind': 'binop', 'op': '+', 'e1': {'kind': 'integer', 'value': '1'}, 'e2': call({'kind': 'binop', 'op': '-', 'e1': n, 'e2': {'kind': 'integer', 'value': '1'}, 'line': 1}), 'line': 1}}, 'line': 1}]
+    for depth, result in ((999, {'kind': 'ok', 'output': ['999', ' ', '\n']}), (1000, {'kind': 'error', 'output': ['Line 1: maximum recursion depth exceeded for down(...).']})):
+        p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'down', 'line': 1}], 'expr': {'kind': 'closure', 'params': ['n'], 'body': body}, 'line': 1},
+            print_stmt(call({'kind': 'integer', 'value': str(depth)}))]
+        assert c.run_program(c.compile_program(p)) == i.interp_program(p) == result
+
+    assert c.run_program(c.compile_program(p), max_depth=5000) == i.interp_program(p, max_depth=5000) == {'kind': 'ok', 'output': ['1000', ' ', '\n']}
+
+def test_deep_nesting():
+    # A function returning 1 + (1 + ... x) compiles under a raised recursion limit, a
+    # program nested deeper than that fails when it runs.
+    for depth, result in ((1500, {'kind': 'ok', 'output': ['1501', ' ', '\n']}), (20000, {'kind': 'error', 'output': ['Program is nested too deeply to compile.']})):
+        e = {'kind': 'variable', 'name': 'x', 'line': 1}
+        for _ in range(depth):
+            e = {'kind': 'binop', 'op': '+', 'e1': {'kind': 'integer', 'value': '1'}, 'e2': e, 'line': 1}
+        p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'f', 'line': 1}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': e, 'line': 1}]}, 'line': 1},
+            print_stmt({'kind': 'call', 'fun': {'kind': 'variable', 'name': 'f', 'line': 1}, 'args': [{'kind': 'integer', 'value': '1'}], 'line': 1})]
+        assert c.run_program(c.compile_program(p)) == result
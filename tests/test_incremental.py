@@ -0,0 +1,117 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import incremental as inc
+
+def var(name):
+    return {'kind': 'variable', 'name': name, 'line': 1}
+
+def num(n):
+    return {'kind': 'integer', 'value': str(n)}
+
+def assign(target, expr):
+    return {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': target} if type(target) is str else target], 'expr': expr, 'line': 1}
+
+def attr(collection, name):
+    return {'kind': 'attribute', 'collection': collection, 'attribute': name, 'line': 1}
+
+def call(f, *args):
+    return {'kind': 'call', 'fun': var(f), 'args': list(args), 'line': 1}
+
+def add(e1, e2):
+    return {'kind': 'binop', 'op': '+', 'e1': e1, 'e2': e2, 'line': 1}
+
+def show(*args):
+    return {'kind': 'static', 'expr': call('print', *args), 'line': 1}
+
+def func(params, *body):
+    return {'kind': 'closure', 'params': params, 'body': list(body), 'line': 1}
+
+def ret(expr):
+    return {'kind': 'return', 'expr': expr, 'line': 1}
+
+loop = {'kind': 'while', 'test': {'kind': 'binop', 'op': '<', 'e1': var('i'), 'e2': num(100), 'line': 1},
+        'body': [assign('t', add(var('t'), var('i'))), assign('i', add(var('i'), num(1)))], 'line': 1}
+
+counter = func([], assign('n', num(0)), ret(func([], assign('n', add(var('n'), num(1))), ret(var('n')))))
+
+program = [
+    assign('i', num(0)), assign('t', num(0)), loop, show(var('t')),
+    assign('make', counter), assign('next', call('make')),
+    assign('xs', {'kind': 'collection', 'value': {'a': num(1)}}),
+    assign(attr(var('xs'), 'a'), call('next')), show(var('xs'), call('next'))
+] + [ show(num(n)) for n in range(5) ]
+
+def edit(p, index, stmt):
+    p = list(p)
+    p[index] = stmt
+    return p
+
+def run(session, p):
+    result = session.run(p)
+    assert result == i.interp_program(p)
+    return session.ran
+
+def test_session_reuse():
+    session = inc.Session(interval=0, cost=0)
+    assert run(session, program) == list(range(len(program)))
+    # Only the edited statement runs, from the snapshot before it.
+    assert run(session, edit(program, 11, show(num(7)))) == [11]
+    # Statements after an edit run again when they assign or read what changed, or call a
+    # function of the program. The print of 'i' is not run again.
+    p = program[:4] + [show(var('i')), assign('s', add(var('t'), num(1))), show(var('s'))]
+    assert run(session, p) == [4, 5, 6]
+    assert run(session, edit(p, 3, show(var('t'), num(1)))) == [3, 5, 6]
+    assert run(session, edit(p, 1, assign('t', num(5)))) == [1, 2, 3, 4, 5, 6]
+    assert run(session, edit(p, 1, assign('t', num(5)))) == []
+    # Calls to functions of the program may change anything, what follows runs again.
+    run(session, program)
+    assert run(session, edit(program, 6, assign('xs', {'kind': 'collection', 'value': {}}))) == list(range(6, len(program)))
+
+def test_session_edits():
+    session = inc.Session(interval=0, cost=0)
+    edits = [
+        program,
+        edit(program, 2, assign('i', num(90))),
+        program[:4] + [show(var('i'))] + program[4:],
+        program[:6] + program[7:],
+        edit(program, 7, assign(attr(var('xs'), 'b'), call('next'))),
+        edit(program, 0, assign('make', func([], ret(func([], ret(num(3))))))),
+        program + [ show(var('t')) ],
+        program
+    ]
+    for p in edits + edits[::-1]:
+        run(session, p)
+
+def test_session_errors():
+    session = inc.Session(interval=0, cost=0)
+    p = program[:4] + [show(var('missing'))] + program[4:]
+    assert session.run(p) == {'kind': 'error', 'output': ["Line 1: Variable 'missing' is not defined."]}
+    # The statement that failed and those before it are unchanged, so the run fails again.
+    assert run(session, edit(p, 12, show(num(1)))) == []
+    assert run(session, program) == list(range(4, len(program)))
+    assert session.run(program, fuel=1)['kind'] == 'ok'
+    assert session.run(edit(program, 1, assign('t', num(1))), fuel=10)['kind'] == 'timeout'
+
+def test_session_signals():
+    session = inc.Session(interval=0, cost=0)
+    # A break at the top level ends the program as it ends a block.
+    stop = {'kind': 'while', 'test': {'kind': 'boolean', 'value': 'true'}, 'body': [{'kind': 'break', 'line': 1}], 'line': 1}
+    p = [show(num(0)), stop, show(num(1))]
+    assert i.interp_program(p) == {'kind': 'ok', 'output': ['0', ' ', '\n']}
+    assert run(session, p) == [0, 1]
+    assert run(session, edit(p, 2, show(num(2)))) == [1]
+    assert run(session, edit(p, 1, show(num(3)))) == [1, 2]
+
+def test_session_later_globals():
+    session = inc.Session(interval=0, cost=0)
+    # A function made before an edit calls a function the edit defines after it.
+    apply = assign('apply', func(['x'], ret(call('handler', var('x')))))
+    p = [apply, show(num(1)), assign('z', num(1)), show(num(2))]
+    run(session, p)
+    assert run(session, p[:3] + [assign('handler', func(['y'], ret(var('y')))), show(call('apply', num(1)))]) == [3, 4]
@@ -1,6 +1,7 @@
 import os
 import sys
 import math
+import threading
 
 test_dir = os.path.dirname( __file__ )
 src_dir = os.path.join( test_dir, '..', 'src')
@@ -175,6 +176,40 @@ def test_call_recursive():
 
     assert i.eval_expression(parent, {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'foo'}, 'args': [{'kind': 'integer', 'value': '0'}] }) == a._integer(999)
 
+def test_call_depth():
+    parent = s.State({}, None, [])
+    parent.value['foo'] = a._closure(
+        s.Closure(['a'], [{'kind': 'if', 
+            'truePartArr': [{
+                'test': {'kind': 'binop', 'op': '<', 'e1': { 'kind': 'variable', 'name': 'a' } , 'e2': {'kind': 'integer', 'value': '5000' } }
+                , 'part': [{ 'kind': 'return', 'expr': {'kind': 'binop', 'op': '+', 'e2': {'kind': 'integer', 'value': '0'},
+                    'e1': { 'kind': 'call', 'fun': {'kind': 'variable', 'name': 'foo'}, 'args': [ {'kind': 'binop', 'op': '+', 'e1': { 'kind': 'variable', 'name': 'a' }, 'e2': {'kind': 'integer', 'value': '1'}}], 'line': 2}}}]}]
+            , 'falsePart': [{'kind': 'return', 'expr': {'kind': 'variable', 'name': 'a'}}]}], parent))
+
+    call = {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'foo'}, 'args': [{'kind': 'integer', 'value': '0'}], 'line': 1}
+    limit = sys.getrecursionlimit()
+    assert i.eval_expression(parent, call, max_depth=5001) == a._integer(5000)
+    assert sys.getrecursionlimit() == limit
+    try:
+        i.eval_expression(parent, call)
+        assert False
+    except i.ScopeScriptError as err:
+        assert str(err) == 'Line 2: maximum recursion depth exceeded for foo(...).'
+
+def test_tail_call():
+    parent = s.State({}, None, [])
+    parent.value['foo'] = a._closure(
+        s.Closure(['a', 'b'], [{'kind': 'if', 
+            'truePartArr': [{
+                'test': {'kind': 'binop', 'op': '<', 'e1': { 'kind': 'variable', 'name': 'a' } , 'e2': {'kind': 'integer', 'value': '5000' } }
+                , 'part': [{ 'kind': 'return', 'expr': { 'kind': 'call', 'fun': {'kind': 'variable', 'name': 'foo'}, 'args': [ {'kind': 'binop', 'op': '+', 'e1': { 'kind': 'variable', 'name': 'a' }, 'e2': {'kind': 'integer', 'value': '1'}},
+                    {'kind': 'binop', 'op': '+', 'e1': { 'kind': 'variable', 'name': 'b' }, 'e2': { 'kind': 'variable', 'name': 'a' }}], 'line': 2}}]}]
+            , 'falsePart': [{'kind': 'return', 'expr': {'kind': 'variable', 'name': 'b'}}]}], parent))
+
+    call = {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'foo'}, 'args': [{'kind': 'integer', 'value': '0'}, {'kind': 'integer', 'value': '0'}], 'line': 1}
+    assert i.eval_expression(parent, call, max_depth=2) == a._integer(12497500)
+    assert i.eval_statement(parent, {'kind': 'return', 'expr': call}, i.Flags(True, False)) == ('return', a._integer(12497500))
+
 def test_call_lexical():
     state = s.State({}, None, None)
     state.value['outer_func'] = a._closure(
@@ -370,3 +405,341 @@ def test_delete():
     
 def test_return():
     assert i.eval_statement(None, {'kind': 'return', 'expr': {'kind': 'integer', 'value': '1'}}, i.Flags(True, False)) == ('return', a._integer(1))
+
+# Interpreter tests
+
+def counter_program(n):
+    # c = 0; inc = () => { ++c; }; for (k = 0; k < n; ++k) { inc(); } print(c);
+    return [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'c'}], 'expr': {'kind': 'integer', 'value': '0'}},
+        {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'inc'}], 'expr': {'kind': 'closure', 'params': [], 'body': [{'kind': 'static', 'expr': {'kind': 'unop', 'op': '++', 'expr': {'kind': 'variable', 'name': 'c'}}}]}},
+        {'kind': 'for', 'inits': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'k'}], 'expr': {'kind': 'integer', 'value': '0'}}],
+            'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name': 'k'}, 'e2': {'kind': 'integer', 'value': str(n)}},
+            'updates': [{'kind': 'static', 'expr': {'kind': 'unop', 'op': '++', 'expr': {'kind': 'variable', 'name': 'k'}}}],
+            'body': [{'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'inc'}, 'args': []}}]},
+        {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': [{'kind': 'variable', 'name': 'c'}]}}]
+
+def test_interpreter_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    interp = i.Interpreter()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda n: interp.interp_program(counter_program(n)), range(200, 232)))
+
+    assert results == [{'kind': 'ok', 'output': [str(n), ' ', '\n']} for n in range(200, 232)]
+
+def test_interpreter_settings():
+    def _double_(state, e):
+        x = yield i.expression(state, e['args'][0])
+        return a._integer(x.value * 2)
+
+    double = {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'double'}, 'args': [{'kind': 'integer', 'value': '21'}], 'line': 1}
+    assert i.Interpreter(builtins={'double': _double_}).eval_expression(None, double) == a._integer(42)
+    assert i.interp_program([{'kind': 'static', 'expr': double}]) == {'kind': 'error', 'output': ['Line 1: function double(...) is not defined.']}
+    call = {'kind': 'call', 'fun': {'kind': 'closure', 'params': [], 'body': []}, 'args': [], 'line': 3}
+    assert i.Interpreter(max_depth=0).interp_program([{'kind': 'static', 'expr': call}])['output'][0].startswith('Line 3: maximum recursion depth exceeded for (anonymous) func@')
+
+def test_output_sinks():
+    import io
+    from scopescript import output as o
+    program = counter_program(3)[:1] + [counter_program(3)[-1]] * 3
+    file, lines = io.StringIO(), []
+    assert i.interp_program(program, output=o.Writer(file))['kind'] == 'ok'
+    assert file.getvalue() == '0 \n' * 3
+    i.interp_program(program, output=o.Callback(lines.append))
+    assert lines == ['0 '] * 3
+    assert i.interp_program(program, limit=7) == {'kind': 'error', 'output': ['Output limit of 7 bytes exceeded.']}
+    assert i.interp_program(program, limit=9) == {'kind': 'ok', 'output': ['0', ' ', '\n'] * 3}
+
+def test_stream_program():
+    stream = i.stream_program(counter_program(3)[:1] + [counter_program(3)[-1]] * 2 + [{'kind': 'static', 'expr': {'kind': 'variable', 'name': 'y', 'line': 4}}])
+    assert next(stream) == '0 '
+    assert next(stream) == '0 '
+    try:
+        next(stream)
+        assert False
+    except StopIteration as done:
+        assert done.value == {'kind': 'error', 'output': ["Line 4: Variable 'y' is not defined."]}
+
+def counted_for(body, bound={'kind': 'integer', 'value': '5'}):
+    return {'kind': 'for', 
+        'inits': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x'}], 'expr': {'kind': 'integer', 'value': '0'}}]
+        , 'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name':'x'}, 'e2': bound}
+        , 'updates': [{'kind': 'static', 'expr':{'kind':'unop', 'op':'++', 'expr': { 'kind': 'variable', 'name': 'x' }}}]
+        , 'body': body}
+
+def test_for_counted():
+    state = s.State({'x': a._integer(-5), 'n': a._integer(3), 't': a._integer(0)}, None, None)
+    add = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 't'}], 'expr': {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 't'}, 'e2': {'kind': 'variable', 'name': 'x'}}}
+    i.eval_statement(state, counted_for([add], {'kind': 'variable', 'name': 'n'}))
+    assert state.value['x'] == a._integer(3) and state.value['t'] == a._integer(3)
+
+def test_for_counted_fallback():
+    # The body turns the counter into a float, the loop goes on with the generic path.
+    state = s.State({'x': a._integer(0)}, None, None)
+    i.eval_statement(state, counted_for([{'kind': 'if', 'truePartArr': [{'test': {'kind': 'binop', 'op': '==', 'e1': {'kind': 'variable', 'name': 'x'}, 'e2': {'kind': 'integer', 'value': '2'}},
+        'part': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x'}], 'expr': {'kind': 'float', 'value': '2.5'}}]}], 'falsePart': []}]))
+    assert state.value['x'] == a._float(5.5)
+
+def test_inline_cache():
+    # The 'v' node inside the returned closure is reached from a different parent each time.
+    make = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'make'}], 'expr': {'kind': 'closure', 'params': ['v'], 'body': [
+        {'kind': 'return', 'expr': {'kind': 'closure', 'params': [], 'body': [{'kind': 'return', 'expr': {'kind': 'variable', 'name': 'v', 'line': 1}}]}}]}}
+    def assign(name, n):
+        return {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name}], 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'make'}, 'args': [{'kind': 'integer', 'value': n}], 'line': 2}}
+
+    def call(name):
+        return {'kind': 'call', 'fun': {'kind': 'variable', 'name': name}, 'args': [], 'line': 3}
+
+    printed = {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': [call('f'), call('g'), call('f')], 'line': 3}}
+    assert i.interp_program([make, assign('f', '1'), assign('g', '2'), printed]) == {'kind': 'ok', 'output': ['1', ' ', '2', ' ', '1', ' ', '\n']}
+    # A global defined after the first lookup is found by the next one.
+    state = s.State({}, None, None, i.Caches())
+    inner = s.State({}, s.State({}, state, None, state.cache), None, state.cache)
+    y = {'kind': 'variable', 'name': 'y', 'line': 4}
+    assert i.resolve(inner, y) is None
+    i.eval_statement(state, {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'y'}], 'expr': {'kind': 'integer', 'value': '1'}})
+    assert i.eval_expression(inner, y) == a._integer(1)
+
+def test_inline_cache_miss():
+    # Counts the lookups made in a state's values.
+    class Values(dict):
+        lookups = 0
+        def __contains__(self, name):
+            Values.lookups += 1
+            return dict.__contains__(self, name)
+
+    state = s.State(Values(), None, None, i.Caches())
+    inner = s.State({}, s.State({}, state, None, state.cache), None, state.cache)
+    length = {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'len'}, 'args': [{'kind': 'string', 'value': 'ab'}], 'line': 1}
+    assert i.eval_expression(inner, length) == a._integer(2) and Values.lookups == 1
+    # The built-in is found again without looking through the states.
+    assert i.eval_expression(inner, length) == a._integer(2) and Values.lookups == 1
+    # Defining a variable forgets the miss, a function named 'len' now overrides the built-in.
+    closure = {'kind': 'closure', 'params': ['s'], 'body': [{'kind': 'return', 'expr': {'kind': 'integer', 'value': '7'}}]}
+    i.eval_statement(state, {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'len'}], 'expr': closure})
+    assert i.eval_expression(inner, length) == a._integer(7)
+
+def test_call_errors():
+    closure = {'kind': 'closure', 'params': ['a'], 'body': []}
+    anonymous = {'kind': 'call', 'fun': closure, 'args': [], 'line': 1}
+    assert i.interp_program([{'kind': 'static', 'expr': anonymous}])['output'][0].startswith('Line 1: invalid argument count for (anonymous) func@0x')
+    named = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'f'}], 'expr': closure},
+        {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'f'}, 'args': [], 'line': 2}}]
+    assert i.interp_program(named) == {'kind': 'error', 'output': ['Line 2: invalid argument count for f(...): Expected 1.']}
+
+def test_concat_rope():
+    piece = 'x' * a.ROPE_MIN
+    state = s.State({'s': a._string(''), 'p': a._string(piece)}, None, None)
+    add = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 's'}], 'expr': {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 's'}, 'e2': {'kind': 'variable', 'name': 'p'}}}
+    i.eval_block(state, [add, add])
+    first = state.value['s']
+    i.eval_block(state, [add])
+    assert type(first) is a._rope and a.kind(first) == 'string'
+    # The string made from 'first' shares its pieces, 'first' keeps its own value.
+    assert first == a._string(piece * 2) and state.value['s'] == a._string(piece * 3)
+    assert a.concat(first, a._string('y')) == a._string(piece * 2 + 'y')
+    assert i.eval_expression(state, {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'len'}, 'args': [{'kind': 'variable', 'name': 's'}]}) == a._integer(3 * a.ROPE_MIN)
+    assert i.eval_expression(state, {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'str'}, 'args': [{'kind': 'variable', 'name': 's'}]}) == a._string(piece * 3)
+
+def test_table():
+    table = a.Table({'0': a._integer(0), '1': a._integer(1), 'x': a._integer(2)})
+    assert table.list == [a._integer(0), a._integer(1)] and table.rest == {'x': a._integer(2)}
+    # With another key present, '2' keeps its place after it.
+    table['2'] = a._integer(3)
+    assert list(table) == ['0', '1', 'x', '2'] and table == {'0': a._integer(0), '1': a._integer(1), 'x': a._integer(2), '2': a._integer(3)}
+    del table['0']
+    assert list(table) == ['1', 'x', '2'] and table.list == [] and len(table) == 3
+    assert table.at(1) == a._integer(1) and table.at(5) == a._null(None) and '01' not in table
+    state = s.State({'c': a._collection(a.Table())}, None, None)
+    for n in range(3):
+        i.eval_statement(state, {'kind': 'assignment', 'assignArr': [{'kind': 'subscriptor', 'collection': {'kind': 'variable', 'name': 'c'}, 'expr': {'kind': 'integer', 'value': str(n)}}], 'expr': {'kind': 'integer', 'value': str(n)}})
+
+    i.eval_statement(state, {'kind': 'delete', 'expr': {'kind': 'subscriptor', 'collection': {'kind': 'variable', 'name': 'c'}, 'expr': {'kind': 'integer', 'value': '1'}, 'line': 1}})
+    assert state.value['c'].value.list == [a._integer(0)] and i.str_rep(state.value['c']) == "{'0': 0, '2': 2}"
+    assert i.eval_expression(state, {'kind': 'subscriptor', 'collection': {'kind': 'variable', 'name': 'c'}, 'expr': {'kind': 'string', 'value': '2'}}) == a._integer(2)
+
+def test_memoize():
+    from scopescript import memo as m
+    def var(name):
+        return {'kind': 'variable', 'name': name, 'line': 1}
+
+    def call(name, *args):
+        return {'kind': 'call', 'fun': var(name), 'args': list(args), 'line': 1}
+
+    def sub(e, n):
+        return {'kind': 'binop', 'op': '-', 'e1': e, 'e2': {'kind': 'integer', 'value': n}, 'line': 1}
+
+    body = [{'kind': 'if', 'truePartArr': [{'test': {'kind': 'binop', 'op': '<', 'e1': var('n'), 'e2': {'kind': 'integer', 'value': '2'}, 'line': 1}, 'part': [{'kind': 'return', 'expr': var('n'), 'line': 1}]}], 'falsePart': []},
+        {'kind': 'return', 'expr': {'kind': 'binop', 'op': '+', 'e1': call('fib', sub(var('n'), '1')), 'e2': call('fib', sub(var('n'), '2')), 'line': 1}, 'line': 1}]
+    assert m.purity(['n'], body) == m.Purity((), ('fib',))
+    assert m.purity(['n'], [{'kind': 'static', 'expr': call('print', var('n'))}]) is None
+    assert m.purity([], [{'kind': 'assignment', 'assignArr': [{'kind': 'attribute', 'collection': var('c'), 'attribute': 'a'}], 'expr': var('x')}]) is None
+    program = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'fib'}], 'expr': {'kind': 'closure', 'params': ['n'], 'body': body}},
+        {'kind': 'static', 'expr': call('print', call('fib', {'kind': 'integer', 'value': '60'}))}]
+    interp = i.Interpreter(memo_size=3)
+    assert interp.interp_program(program) == {'kind': 'ok', 'output': ['1548008755920', ' ', '\n']}
+    assert interp.memo_stats == {'hits': 58, 'misses': 61, 'evictions': 58}
+    # The memo key holds the values a function reads from outside.
+    k = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'k'}], 'expr': {'kind': 'integer', 'value': n}} for n in '12']
+    add = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'g'}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': {'kind': 'binop', 'op': '+', 'e1': var('x'), 'e2': var('k'), 'line': 1}}]}}
+    show = {'kind': 'static', 'expr': call('print', call('g', {'kind': 'integer', 'value': '1'}))}
+    assert interp.interp_program([add, k[0], show, show, k[1], show])['output'] == ['2', ' ', '\n', '2', ' ', '\n', '3', ' ', '\n']
+    # 0.0 and -0.0 are equal, but not the same argument.
+    text = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'h'}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': call('str', var('x'))}]}}
+    zero = lambda sign: {'kind': 'static', 'expr': call('print', call('h', {'kind': 'unop', 'op': sign, 'expr': {'kind': 'float', 'value': '0.0'}, 'line': 1}))}
+    assert interp.interp_program([text, zero('+'), zero('-')])['output'] == ['0.0', ' ', '\n', '-0.0', ' ', '\n']
+    # A rope and an equal string are the same argument.
+    rope = a.concat(a._string('a' * a.ROPE_MIN), a._string('b'))
+    assert type(rope) is a._rope and m.value_key(rope) == m.value_key(a._string('a' * a.ROPE_MIN + 'b'))
+    # A body too deep to analyse is not memoized, the call still runs.
+    deep = var('x')
+    for _ in range(3000):
+        deep = {'kind': 'binop', 'op': '+', 'e1': {'kind': 'integer', 'value': '1'}, 'e2': deep, 'line': 1}
+    nested = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'f'}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': deep, 'line': 1}]}}
+    assert interp.interp_program([nested, {'kind': 'static', 'expr': call('print', call('f', {'kind': 'integer', 'value': '1'}))}]) == {'kind': 'ok', 'output': ['3001', ' ', '\n']}
+
+def test_callback_newlines():
+    from scopescript import output as o
+    lines = []
+    sink = o.Callback(lines.append)
+    for text in ['\n', ' ', '\n', 'a\nb', ' ', 'c', ' ', '\n']:
+        sink.append(text)
+
+    assert lines == ['', ' ', 'a', 'b c ']
+
+def test_stream_program_stop():
+    import time
+    # print(1); while (true) {}
+    loop = {'kind': 'while', 'test': {'kind': 'boolean', 'value': True}, 'body': []}
+    stream = i.stream_program([{'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': [{'kind': 'integer', 'value': '1'}], 'line': 1}}, loop])
+    assert next(stream) == '1 '
+    before = threading.active_count()
+    stream.close()
+    for _ in range(100):
+        if threading.active_count() < before:
+            break
+        time.sleep(0.05)
+
+    assert threading.active_count() < before
+    stop = threading.Event()
+    stop.set()
+    assert i.interp_program([loop], stop=stop) == {'kind': 'error', 'output': ['Program stopped.']}
+
+def test_call_free():
+    one = {'kind': 'integer', 'value': '1'}
+    call = {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'len'}, 'args': [{'kind': 'string', 'value': 'ab'}], 'line': 1}
+    add = lambda e1, e2: {'kind': 'binop', 'op': '+', 'e1': e1, 'e2': e2, 'line': 1}
+    assert i.call_free(add(one, one)) and not i.call_free(add(one, call))
+    assert not i.call_free({'kind': 'return', 'expr': call})
+    # Expressions deeper than DIRECT_HEIGHT run on the evaluator's stack above that height.
+    deep = one
+    for _ in range(i.DIRECT_HEIGHT * 4):
+        deep = add(deep, one)
+
+    state = s.State({}, None, [], i.Caches())
+    assert not i.call_free(deep) and i.eval_expression(state, deep) == a._integer(i.DIRECT_HEIGHT * 4 + 1)
+    assert i.eval_expression(state, add(add(one, call), deep)) == a._integer(i.DIRECT_HEIGHT * 4 + 4)
+    # Errors are reported the same way on both paths.
+    bad = add({'kind': 'string', 'value': 'a'}, one)
+    for state in (s.State({}, None, []), s.State({}, None, [], i.Caches())):
+        try:
+            i.eval_expression(state, bad)
+            assert False
+        except i.ScopeScriptError as err:
+            assert str(err) == "Line 1: operator '+' not supported between types <string> and <integer>."
+
+def test_profile():
+    from scopescript import profiler as pr
+    def call(name, arg, line):
+        return {'kind': 'call', 'fun': {'kind': 'variable', 'name': name, 'line': line}, 'args': [arg], 'line': line}
+
+    one = {'kind': 'integer', 'value': '1', 'line': 1}
+    add = {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 'x', 'line': 1}, 'e2': one, 'line': 1}
+    program = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'f'}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': add, 'line': 1}], 'line': 1}, 'line': 1},
+        {'kind': 'static', 'expr': call('print', call('f', call('f', one, 2), 2), 2), 'line': 2}]
+    # Every reading of the clock takes one unit of time.
+    ticks = iter(range(10 ** 6))
+    result = i.interp_program(program, profile=pr.Profile(clock=lambda: next(ticks)))
+    assert result['output'] == ['3', ' ', '\n']
+    profile = result['profile']
+    assert profile.nodes[id(add)][1].hits == 2
+    assert [(name, stats.hits) for name, _, _, stats in profile.functions.values()] == [('f', 2)]
+    # The literal passed to the inner call is on line 1.
+    assert profile.lines[1].hits == 11 and profile.lines[2].hits == 4
+    for stats in profile.lines.values():
+        assert 0 < stats.self <= stats.cumulative
+    # Line 2 runs both calls, so only the assignment on line 1 is outside it.
+    assert profile.lines[2].cumulative < sum(stats.self for stats in profile.lines.values())
+    assert profile.report().startswith('Lines\n')
+    stacks = profile.collapsed().splitlines()
+    assert '<program>;line 2 ' in '\n'.join(stacks) and all(' ' in line and line.startswith('<program>') for line in stacks)
+    assert any(line.startswith('<program>;f;line 1 ') for line in stacks)
+
+def test_budget():
+    def var(name):
+        return {'kind': 'variable', 'name': name, 'line': 1}
+
+    show = {'kind': 'static', 'expr': {'kind': 'call', 'fun': var('print'), 'args': [var('n')], 'line': 1}, 'line': 1}
+    count = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'n'}], 'expr': {'kind': 'binop', 'op': '+', 'e1': var('n'), 'e2': {'kind': 'integer', 'value': '1'}, 'line': 1}, 'line': 1}
+    start = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'n'}], 'expr': {'kind': 'integer', 'value': '0'}, 'line': 1}
+    loop = {'kind': 'while', 'test': {'kind': 'boolean', 'value': True}, 'body': [count, show], 'line': 1}
+    # Each iteration takes a step, calls to built-in functions take none.
+    assert i.interp_program([start, loop], fuel=2) == {'kind': 'timeout', 'output': ['1', ' ', '\n', '2', ' ', '\n']}
+    bounded = {'kind': 'while', 'test': {'kind': 'binop', 'op': '<', 'e1': var('n'), 'e2': {'kind': 'integer', 'value': '3'}, 'line': 1}, 'body': [count], 'line': 1}
+    assert i.interp_program([start, bounded, show], fuel=3)['kind'] == 'ok'
+    assert i.interp_program([start, bounded, show], fuel=2)['kind'] == 'timeout'
+    result = i.interp_program([start, {'kind': 'while', 'test': {'kind': 'boolean', 'value': True}, 'body': [count], 'line': 1}], timeout=0.05)
+    assert result == {'kind': 'timeout', 'output': []}
+
+def test_validate():
+    one = {'kind': 'integer', 'value': '1', 'line': 1}
+    body = [{'kind': 'return', 'expr': {'kind': 'binop', 'op': '+', 'e1': one, 'e2': one, 'line': 2}, 'line': 2}]
+    func = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'f'}], 'expr': {'kind': 'closure', 'params': [], 'body': body, 'line': 1}, 'line': 1}
+    show = {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print', 'line': 3}, 'args': [{'kind': 'call', 'fun': {'kind': 'variable', 'name': 'f', 'line': 3}, 'args': [], 'line': 3}], 'line': 3}, 'line': 3}
+    assert i.validate([func, show]) == []
+    caches = i.Caches()
+    assert caches.validate([func, show]) and caches.statements is i.valid_statements
+    assert i.interp_program([func, show]) == {'kind': 'ok', 'output': ['2', ' ', '\n']}
+    # Problems are found wherever they are, in program order.
+    misplaced = [{'kind': 'break', 'line': 4}, {'kind': 'unop', 'op': '?', 'expr': one, 'line': 5}, {'kind': 'yield', 'line': 6}]
+    loop = {'kind': 'for', 'inits': [], 'test': {'kind': 'boolean', 'value': False}, 'updates': [{'kind': 'continue', 'line': 4}], 'body': [{'kind': 'continue', 'line': 4}], 'line': 4}
+    program = [func, {'kind': 'if', 'truePartArr': [], 'falsePart': [misplaced[0], {'kind': 'static', 'expr': misplaced[1], 'line': 5}, misplaced[2]], 'line': 4}, loop, body[0]]
+    assert i.validate(program) == ['Line 4: break outside of loop.', 'Line 5: unknown operator ?.', 'Unknown statement: <yield>.',
+                                   'Line 4: continue outside of loop.', 'Line 2: return outside of function.']
+    assert not i.Caches().validate(program)
+    # A program with problems reports each one when it runs, as before.
+    assert i.interp_program([func, show, loop]) == {'kind': 'ok', 'output': ['2', ' ', '\n']}
+    assert i.interp_program([func, show, body[0]]) == {'kind': 'error', 'output': ['Line 2: return outside of function.']}
+    assert i.interp_program([{'kind': 'static', 'expr': {'kind': 'lambda', 'line': 7}, 'line': 7}]) == {'kind': 'error', 'output': ['Line 7: unknown expression: <lambda>.']}
+
+def test_quicken():
+    one = {'kind': 'integer', 'value': '1'}
+    add = {'kind': 'binop', 'op': '+', 'e1': {'kind': 'variable', 'name': 'x'}, 'e2': one, 'line': 1}
+    neg = {'kind': 'unop', 'op': '-', 'expr': {'kind': 'variable', 'name': 'x'}, 'line': 1}
+    caches = i.Caches()
+    state = s.State({ 'x': a._integer(1) }, None, [], caches)
+    for _ in range(i.QUICKEN_AFTER + 1):
+        assert i.eval_expression(state, add) == a._integer(2) and i.eval_expression(state, neg) == a._integer(-1)
+
+    assert caches.quick[id(add)] == (a._integer, a._integer, i.quick_binops['+', a._integer, a._integer])
+    assert caches.quick[id(neg)][0] is a._integer
+    # A change of operand type falls back to the generic operation, errors included.
+    state.value['x'] = a._string('a')
+    try:
+        i.eval_expression(state, add)
+        assert False
+    except i.ScopeScriptError as err:
+        assert str(err) == "Line 1: operator '+' not supported between types <string> and <integer>."
+
+    assert caches.quick[id(add)] == -i.BACKOFF
+    state.value['x'] = a._float(1.5)
+    assert i.eval_expression(state, add) == a._float(2.5) and i.eval_expression(state, neg) == a._float(-1.5)
+    for _ in range(i.BACKOFF + i.QUICKEN_AFTER + 1):
+        i.eval_expression(state, add)
+
+    assert caches.quick[id(add)][:2] == (a._float, a._integer)
+    program = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x'}], 'expr': add, 'line': 1}]
+    loop = {'kind': 'while', 'test': {'kind': 'binop', 'op': '<', 'e1': {'kind': 'variable', 'name': 'x', 'line': 1}, 'e2': {'kind': 'integer', 'value': '20'}, 'line': 1}, 'body': program, 'line': 1}
+    show = {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': [{'kind': 'variable', 'name': 'x', 'line': 1}], 'line': 1}, 'line': 1}
+    start = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x'}], 'expr': {'kind': 'float', 'value': '0.5'}, 'line': 1}
+    result = {'kind': 'ok', 'output': ['20.5', ' ', '\n']}
+    assert i.interp_program([start, loop, show]) == i.Interpreter(adaptive=False).interp_program([start, loop, show]) == result
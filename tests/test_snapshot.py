@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import snapshot as sn
+from scopescript import batch as b
+from scopescript import atoms as a
+
+def var(name):
+    return {'kind': 'variable', 'name': name, 'line': 1}
+
+def num(n):
+    return {'kind': 'integer', 'value': str(n)}
+
+def assign(target, expr):
+    return {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': target} if type(target) is str else target], 'expr': expr, 'line': 1}
+
+def attr(collection, name):
+    return {'kind': 'attribute', 'collection': collection, 'attribute': name, 'line': 1}
+
+def call(f, *args):
+    return {'kind': 'call', 'fun': var(f), 'args': list(args), 'line': 1}
+
+def add(e1, e2):
+    return {'kind': 'binop', 'op': '+', 'e1': e1, 'e2': e2, 'line': 1}
+
+def show(*args):
+    return {'kind': 'static', 'expr': call('print', *args), 'line': 1}
+
+# Sets up helpers, a constant table holding itself and a counter kept by a closure.
+prelude = [
+    assign('table', {'kind': 'collection', 'value': {'a': num(1), 'b': {'kind': 'collection', 'value': {'c': num(2)}}}}),
+    assign(attr(var('table'), 'self'), var('table')),
+    assign('n', num(0)),
+    assign('count', {'kind': 'closure', 'params': [], 'body': [assign('n', add(var('n'), num(1))), {'kind': 'return', 'expr': var('n'), 'line': 1}], 'line': 1}),
+    assign('get', {'kind': 'closure', 'params': ['k'], 'body': [{'kind': 'return', 'expr': {'kind': 'subscriptor', 'collection': var('table'), 'expr': var('k'), 'line': 1}, 'line': 1}], 'line': 1}),
+    show({'kind': 'string', 'value': 'ready'})
+]
+
+# Changes every part of the snapshot, then prints it.
+program = [
+    assign(attr(var('table'), 'a'), num(10)),
+    assign(attr(attr(attr(var('table'), 'self'), 'b'), 'c'), num(20)),
+    {'kind': 'static', 'expr': call('count'), 'line': 1},
+    show(call('count'), var('n'), attr(var('table'), 'a'), call('get', {'kind': 'string', 'value': 'b'}))
+]
+
+expected = {'kind': 'ok', 'output': ['2', ' ', '2', ' ', '10', ' ', "{'c': 20}", ' ', '\n']}
+
+def test_snapshot_runs():
+    snapshot = i.snapshot(prelude)
+    assert snapshot.output == ['ready', ' ', '\n']
+    # Runs from the snapshot behave as if the prelude ran first, without its output.
+    whole = i.interp_program(prelude + program)
+    assert whole['output'][3:] == expected['output']
+    assert i.interp_program(program, snapshot=snapshot) == expected
+    # Each run starts from the snapshot as it was made.
+    assert i.interp_program(program, snapshot=snapshot) == expected
+    assert snapshot.values['n'] == a._integer(0) and snapshot.values['table'].value['a'] == a._integer(1)
+    try:
+        snapshot.values['n'] = a._integer(1)
+        assert False
+    except sn.FrozenError:
+        pass
+
+def test_snapshot_threads():
+    snapshot, results = i.snapshot(prelude), []
+    interp = i.Interpreter()
+    threads = [ threading.Thread(target=lambda: results.append(interp.interp_program(program, snapshot=snapshot))) for _ in range(8) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 8
+
+def test_snapshot_errors():
+    try:
+        i.snapshot([show(var('missing'))])
+        assert False
+    except i.ScopeScriptError as err:
+        assert str(err) == "Line 1: Variable 'missing' is not defined."
+
+def test_snapshot_batch():
+    snapshot = i.snapshot(prelude)
+    results = dict(b.interp_many([program] * 4, workers=2, chunksize=1, snapshot=snapshot))
+    assert results == { index: expected for index in range(4) }
+    b.shutdown()
+
+def test_snapshot_later_globals():
+    # A prelude function calls a function the program defines.
+    apply = assign('apply', {'kind': 'closure', 'params': ['x'], 'body': [{'kind': 'return', 'expr': call('handler', var('x')), 'line': 1}], 'line': 1})
+    handler = assign('handler', {'kind': 'closure', 'params': ['y'], 'body': [{'kind': 'return', 'expr': var('y'), 'line': 1}], 'line': 1})
+    program = [handler, show(call('apply', num(1)))]
+    assert i.interp_program(program, snapshot=i.snapshot([apply])) == i.interp_program([apply] + program) == {'kind': 'ok', 'output': ['1', ' ', '\n']}
+
+def test_snapshot_invalid_prelude():
+    # A prelude function with a misplaced break reports it when a later run calls it.
+    stop = assign('stop', {'kind': 'closure', 'params': [], 'body': [{'kind': 'break', 'line': 3}], 'line': 1})
+    program = [show(call('stop'))]
+    assert i.interp_program(program, snapshot=i.snapshot([stop])) == i.interp_program([stop] + program) == {'kind': 'error', 'output': ['Line 3: break outside of loop.']}
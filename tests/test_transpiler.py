@@ -0,0 +1,104 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import transpiler as t
+
+def print_stmt(*args):
+    return {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': list(args), 'line': 1}, 'line': 1}
+
+def var(name):
+    return {'kind': 'variable', 'name': name, 'line': 1}
+
+def integer(n):
+    return {'kind': 'integer', 'value': str(n)}
+
+def binop(op, e1, e2):
+    return {'kind': 'binop', 'op': op, 'e1': e1, 'e2': e2, 'line': 1}
+
+def assign(name, e):
+    return {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name, 'line': 1}], 'expr': e, 'line': 1}
+
+def test_source():
+    code = t.compile_program([assign('x', integer(1)), print_stmt(binop('+', var('x'), integer(2)))])
+    assert code.source.startswith('def program(out, max_depth):')
+    assert t.run_program(code) == t.run_program(code) == {'kind': 'ok', 'output': ['3', ' ', '\n']}
+
+def test_for_continue():
+    # t = 0; for (x = 0; x < 5; ++x) { if (x < 3) { continue; } t = t + x; } print(t);
+    p = [assign('t', integer(0)),
+        {'kind': 'for', 'line': 1, 'inits': [assign('x', integer(0))], 'test': binop('<', var('x'), integer(5)),
+        'updates': [{'kind': 'static', 'expr': {'kind': 'unop', 'op': '++', 'expr': var('x'), 'line': 1}, 'line': 1}],
+        'body': [{'kind': 'if', 'truePartArr': [{'test': binop('<', var('x'), integer(3)), 'part': [{'kind': 'continue', 'line': 1}]}], 'falsePart': [], 'line': 1},
+            assign('t', binop('+', var('t'), var('x')))]},
+        print_stmt(var('t'))]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['7', ' ', '\n']}
+
+def test_closures_capture_state():
+    # mk = (n) => () => n; a = mk(1); b = mk(2); print(a(), b());
+    call = lambda f, *args: {'kind': 'call', 'fun': f, 'args': list(args), 'line': 1}
+    p = [assign('mk', {'kind': 'closure', 'params': ['n'], 'body': [{'kind': 'return', 'expr': {'kind': 'closure', 'params': [], 'body': [
+            {'kind': 'return', 'expr': var('n'), 'line': 1}], 'line': 1}, 'line': 1}], 'line': 1}),
+        assign('a', call(var('mk'), integer(1))), assign('b', call(var('mk'), integer(2))),
+        print_stmt(call(var('a')), call(var('b')))]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['1', ' ', '2', ' ', '\n']}
+
+def test_type_errors():
+    p = [print_stmt(integer(1)), print_stmt(binop('-', {'kind': 'string', 'value': 'a'}, integer(1)))]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': ["Line 1: operator '-' not supported between types <string> and <integer>."]}
+    p = [print_stmt(binop('<', integer(1), {'kind': 'null'}))]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': ["Line 1: operator '<' not supported between types <integer> and <null>."]}
+
+def test_deep_nesting():
+    e = integer(1)
+    for _ in range(150):
+        e = binop('+', e, integer(1))
+    p = [print_stmt(e)]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['151', ' ', '\n']}
+
+def test_deep_nesting_errors():
+    # Programs too deep for python's parser run compiled, with the interpreter's error text.
+    e = integer(1)
+    for _ in range(150):
+        e = binop('+', e, integer(1))
+    key = {'kind': 'collection', 'value': {'0': integer(2), '1': integer(6)}}
+    p = [print_stmt(e), print_stmt({'kind': 'subscriptor', 'collection': integer(3), 'expr': key, 'line': 1})]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': [
+        "Line 1: invalid collection type for attribute '{'0': integer(value=2), '1': integer(value=6)}': <integer>."]}
+
+def test_deep_translation():
+    # Translating recurses under the raised limit, programs too deep even for that are
+    # compiled without source and fail when they run.
+    for depth, result in ((1500, {'kind': 'ok', 'output': ['1501', ' ', '\n']}), (20000, {'kind': 'error', 'output': ['Program is nested too deeply to compile.']})):
+        e = integer(1)
+        for _ in range(depth):
+            e = binop('+', integer(1), e)
+        code = t.compile_program([print_stmt(e)])
+        assert (code.source is None) == (depth == 20000) and t.run_program(code) == result
+
+def test_local_defined_later_outside():
+    # f = () => { q = 1; return q; }; print(f()); q = 9; print(f(), q);
+    # g = () => { w = 4; return () => w; }; h = g(); w = 7; print(h(), g()(), w);
+    var = lambda name: {'kind': 'variable', 'name': name, 'line': 1}
+    num = lambda n: {'kind': 'integer', 'value': n}
+    assign = lambda name, e: {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name, 'line': 1}], 'expr': e, 'line': 1}
+    call = lambda f: {'kind': 'call', 'fun': f, 'args': [], 'line': 1}
+    closure = lambda body: {'kind': 'closure', 'params': [], 'body': body}
+    p = [assign('f', closure([assign('q', num('1')), {'kind': 'return', 'expr': var('q'), 'line': 1}])), print_stmt(call(var('f'))), assign('q', num('9')), print_stmt(call(var('f')), var('q')),
+        assign('g', closure([assign('w', num('4')), {'kind': 'return', 'expr': closure([{'kind': 'return', 'expr': var('w'), 'line': 1}]), 'line': 1}])),
+        assign('h', call(var('g'))), assign('w', num('7')), print_stmt(call(var('h')), call(call(var('g'))), var('w'))]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['1', ' ', '\n', '1', ' ', '1', ' ', '\n', '4', ' ', '4', ' ', '4', ' ', '\n']}
+
+def test_max_depth():
+    # d = (n) => n == 0 ? 0 : 1 + d(n - 1); print(d(999)); the same depth limit as the interpreter.
+    d = assign('d', {'kind': 'closure', 'params': ['n'], 'body': [{'kind': 'return', 'expr': {'kind': 'ternary', 'test': binop('==', var('n'), integer(0)), 'trueExpr': integer(0),
+        'falseExpr': binop('+', integer(1), {'kind': 'call', 'fun': var('d'), 'args': [binop('-', var('n'), integer(1))], 'line': 1}), 'line': 1}, 'line': 1}]})
+    p = [d, print_stmt({'kind': 'call', 'fun': var('d'), 'args': [integer(999)], 'line': 2})]
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['999', ' ', '\n']}
+    p[1]['expr']['args'][0] = {'kind': 'call', 'fun': var('d'), 'args': [integer(1000)], 'line': 2}
+    assert t.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': ['Line 1: maximum recursion depth exceeded for d(...).']}
+    assert t.run_program(t.compile_program(p), max_depth=2000) == i.interp_program(p, max_depth=2000) == {'kind': 'ok', 'output': ['1000', ' ', '\n']}
@@ -0,0 +1,90 @@
+import os
+import sys
+
+test_dir = os.path.dirname( __file__ )
+src_dir = os.path.join( test_dir, '..', 'src')
+sys.path.append( src_dir )
+
+from scopescript import interpreter as i
+from scopescript import vm as v
+
+def print_stmt(*args):
+    return {'kind': 'static', 'expr': {'kind': 'call', 'fun': {'kind': 'variable', 'name': 'print'}, 'args': list(args), 'line': 1}, 'line': 1}
+
+def var(name):
+    return {'kind': 'variable', 'name': name, 'line': 1}
+
+def integer(n):
+    return {'kind': 'integer', 'value': str(n)}
+
+def binop(op, e1, e2):
+    return {'kind': 'binop', 'op': op, 'e1': e1, 'e2': e2, 'line': 1}
+
+def call(name, *args):
+    return {'kind': 'call', 'fun': var(name), 'args': list(args), 'line': 1}
+
+# sum = (n) => n == 0 ? 0 : n + sum(n - 1);
+sum_func = {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'sum', 'line': 1}], 'expr': {'kind': 'closure', 'params': ['n'], 'body': [
+    {'kind': 'return', 'expr': {'kind': 'ternary', 'test': binop('==', var('n'), integer(0)), 'trueExpr': integer(0),
+        'falseExpr': binop('+', var('n'), call('sum', binop('-', var('n'), integer(1)))), 'line': 1}, 'line': 1}], 'line': 1}, 'line': 1}
+
+def test_run_repeatedly():
+    code = v.compile_program([print_stmt(integer(1), {'kind': 'string', 'value': 'a'})])
+    assert v.run_program(code) == {'kind': 'ok', 'output': ['1', ' ', 'a', ' ', '\n']}
+    assert v.run_program(code) == {'kind': 'ok', 'output': ['1', ' ', 'a', ' ', '\n']}
+
+def test_recursive_closure():
+    p = [sum_func, print_stmt(call('sum', integer(100)))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['5050', ' ', '\n']}
+
+def test_recursion_depth():
+    p = [sum_func, print_stmt(call('sum', integer(5000)))]
+    assert v.interp_program(p) == {'kind': 'error', 'output': ['Line 1: maximum recursion depth exceeded for sum(...).']}
+    assert v.run_program(v.compile_program(p), max_depth=10000) == {'kind': 'ok', 'output': ['12502500', ' ', '\n']}
+
+def test_deep_nesting():
+    # Lowering recurses under the raised limit, programs too deep even for that fail when
+    # they run.
+    for depth, result in ((1500, {'kind': 'ok', 'output': ['1501', ' ', '\n']}), (20000, {'kind': 'error', 'output': ['Program is nested too deeply to compile.']})):
+        e = integer(1)
+        for _ in range(depth):
+            e = binop('+', integer(1), e)
+        assert v.run_program(v.compile_program([print_stmt(e)])) == result
+
+def test_continue_in_nested_state():
+    # t = 0; for (x = 0; x < 5; ++x) { if (x < 3) { continue; } t = t + x; } print(t);
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 't', 'line': 1}], 'expr': integer(0), 'line': 1},
+        {'kind': 'for', 'line': 1,
+        'inits': [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'x', 'line': 1}], 'expr': integer(0), 'line': 1}],
+        'test': binop('<', var('x'), integer(5)),
+        'updates': [{'kind': 'static', 'expr': {'kind': 'unop', 'op': '++', 'expr': var('x'), 'line': 1}, 'line': 1}],
+        'body': [{'kind': 'if', 'truePartArr': [{'test': binop('<', var('x'), integer(3)), 'part': [{'kind': 'continue', 'line': 1}]}], 'falsePart': [], 'line': 1},
+            {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 't', 'line': 1}], 'expr': binop('+', var('t'), var('x')), 'line': 1}]},
+        print_stmt(var('t'))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['7', ' ', '\n']}
+
+def test_builtin_shadowed():
+    # len = (x) => 42; print(len("abc"), type(len));
+    p = [{'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': 'len', 'line': 1}], 'expr': {'kind': 'closure', 'params': ['x'], 'body': [
+            {'kind': 'return', 'expr': integer(42), 'line': 1}], 'line': 1}, 'line': 1},
+        print_stmt(call('len', {'kind': 'string', 'value': 'abc'}), call('type', var('len')))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['42', ' ', 'closure', ' ', '\n']}
+
+def test_errors():
+    p = [print_stmt(integer(1)), print_stmt(call('f', integer(1)))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': ['Line 1: function f(...) is not defined.']}
+    p = [print_stmt(binop('/', integer(1), integer(0)))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'error', 'output': []}
+
+def test_local_defined_later_outside():
+    # f = () => { q = 1; return q; }; print(f()); q = 9; print(f(), q);
+    # g = () => { w = 4; return () => w; }; h = g(); w = 7; print(h(), g()(), w);
+    var = lambda name: {'kind': 'variable', 'name': name, 'line': 1}
+    num = lambda n: {'kind': 'integer', 'value': n}
+    assign = lambda name, e: {'kind': 'assignment', 'assignArr': [{'kind': 'identifier', 'name': name, 'line': 1}], 'expr': e, 'line': 1}
+    call = lambda f: {'kind': 'call', 'fun': f, 'args': [], 'line': 1}
+    closure = lambda body: {'kind': 'closure', 'params': [], 'body': body}
+    p = [assign('f', closure([assign('q', num('1')), {'kind': 'return', 'expr': var('q'), 'line': 1}])), print_stmt(call(var('f'))), assign('q', num('9')), print_stmt(call(var('f')), var('q')),
+        assign('g', closure([assign('w', num('4')), {'kind': 'return', 'expr': closure([{'kind': 'return', 'expr': var('w'), 'line': 1}]), 'line': 1}])),
+        assign('h', call(var('g'))), assign('w', num('7')), print_stmt(call(var('h')), call(call(var('g'))), var('w'))]
+    assert v.interp_program(p) == i.interp_program(p) == {'kind': 'ok', 'output': ['1', ' ', '\n', '1', ' ', '1', ' ', '\n', '4', ' ', '4', ' ', '4', ' ', '\n']}